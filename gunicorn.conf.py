@@ -0,0 +1,30 @@
+# Configuration gunicorn, lue automatiquement depuis le répertoire de lancement.
+# SERVER_INTERFACE=asgi : workers uvicorn (vues asynchrones de /api/async/) ;
+# sinon workers synchrones classiques. Le nombre de workers vient de WEB_CONCURRENCY.
+import os
+import shutil
+import tempfile
+
+if os.environ.get('SERVER_INTERFACE', 'wsgi') == 'asgi':
+    wsgi_app = 'plateforme_services.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'plateforme_services.wsgi:application'
+    # Plus d'un thread : workers gthread ; chaque thread tient une connexion (cf. pool dans settings.py)
+    threads = int(os.environ.get('WEB_THREADS', '1'))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Séries Prometheus des workers, additionnées par /api/metrics (service/metrics.py) : sans elles,
+# chaque scrape ne verrait que le worker qui répond. Répertoire propre à ce maître, vidé au démarrage.
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f'plateforme-services-metrics-{os.getpid()}'))
+
+
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from service import metrics
+    metrics.mark_process_dead(metrics_dir, worker.pid)
@@ -26,18 +26,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'service.middleware.InstrumentationMiddleware',  # En premier : mesure toute la chaîne
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Pour statiques en prod (Render)
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'service.routers.ReplicaPinningMiddleware',  # Avant les sessions : leurs lectures et écritures sont routées
+    'service.sessions.CoalescingSessionMiddleware',  # SessionMiddleware, écritures regroupées
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'service.middleware.DebugCookiesMiddleware',  # Votre middleware custom (si existant)
 ]
 
+# Instrumentation (service.middleware) : part des requêtes dont le SQL est mesuré,
+# seuil de journalisation des requêtes lentes (0 = désactivé), jeton d'accès à /api/metrics et
+# répertoire où chaque worker écrit ses séries (défini par gunicorn.conf.py ; vide : processus courant seul)
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0'))
+METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', '500'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
 ROOT_URLCONF = 'plateforme_services.urls'
 
 TEMPLATES = [
@@ -58,13 +67,94 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'plateforme_services.wsgi.application'
 
+# Serveur : 'wsgi' (workers gunicorn synchrones) ou 'asgi' (workers uvicorn), cf. gunicorn.conf.py
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi')
+# Threads par worker WSGI (gunicorn `threads`) : requêtes simultanées, donc connexions utiles, par worker
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '1'))
+
+# Pool de connexions PostgreSQL (psycopg 3 + psycopg_pool, cf. service.dbpool) : DATABASE_POOL=True.
+# Chaque requête emprunte une connexion déjà ouverte et la rend en fin de requête.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:///db.sqlite3',  # Fallback SQLite local
-        conn_max_age=600
+        # Sous ASGI l'ORM asynchrone ouvre ses connexions dans des threads éphémères :
+        # une connexion persistante y resterait ouverte sans jamais être réutilisée.
+        # Le pool remplace les connexions persistantes (Django refuse les deux à la fois).
+        conn_max_age=0 if SERVER_INTERFACE == 'asgi' or DATABASE_POOL else 600,
+        conn_health_checks=DATABASE_POOL,  # Connexion du pool vérifiée à l'emprunt (aller-retour de plus)
     )
 }
 
+# Réplicas en lecture (cf. service.routers) : URL séparées par des virgules, alias replica1, replica2...
+# En local, deux bases SQLite : DATABASE_REPLICA_URLS=sqlite:///db.sqlite3 (même fichier) ou une copie.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = dj_database_url.parse(
+        url.strip(),
+        conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+        conn_health_checks=DATABASE_POOL,
+        test_options={'MIRROR': 'default'},  # Tests : le réplica lit la base de test du primaire
+    )
+    DATABASE_REPLICAS.append(f'replica{index}')
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['service.routers.ReplicaRouter']
+# Après une écriture, les lectures du même navigateur restent sur le primaire (retard de réplication)
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', '5'))
+
+for database in DATABASES.values():
+    if not (DATABASE_POOL and database['ENGINE'] == 'django.db.backends.postgresql'):
+        continue
+    # Un pool par base et par worker : au plus WEB_CONCURRENCY x DATABASE_POOL_MAX_SIZE connexions par serveur.
+    # Un worker WSGI n'utilise qu'une connexion par thread : au-delà, elles resteraient inactives. Sous ASGI,
+    # les threads de sync_to_async peuvent en emprunter plusieurs.
+    pool_size = WEB_THREADS if SERVER_INTERFACE == 'wsgi' else 4
+    database.setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', '1')),
+        'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', str(pool_size))),
+        # Attente maximale (s) d'une connexion libre, au-delà la requête échoue au lieu d'attendre
+        'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', '5')),
+        'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', '300')),  # Connexions en trop fermées après (s)
+        'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', '1800')),
+    }
+
+# Cache : mémoire locale par défaut, partagé entre workers (Redis) si REDIS_URL est défini
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Outbox (cf. service.outbox) : gestionnaires appelés par la commande runoutbox, par sujet.
+# Un gestionnaire en échec est réessayé après OUTBOX_RETRY_BASE_SECONDS x 2^(essai - 1) s (plafonné).
+OUTBOX_HANDLERS = {
+    'reservation.created': ['service.notifications.created_sms', 'service.notifications.created_email'],
+    'reservation.status_changed': ['service.notifications.status_sms', 'service.notifications.status_email'],
+}
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_RETRY_BASE_SECONDS = float(os.environ.get('OUTBOX_RETRY_BASE_SECONDS', '30'))
+OUTBOX_RETRY_MAX_SECONDS = float(os.environ.get('OUTBOX_RETRY_MAX_SECONDS', '3600'))
+
+# Notifications : emails et SMS journalisés tant qu'aucun fournisseur n'est configuré
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-reply@plateforme-services.onrender.com')
+SMS_BACKEND = os.environ.get('SMS_BACKEND', 'service.notifications.ConsoleSMSBackend')
+
+# Durée de vie (secondes) de l'annuaire des prestataires en cache, invalidé à chaque modification
+PROVIDER_CACHE_TIMEOUT = int(os.environ.get('PROVIDER_CACHE_TIMEOUT', '300'))
+
+# Admin : au-delà de ce nombre de lignes estimées, le total des listes est estimé (cf. service.admin)
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', '100000'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -104,7 +194,7 @@ STORAGES = {
 # CORS : Ajout https:// pour Render
 CORS_ALLOW_ALL_ORIGINS = False  # Sécurisé
 CORS_ALLOW_CREDENTIALS = True
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'ETag', 'Last-Modified']
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:8000',
     'http://127.0.0.1:8000',
@@ -121,7 +211,15 @@ CSRF_TRUSTED_ORIGINS = [
 # Sessions
 SESSION_COOKIE_NAME = 'sessionid'
 SESSION_COOKIE_AGE = 1209600  # 2 semaines
-SESSION_SAVE_EVERY_REQUEST = True
+# SESSION_MODE=coalesced : l'expiration n'est prolongée (sauvegarde de la session) qu'après
+# SESSION_REFRESH_FRACTION de SESSION_COOKIE_AGE, cf. service.sessions ; every_request : à chaque requête.
+# Sessions lues depuis le cache si celui-ci est partagé entre workers : avec un cache local,
+# une déconnexion ne serait pas vue par les autres workers.
+SESSION_MODE = os.environ.get('SESSION_MODE', 'coalesced')
+SESSION_SAVE_EVERY_REQUEST = SESSION_MODE == 'every_request'
+SESSION_REFRESH_FRACTION = float(os.environ.get('SESSION_REFRESH_FRACTION', 0.1))
+if SESSION_MODE == 'coalesced' and os.environ.get('REDIS_URL'):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'False') == 'True'  # True sur Render HTTPS
 SESSION_COOKIE_HTTPONLY = True
@@ -146,6 +244,20 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # Pagination keyset : pas de COUNT(*) ni d'OFFSET, taille réglable via ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'service.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', '50')),
+    # Seaux à jetons des endpoints ouverts (cf. service.throttling) : "n/période", n requêtes d'affilée
+    # puis n par période ; par IP et par identifiant (username ou email)
+    'DEFAULT_THROTTLE_RATES': {
+        'signup_ip': os.environ.get('THROTTLE_SIGNUP_IP_RATE', '10/hour'),
+        'signup_username': os.environ.get('THROTTLE_SIGNUP_USERNAME_RATE', '3/hour'),
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP_RATE', '30/min'),
+        'login_username': os.environ.get('THROTTLE_LOGIN_USERNAME_RATE', '5/min'),
+    },
+    # Proxys de confiance devant l'application : l'IP des seaux est lue dans X-Forwarded-For à cette
+    # profondeur. 0 : REMOTE_ADDR, l'en-tête (falsifiable par le client) est ignoré
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
 }
 
 # Autres (optionnel pour prod)
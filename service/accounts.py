@@ -0,0 +1,110 @@
+"""
+Import de comptes clients ou prestataires en nombre (CSV ou JSON).
+
+Chaque ligne est validée sans requête, les conflits (nom d'utilisateur ou
+email déjà pris, ou répétés dans le fichier) sont cherchés en une requête par
+champ, les mots de passe sont hachés dans un pool de processus (cf.
+service.hashing), puis User et profils sont insérés par lots, un lot par
+transaction. Une ligne en erreur est signalée sans interrompre l'import.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .cache import bump_generation
+from .hashing import hash_passwords
+from .models import Client, Provider
+from .serializers import ClientImportSerializer, ProviderImportSerializer
+
+ACCOUNT_KINDS = {
+    'client': (Client, ClientImportSerializer, 'clients'),
+    'provider': (Provider, ProviderImportSerializer, 'providers'),
+}
+IMPORT_CHUNK_SIZE = 500
+
+
+def conflict(index, field, message):
+    return {'index': index, 'status': 409, 'errors': {field: [message]}}
+
+
+def validate_accounts(kind, rows):
+    """Retourne (résultats par index pour les lignes refusées, [(index, données valides)])."""
+    model, serializer_class, _ = ACCOUNT_KINDS[kind]
+    results, valid = {}, []
+    for index, row in enumerate(rows):
+        serializer = serializer_class(data=row if isinstance(row, dict) else {})
+        if not serializer.is_valid():
+            results[index] = {'index': index, 'status': 400, 'errors': serializer.errors}
+            continue
+        data = serializer.validated_data
+        data.setdefault('username', data['email'])
+        valid.append((index, data))
+
+    # Une requête par champ unique, puis les répétitions à l'intérieur du fichier
+    taken = {
+        'username': set(User.objects.filter(username__in={data['username'] for _, data in valid})
+                        .values_list('username', flat=True)),
+        'email': set(model.objects.filter(email__in={data['email'] for _, data in valid})
+                     .values_list('email', flat=True)),
+    }
+    accepted = []
+    for index, data in valid:
+        field = next((field for field in ('username', 'email') if data[field] in taken[field]), None)
+        if field is not None:
+            results[index] = conflict(index, field, "Déjà utilisé.")
+            continue
+        for field in taken:
+            taken[field].add(data[field])
+        accepted.append((index, data))
+    return results, accepted
+
+
+def build_profile(kind, user, data):
+    model, _, _ = ACCOUNT_KINDS[kind]
+    fields = {'user': user, 'name': data['name'], 'email': data['email'], 'phone_number': data.get('phone_number')}
+    if kind == 'provider':
+        fields.update(service=data['service'], daily_capacity=data['daily_capacity'])
+    profile = model(**fields)
+    if kind == 'provider':
+        profile.refresh_search_fields()  # bulk_create ne passe pas par save()
+    return profile
+
+
+def write_chunk(kind, chunk):
+    # User puis profils, deux INSERT groupés dans une transaction
+    model, _, _ = ACCOUNT_KINDS[kind]
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(username=data['username'], email=data['email'], password=password)
+            for _, data, password in chunk
+        ])
+        profiles = model.objects.bulk_create([
+            build_profile(kind, user, data) for user, (_, data, _) in zip(users, chunk)
+        ])
+    return [{'index': index, 'status': 201, 'id': profile.pk, 'username': data['username']}
+            for profile, (index, data, _) in zip(profiles, chunk)]
+
+
+def import_accounts(kind, rows, workers=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Importe `rows` (liste de dictionnaires) et retourne un résultat par ligne, dans l'ordre."""
+    results, accepted = validate_accounts(kind, rows)
+    passwords = hash_passwords([data.get('password') for _, data in accepted], workers)
+    pending = [(index, data, password) for (index, data), password in zip(accepted, passwords)]
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            written = write_chunk(kind, chunk)
+        except IntegrityError:
+            # Compte créé entre-temps par une autre requête : le lot est repris ligne par ligne
+            written = []
+            for row in chunk:
+                try:
+                    written.extend(write_chunk(kind, [row]))
+                except IntegrityError:
+                    written.append(conflict(row[0], 'username', "Nom d'utilisateur ou email déjà utilisé."))
+        for result in written:
+            results[result['index']] = result
+    if pending:
+        # bulk_create n'envoie pas de signaux : annuaire et validateurs HTTP invalidés
+        bump_generation(ACCOUNT_KINDS[kind][2])
+    return [results[index] for index in range(len(rows))]
@@ -1,8 +1,132 @@
 # service/admin.py
+"""
+Admin utilisable sur des tables de plusieurs millions de lignes : pas de
+COUNT(*) exact au-delà de ADMIN_EXACT_COUNT_LIMIT lignes estimées, pas de
+requête par ligne (clients et prestataires joints), pas de liste déroulante
+de toutes les lignes d'une table liée (autocomplétion ou saisie de l'id).
+"""
+import json
+
+from django import forms
+from django.conf import settings
 from django.contrib import admin
-from .models import Client, Provider, Reservation
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .availability import SlotUnavailable
+from .models import ACTIVE_STATUSES, Client, Provider, Reservation
+from .search import search_providers
+
+
+def estimate_count(queryset):
+    """Nombre de lignes estimé par PostgreSQL (statistiques du planificateur), None ailleurs."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    if not queryset.query.where:
+        # Table entière : reltuples, tenu à jour par ANALYZE / autovacuum (-1 si jamais analysée)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None
+    # Liste filtrée : estimation du plan, sans exécuter la requête
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    if isinstance(plan, list):
+        plan = plan[0]  # Texte brut du driver ; psycopg décode le JSON et Django n'en renvoie que l'objet
+    return int(plan['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator dont le total est estimé quand il dépasse ADMIN_EXACT_COUNT_LIMIT :
+    en dessous, le COUNT(*) exact reste rapide et est utilisé. Le nombre de pages
+    affiché est alors approximatif.
+    """
+
+    def estimate(self):
+        return estimate_count(self.object_list)
+
+    @cached_property
+    def count(self):
+        estimated = self.estimate()
+        if estimated is None or estimated < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimated
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # Sinon un second COUNT(*) sur toute la table à chaque filtre
+
+
+@admin.register(Client)
+class ClientAdmin(ScalableModelAdmin):
+    list_display = ('id', 'name', 'email', 'phone_number', 'updated_at')
+    search_fields = ('email', 'name')
+    ordering = ('id',)
+    raw_id_fields = ('user',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Email exact (index unique) ou début du nom, sensible à la casse (client_name_idx) : les
+        # recherches par défaut de l'admin (iexact, istartswith) passent par UPPER() et lisent toute la table
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if '@' in term:
+            return queryset.filter(email=term), False
+        return queryset.filter(name__startswith=term), False
+
+
+@admin.register(Provider)
+class ProviderAdmin(ScalableModelAdmin):
+    list_display = ('id', 'name', 'service', 'email', 'daily_capacity', 'updated_at')
+    search_fields = ('search_text',)
+    ordering = ('id',)  # Pages d'autocomplétion stables
+    raw_id_fields = ('user',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Même recherche que l'API, sur la colonne normalisée (index trigramme sous PostgreSQL)
+        if not search_term:
+            return queryset, False
+        return search_providers(queryset, search_term), False
+
+
+class ReservationAdminForm(forms.ModelForm):
+    class Meta:
+        model = Reservation
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        provider, date, status = cleaned_data.get('provider'), cleaned_data.get('date'), cleaned_data.get('status')
+        # self.instance porte encore les valeurs enregistrées : une place n'est à prendre que si la
+        # réservation devient active ou change de journée
+        original = self.instance
+        self.rebook = status in ACTIVE_STATUSES and (
+            original.pk is None or original.status not in ACTIVE_STATUSES
+            or original.provider_id != getattr(provider, 'pk', None) or original.date != date
+        )
+        if self.rebook and provider is not None and date is not None:
+            taken = (Reservation.objects.filter(provider=provider, date=date, status__in=ACTIVE_STATUSES)
+                     .exclude(pk=original.pk).count())
+            if taken >= provider.daily_capacity:
+                self.add_error('date', SlotUnavailable.default_detail)
+        return cleaned_data
+
+
+@admin.register(Reservation)
+class ReservationAdmin(ScalableModelAdmin):
+    form = ReservationAdminForm
+    list_display = ('id', 'client', 'provider', 'service', 'date', 'status', 'created_at')
+    list_select_related = ('client', 'provider')
+    # Statut : choix fixes, sans requête ; date : bornes servies par res_date_idx
+    list_filter = ('status', 'date')
+    date_hierarchy = 'date'
+    autocomplete_fields = ('client', 'provider')
+    readonly_fields = ('created_at', 'updated_at')
 
-# Enregistrez vos modèles ici
-admin.site.register(Client)
-admin.site.register(Provider)
-admin.site.register(Reservation)
\ No newline at end of file
+    def save_model(self, request, obj, form, change):
+        if form.rebook:
+            obj.slot = None  # Place libre attribuée par Reservation.save (book_slot)
+        super().save_model(request, obj, form, change)
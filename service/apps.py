@@ -1,6 +1,16 @@
+import logging
+
 from django.apps import AppConfig
 
+logger = logging.getLogger('service')
+
 
 class ServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'service'
+
+    def ready(self):
+        from . import checks, dbpool, outbox, signals  # noqa: F401
+        # gunicorn ne lance pas les vérifications système : le cache partagé est vérifié ici aussi
+        for message in checks.check_shared_cache():
+            logger.error('%s %s', message.msg, message.hint)
@@ -0,0 +1,68 @@
+"""
+Archivage des réservations terminées (rejetées, terminées, annulées).
+
+Les réservations dont la date est passée depuis plus de N jours quittent
+service_reservation pour ArchivedReservation, par lots bornés : chaque lot est
+une transaction courte (lecture verrouillée, INSERT groupé, DELETE groupé). Les
+listes ne lisent que la table chaude, sauf avec ?include_archived=1.
+Les statistiques (ReservationDayStat) comptent les deux tables : l'archivage
+ne les modifie pas.
+"""
+import heapq
+from operator import itemgetter
+
+from django.db import connections, router, transaction
+
+from .cache import bump_generation_on_commit
+from .models import TERMINAL_STATUSES, ArchivedReservation, Reservation
+
+ARCHIVE_FIELDS = [field.attname for field in ArchivedReservation._meta.concrete_fields]
+
+
+def wants_archived(request):
+    return request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+def cold_reservations(cutoff):
+    return Reservation.objects.filter(status__in=TERMINAL_STATUSES, date__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Déplace au plus `batch_size` réservations terminées antérieures à `cutoff`.
+    Retourne le nombre de lignes déplacées (0 : plus rien à archiver).
+    """
+    with transaction.atomic():
+        # Les lignes en cours d'écriture par une requête sont laissées pour un lot suivant
+        rows = list(
+            cold_reservations(cutoff).select_for_update(skip_locked=True)
+            .order_by('pk').values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedReservation.objects.bulk_create([ArchivedReservation(**row) for row in rows])
+        # DELETE direct : les signaux post_delete retireraient les lignes des statistiques
+        raw_delete(Reservation.objects.filter(pk__in=[row['id'] for row in rows]))
+        bump_generation_on_commit('reservations')
+    return len(rows)
+
+
+def raw_delete(queryset):
+    """
+    Supprime les lignes de `queryset` en un DELETE ... WHERE id IN (sous-requête),
+    sans Collector : ni signaux, ni suppression en cascade. Retourne le nombre de
+    lignes supprimées.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    subquery, params = queryset.order_by().values('pk').query.get_compiler(using).as_sql()
+    table, pk = connection.ops.quote_name(model._meta.db_table), connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({subquery})', params)
+        return cursor.rowcount
+
+
+def merge_by_id(*iterables):
+    # Fusion de flux déjà triés par id (premier champ), sans les charger en mémoire
+    return heapq.merge(*iterables, key=itemgetter(0))
@@ -0,0 +1,121 @@
+"""
+Lectures asynchrones des prestataires et des réservations (déploiement ASGI).
+
+Mêmes données, même pagination, mêmes ?fields= et mêmes règles d'accès que les
+vues DRF de service.views, mais servies par l'ORM asynchrone : sous un worker
+uvicorn, une requête qui attend la base ne bloque pas le worker. Ces vues sont en lecture
+seule et n'acceptent que l'authentification par session.
+"""
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .archive import wants_archived
+from .cache import acache_get, acache_set, aprovider_list_key, provider_detail_key
+from .identity import aget_identity
+from .models import ArchivedReservation, Provider, Reservation
+from .pagination import KeysetCursorPagination, ReservationCursorPagination
+from .serializers import ProviderSerializer, ReservationSerializer
+
+
+async def restrict_to_user(request, user, reservations):
+    # Équivalent asynchrone de ReservationQuerysetMixin.restrict_to_user
+    if user.is_superuser:
+        return reservations
+    identity = await aget_identity(request, user)
+    if identity['client_id'] is not None:
+        return reservations.filter(client_id=identity['client_id'])
+    if identity['provider_id'] is not None:
+        return reservations.filter(provider_id=identity['provider_id'])
+    return reservations.none()
+
+
+class AsyncReadView(View):
+    http_method_names = ['get', 'head', 'options']
+    login_required = True
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            user = await request.auser()
+            if self.login_required and not user.is_authenticated:
+                raise NotAuthenticated()
+            data = await self.read(request, user, *args, **kwargs)
+        except APIException as exc:
+            # Comme DRF avec SessionAuthentication en tête : pas de WWW-Authenticate, donc 403
+            status = 403 if isinstance(exc, NotAuthenticated) else exc.status_code
+            # Corps d'erreur de DRF : un ValidationError garde son dictionnaire de champs
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return self.render(data, status)
+        return self.render(data)
+
+    def render(self, data, status=200):
+        # Même corps JSON que les vues DRF
+        return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+    async def read(self, request, user, *args, **kwargs):
+        raise NotImplementedError
+
+
+class AsyncProviderList(AsyncReadView):
+    login_required = False  # Annuaire public, même cache que ProviderListCreate
+
+    async def read(self, request, user):
+        key = await aprovider_list_key(request)
+        data = await acache_get('provider_list', key)
+        if data is None:
+            fields = ProviderSerializer.parse_fields(request.GET.get('fields'))
+            paginator = KeysetCursorPagination()
+            providers = ProviderSerializer.prune_queryset(Provider.objects.all(), fields, paginator.ordering)
+            page = await paginator.apaginate_queryset(providers, Request(request))
+            data = paginator.get_paginated_data(ProviderSerializer(page, many=True, fields=fields).data)
+            await acache_set(key, data)
+        return data
+
+
+class AsyncProviderDetail(AsyncReadView):
+    async def read(self, request, user, pk):
+        fields = ProviderSerializer.parse_fields(request.GET.get('fields'))
+        key = provider_detail_key(pk)
+        cached = await acache_get('provider_detail', key)
+        if cached is None:
+            providers = Provider.objects.all() if user.is_superuser else Provider.objects.filter(user=user)
+            try:
+                instance = await providers.aget(pk=pk)
+            except Provider.DoesNotExist:
+                raise NotFound()
+            cached = {'user_id': instance.user_id, 'data': ProviderSerializer(instance).data}
+            await acache_set(key, cached)
+        elif not (user.is_superuser or cached['user_id'] == user.id):
+            raise NotFound()
+        if fields is None:
+            return cached['data']
+        return {name: value for name, value in cached['data'].items() if name in fields}
+
+
+class AsyncReservationList(AsyncReadView):
+    async def read(self, request, user):
+        drf_request = Request(request)
+        fields = ReservationSerializer.parse_fields(request.GET.get('fields'))
+        paginator = ReservationCursorPagination()
+        reservations = await restrict_to_user(request, user, Reservation.objects.with_parties())
+        reservations = ReservationSerializer.prune_queryset(reservations, fields, paginator.ordering)
+        if wants_archived(drf_request):
+            archived = await restrict_to_user(request, user, ArchivedReservation.objects.with_parties())
+            archived = ReservationSerializer.prune_queryset(archived, fields, paginator.ordering)
+            page = await paginator.apaginate_querysets([reservations, archived], drf_request)
+        else:
+            page = await paginator.apaginate_queryset(reservations, drf_request)
+        return paginator.get_paginated_data(ReservationSerializer(page, many=True, fields=fields).data)
+
+
+class AsyncReservationDetail(AsyncReadView):
+    async def read(self, request, user, pk):
+        fields = ReservationSerializer.parse_fields(request.GET.get('fields'))
+        reservations = await restrict_to_user(request, user, Reservation.objects.with_parties())
+        try:
+            instance = await ReservationSerializer.prune_queryset(reservations, fields).aget(pk=pk)
+        except Reservation.DoesNotExist:
+            raise NotFound()
+        return ReservationSerializer(instance, fields=fields).data
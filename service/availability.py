@@ -0,0 +1,87 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import ACTIVE_STATUSES, Reservation
+
+MAX_RANGE_DAYS = 366
+
+
+class SlotUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Ce prestataire n'a plus de disponibilité à cette date."
+    default_code = 'slot_unavailable'
+
+
+def book_slot(save, provider, date, exclude_pk=None):
+    """
+    Enregistre une réservation active dans une place libre du prestataire.
+
+    `save(slot)` écrit la ligne. La contrainte unique res_unique_active_slot
+    arbitre les requêtes concurrentes : en cas de collision on tente la place
+    suivante, sans verrou applicatif.
+    """
+    taken = Reservation.objects.filter(provider=provider, date=date, status__in=ACTIVE_STATUSES)
+    if exclude_pk is not None:
+        taken = taken.exclude(pk=exclude_pk)
+    taken = set(taken.values_list('slot', flat=True))
+    for slot in range(provider.daily_capacity):
+        if slot in taken:
+            continue
+        try:
+            with transaction.atomic():
+                return save(slot)
+        except IntegrityError:
+            continue  # Place prise entre-temps par une autre requête
+    raise SlotUnavailable()
+
+
+def daily_availability(provider_id, capacity, start, end):
+    # Une seule requête groupée par date sur l'index (provider, date)
+    booked = dict(
+        Reservation.objects
+        .filter(provider_id=provider_id, date__range=(start, end), status__in=ACTIVE_STATUSES)
+        .values_list('date')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    days = []
+    day = start
+    while day <= end:
+        count = booked.get(day, 0)
+        days.append({'date': day, 'booked': count, 'free': max(capacity - count, 0)})
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def allocate_slots(requests):
+    """
+    Attribue des places libres à un lot de réservations en une seule requête.
+
+    `requests` est une liste de (clé, provider_id, date, capacité). Retourne
+    {clé: place}, ou {clé: None} quand la journée est complète. Les places sont
+    de nouveau vérifiées par la contrainte unique à l'insertion.
+    """
+    if not requests:
+        return {}
+    provider_ids = {provider_id for _, provider_id, _, _ in requests}
+    dates = {date for _, _, date, _ in requests}
+    taken = {}
+    rows = (
+        Reservation.objects
+        .filter(provider_id__in=provider_ids, date__in=dates, status__in=ACTIVE_STATUSES)
+        .values_list('provider_id', 'date', 'slot')
+    )
+    for provider_id, date, slot in rows:
+        taken.setdefault((provider_id, date), set()).add(slot)
+    allocated = {}
+    for key, provider_id, date, capacity in requests:
+        used = taken.setdefault((provider_id, date), set())
+        slot = next((candidate for candidate in range(capacity) if candidate not in used), None)
+        if slot is not None:
+            used.add(slot)
+        allocated[key] = slot
+    return allocated
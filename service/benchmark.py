@@ -0,0 +1,27 @@
+from collections import Counter
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def summarize(results, elapsed):
+    """
+    Résumé d'une série de requêtes : `results` est une liste de (statut HTTP,
+    durée en secondes, nombre de requêtes SQL ou None), `elapsed` la durée totale.
+    """
+    latencies = [duration * 1000 for _, duration, _ in results]
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'requests': len(results),
+        'statuses': {str(code): count for code, count in sorted(Counter(code for code, _, _ in results).items())},
+        'errors': sum(code >= 400 for code, _, _ in results),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
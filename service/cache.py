@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class CacheStats:
+    # Compteurs de hits / misses du processus courant
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, name, hit):
+        key = (name, 'hit' if hit else 'miss')
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def get_timeout():
+    return getattr(settings, 'PROVIDER_CACHE_TIMEOUT', 300)
+
+
+def get_generation(name):
+    # Compteur de version d'un modèle, incrémenté à chaque modification.
+    # Initialisé à l'horloge pour ne jamais retomber sur une génération déjà utilisée.
+    return cache.get_or_set(f'{name}:generation', time.time_ns, None)
+
+
+async def aget_generation(name):
+    return await cache.aget_or_set(f'{name}:generation', time.time_ns, None)
+
+
+def bump_generation(name):
+    try:
+        cache.incr(f'{name}:generation')
+    except ValueError:
+        cache.set(f'{name}:generation', time.time_ns(), None)
+
+
+def bump_generation_on_commit(name):
+    # Immédiatement, puis de nouveau après commit : un lecteur concurrent a pu lire
+    # l'ancienne version sous la nouvelle génération avant la fin de la transaction
+    bump_generation(name)
+    transaction.on_commit(lambda: bump_generation(name))
+
+
+def request_digest(request):
+    return hashlib.sha1(f'{request.get_host()}{request.get_full_path()}'.encode('utf-8')).hexdigest()
+
+
+def provider_list_key(request):
+    return f'providers:list:{get_generation("providers")}:{request_digest(request)}'
+
+
+async def aprovider_list_key(request):
+    return f'providers:list:{await aget_generation("providers")}:{request_digest(request)}'
+
+
+def provider_detail_key(pk):
+    return f'providers:detail:{pk}'
+
+
+def cache_get(name, key):
+    value = cache.get(key)
+    stats.record(name, value is not None)
+    return value
+
+
+async def acache_get(name, key):
+    value = await cache.aget(key)
+    stats.record(name, value is not None)
+    return value
+
+
+def cache_set(key, value):
+    cache.set(key, value, get_timeout())
+
+
+async def acache_set(key, value):
+    await cache.aset(key, value, get_timeout())
+
+
+def invalidate_provider(pk):
+    # Les listes sont indexées par génération : l'incrémenter les invalide toutes
+    cache.delete(provider_detail_key(pk))
+    bump_generation('providers')
@@ -0,0 +1,30 @@
+"""
+Vérifications système (manage.py check, migrate, runserver), relues au
+démarrage des workers (cf. ServiceConfig.ready).
+"""
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs=None, **kwargs):
+    # Invalidations (annuaire, identités), seaux de limitation de débit et compteurs de l'outbox
+    # supposent un cache commun à tous les workers
+    if settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES:
+        return []
+    workers = int(os.environ.get('WEB_CONCURRENCY', '1'))  # Lu aussi par gunicorn
+    if workers <= 1:
+        return []  # Un seul processus : son cache est commun à toutes les requêtes
+    msg = (f"Cache propre à chaque processus avec {workers} workers : invalidations, quotas et "
+           "compteurs ne sont pas partagés.")
+    hint = 'Définissez REDIS_URL (cache Redis partagé entre les workers).'
+    if not settings.DEBUG:
+        return [Error(msg, hint=hint, id='service.E001')]
+    return [Warning(msg, hint=hint, id='service.W001')]
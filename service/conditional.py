@@ -0,0 +1,74 @@
+import datetime
+import hashlib
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_generation
+
+
+class ConditionalGetMixin:
+    """
+    Requêtes conditionnelles (If-None-Match / If-Modified-Since) pour les vues génériques.
+
+    Vue détail : validateurs tirés de `updated_at` de la ligne, lu par une requête
+    légère. Last-Modified n'a qu'une résolution d'une seconde : il n'est envoyé
+    que pour une ligne inchangée depuis plus d'une seconde, et jamais quand la
+    réponse contient des champs d'autres modèles (`validator_generations`), que
+    seul l'ETag suit.
+
+    Première page d'une liste : ETag tiré des générations du cache (cf.
+    service.cache), incrémentées à chaque écriture de la collection, sans
+    requête ; un agrégat sur la collection filtrée parcourrait des millions de
+    lignes à chaque sondage. Pas de Last-Modified, pas de validateur pour les
+    pages suivantes (curseur). Un 304 est renvoyé sans charger ni sérialiser les
+    objets.
+    """
+    # Générations des modèles dont les champs apparaissent dans la réponse
+    validator_generations = ()
+    # Génération incrémentée à chaque écriture de la collection : sans elle, pas de validateur de liste
+    list_generation = None
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+        response = super().get(request, *args, **kwargs)
+        if etag is not None and response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_validators(self, request):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        generations = list(self.validator_generations)
+        if lookup_url_kwarg in self.kwargs:
+            queryset = self.filter_queryset(self.get_queryset()).order_by()
+            updated_at = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list('updated_at', flat=True).first()
+            if updated_at is None:
+                return None, None  # Laisse la vue répondre 404
+            # La représentation dépend aussi de la query string (?fields=)
+            parts = [self.kwargs[lookup_url_kwarg], updated_at.isoformat(), request.get_full_path()]
+            # Une seconde écriture dans la même seconde donnerait le même Last-Modified (RFC 9110, 8.8.2.2)
+            if self.validator_generations or timezone.now() - updated_at < datetime.timedelta(seconds=1):
+                updated_at = None
+        else:
+            cursor_query_param = getattr(self.paginator, 'cursor_query_param', None)
+            if self.list_generation is None or (cursor_query_param and cursor_query_param in request.query_params):
+                return None, None
+            # Le filtrage (utilisateur, query string) est dans l'ETag, la collection dans la génération
+            parts = [request.get_full_path()]
+            generations.append(self.list_generation)
+            updated_at = None  # Pas de Last-Modified
+        if generations:
+            values = cache.get_many([f'{name}:generation' for name in generations])
+            # Génération absente (cache vidé ou évincé) : créée, sinon l'ETag changerait à la prochaine lecture
+            parts.extend(values.get(f'{name}:generation') or get_generation(name) for name in generations)
+        parts.append(request.user.pk)
+        digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+        return f'"{digest}"', int(updated_at.timestamp()) if updated_at else None
@@ -0,0 +1,83 @@
+"""
+Statistiques des pools de connexions PostgreSQL (DATABASE_POOL=True, cf. settings).
+
+Avec le pool, Django emprunte une connexion déjà ouverte au début de chaque
+requête et la rend à la fin : ni TCP, ni TLS, ni authentification dans la
+latence. Chaque processus a son pool, dont l'état est exporté à /api/metrics :
+connexions utilisées et libres, requêtes en attente, attente cumulée, délais
+dépassés et connexions écartées par le contrôle à l'emprunt.
+"""
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+# Pools de ce processus, par alias, relevés à l'ouverture des connexions
+POOLS = {}
+
+
+@receiver(connection_created)
+def record_pool(sender, connection, **kwargs):
+    # Chaque emprunt au pool ouvre une connexion côté Django : `connection.pool` existe déjà
+    if connection.vendor == 'postgresql' and connection.settings_dict.get('OPTIONS', {}).get('pool'):
+        POOLS[connection.alias] = connection.pool
+
+
+def get_pools():
+    # Pools déjà créés uniquement (lire `connection.pool` en créerait un), sauf ceux fermés depuis (close_pool)
+    return {alias: pool for alias, pool in POOLS.items() if not getattr(pool, 'closed', False)}
+
+
+def ensure_pool_size(size):
+    """
+    Porte les pools de ce processus à au moins `size` connexions : les pools sont
+    dimensionnés pour les workers web (une par thread), une commande qui lance
+    plusieurs threads sur la base (runoutbox) les élargit pour elle seule.
+    """
+    created = get_pools()
+    for alias in connections:
+        options = connections.settings[alias].get('OPTIONS', {}).get('pool')
+        if not isinstance(options, dict) or options.get('max_size', size) >= size:
+            continue
+        options['max_size'] = size
+        if alias in created:
+            created[alias].resize(options.get('min_size', 1), size)
+
+
+def pool_stats():
+    # {alias: statistiques de psycopg_pool} ; les compteurs jamais incrémentés sont absents
+    return {alias: pool.get_stats() for alias, pool in get_pools().items()}
+
+
+# (métrique, aide, clé de get_stats(), facteur)
+POOL_COUNTERS = [
+    ('db_pool_checkouts_total', 'Connexions empruntées au pool.', 'requests_num', 1),
+    ('db_pool_checkouts_queued_total', "Emprunts qui ont dû attendre une connexion libre.", 'requests_queued', 1),
+    ('db_pool_checkout_wait_seconds_total', "Attente cumulée d'une connexion libre.", 'requests_wait_ms', 0.001),
+    ('db_pool_checkout_errors_total', "Emprunts échoués (délai DATABASE_POOL_TIMEOUT dépassé).", 'requests_errors', 1),
+    ('db_pool_connections_opened_total', 'Connexions ouvertes par le pool.', 'connections_num', 1),
+    ('db_pool_connect_seconds_total', "Temps cumulé d'ouverture des connexions.", 'connections_ms', 0.001),
+    ('db_pool_connections_lost_total', "Connexions écartées par le contrôle à l'emprunt.", 'connections_lost', 1),
+    ('db_pool_returns_bad_total', 'Connexions rendues dans un état inutilisable.', 'returns_bad', 1),
+]
+
+
+@metrics.register_process_collector
+def pool_metrics():
+    stats = pool_stats()
+    if not stats:
+        return []
+    connections_gauge = metrics.Gauge('db_pool_connections', 'Connexions du pool, par état.', ('alias', 'state'))
+    max_gauge = metrics.Gauge('db_pool_max_connections', 'Taille maximale du pool.', ('alias',))
+    waiting_gauge = metrics.Gauge('db_pool_waiting_requests', "Requêtes en attente d'une connexion.", ('alias',))
+    counters = [(metrics.Counter(name, help_text, ('alias',)), key, factor) for name, help_text, key, factor in POOL_COUNTERS]
+    for alias, values in stats.items():
+        idle = values.get('pool_available', 0)
+        connections_gauge.set((alias, 'in_use'), values.get('pool_size', 0) - idle)
+        connections_gauge.set((alias, 'idle'), idle)
+        max_gauge.set((alias,), values.get('pool_max', 0))
+        waiting_gauge.set((alias,), values.get('requests_waiting', 0))
+        for counter, key, factor in counters:
+            counter.inc((alias,), values.get(key, 0) * factor)
+    return [connections_gauge, max_gauge, waiting_gauge] + [counter for counter, _, _ in counters]
@@ -0,0 +1,57 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .archive import merge_by_id
+
+EXPORT_FIELDS = [
+    'id', 'date', 'status', 'service',
+    'client_id', 'client__name', 'provider_id', 'provider__name',
+    'created_at', 'updated_at',
+]
+EXPORT_HEADER = [field.replace('__', '_') for field in EXPORT_FIELDS]
+CHUNK_SIZE = 2000
+
+
+class _Echo:
+    # Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de la stocker
+    def write(self, value):
+        return value
+
+
+def iter_rows(*querysets):
+    # Tuples joints lus par curseur serveur (PostgreSQL) : aucune instance de modèle.
+    # Plusieurs querysets triés par id (réservations archivées) sont fusionnés à la volée.
+    streams = [queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=CHUNK_SIZE) for queryset in querysets]
+    return streams[0] if len(streams) == 1 else merge_by_id(*streams)
+
+
+def _batched(lines):
+    # Regroupe les lignes pour limiter le nombre d'écritures sur la socket
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= 500:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_csv(*querysets):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(EXPORT_HEADER)
+        for row in iter_rows(*querysets):
+            yield writer.writerow(row)
+    return _batched(lines())
+
+
+def stream_ndjson(*querysets):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+    def lines():
+        for row in iter_rows(*querysets):
+            yield encoder.encode(dict(zip(EXPORT_HEADER, row))) + '\n'
+    return _batched(lines())
@@ -0,0 +1,33 @@
+"""
+Hachage de mots de passe en parallèle, dans un pool de processus.
+
+Module sans import de modèles : les processus fils (démarrés en `spawn`, jamais
+par fork d'un worker web qui a des threads et des connexions ouvertes) l'importent
+sans initialiser Django. Ils reçoivent les PASSWORD_HASHERS du parent.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+def _configure(hashers):
+    settings.PASSWORD_HASHERS = hashers
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Retourne les hachages de `passwords`, dans l'ordre. None donne un mot de
+    passe inutilisable, sans coût. En dessous de deux mots de passe par
+    processus, le hachage se fait sur place : démarrer le pool coûterait plus.
+    """
+    workers = workers or os.cpu_count() or 1
+    clear = [password for password in passwords if password is not None]
+    if workers == 1 or len(clear) < 2 * workers:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_configure, initargs=(list(settings.PASSWORD_HASHERS),)) as pool:
+        hashed = iter(list(pool.map(make_password, clear, chunksize=max(1, len(clear) // (workers * 4)))))
+    return [next(hashed) if password is not None else make_password(None) for password in passwords]
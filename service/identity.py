@@ -0,0 +1,98 @@
+"""
+Rôle et profil de l'utilisateur connecté, résolus une fois et portés par la session.
+
+L'identité est calculée à la connexion par une seule requête (LEFT JOIN vers les
+deux profils) puis lue dans la session : les contrôles de rôle des vues ne font
+plus de requête. La modification ou la suppression d'un profil pose une marque
+d'invalidation en cache ; une identité plus ancienne est recalculée.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+IDENTITY_SESSION_KEY = '_identity'
+
+# Champs renvoyés par LoginView et /api/me/
+PUBLIC_FIELDS = ('id', 'username', 'email', 'user_type', 'profile_id', 'phone_number')
+
+
+def invalidation_key(user_id):
+    return f'identity:{user_id}:invalidated'
+
+
+def invalidate_identity(user_id):
+    # Conservée aussi longtemps qu'une session peut vivre
+    cache.set(invalidation_key(user_id), time.time(), settings.SESSION_COOKIE_AGE)
+
+
+def identity_row(user):
+    return User.objects.filter(pk=user.pk).values_list(
+        'client_profile__id', 'client_profile__phone_number',
+        'provider_profile__id', 'provider_profile__phone_number',
+    )
+
+
+def build_identity(user, row):
+    client_id, client_phone, provider_id, provider_phone = row
+    identity = {
+        'id': user.pk, 'username': user.username, 'email': user.email,
+        'user_type': 'user', 'profile_id': user.pk, 'phone_number': None,  # Valeurs par défaut
+        'client_id': client_id, 'provider_id': provider_id, 'resolved_at': time.time(),
+    }
+    if user.is_superuser:
+        identity['user_type'] = 'admin'
+    elif client_id is not None:
+        identity.update(user_type='client', profile_id=client_id, phone_number=client_phone)
+    elif provider_id is not None:
+        identity.update(user_type='provider', profile_id=provider_id, phone_number=provider_phone)
+    return identity
+
+
+def resolve_identity(user):
+    return build_identity(user, identity_row(user).get())
+
+
+async def aresolve_identity(user):
+    return build_identity(user, await identity_row(user).aget())
+
+
+def store_identity(session, identity):
+    session[IDENTITY_SESSION_KEY] = identity
+
+
+def is_current(identity, user_id, invalidated_at):
+    return identity is not None and str(identity['id']) == str(user_id) and identity['resolved_at'] > (invalidated_at or 0)
+
+
+def session_identity(session):
+    # Sans requête : l'identité portée par la session, si elle est encore valable
+    user_id = session.get(SESSION_KEY)
+    identity = session.get(IDENTITY_SESSION_KEY)
+    if user_id is not None and is_current(identity, user_id, cache.get(invalidation_key(user_id))):
+        return identity
+    return None
+
+
+def get_identity(request):
+    user = request.user
+    identity = session_identity(request.session)
+    if identity is None or identity['id'] != user.pk:
+        identity = resolve_identity(user)
+        # Seulement pour une session de cet utilisateur (pas pour l'authentification Basic)
+        if request.session.get(SESSION_KEY) == str(user.pk):
+            store_identity(request.session, identity)
+    return identity
+
+
+async def aget_identity(request, user):
+    session = request.session
+    user_id = await session.aget(SESSION_KEY)
+    identity = await session.aget(IDENTITY_SESSION_KEY)
+    if user_id != str(user.pk) or not is_current(identity, user.pk, await cache.aget(invalidation_key(user.pk))):
+        identity = await aresolve_identity(user)
+        if user_id == str(user.pk):
+            await session.aset(IDENTITY_SESSION_KEY, identity)
+    return identity
@@ -0,0 +1,40 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from service.archive import archive_batch
+
+
+class Command(BaseCommand):
+    help = ("Déplace les réservations terminées (rejetées, terminées, annulées) dont la date est passée "
+            "depuis plus de N jours vers la table d'archive, par lots bornés. Peut être interrompue et relancée.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180,
+                            help="Âge minimal (jours depuis la date de la réservation). Défaut : 180.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Réservations déplacées par transaction. Défaut : 1000.")
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Nombre maximal de lots pour cette exécution (défaut : jusqu'à épuisement).")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Pause en secondes entre deux lots, pour laisser passer le trafic.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days doit être positif et --batch-size supérieur à 0.")
+        cutoff = timezone.localdate() - datetime.timedelta(days=options['days'])
+        total = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'lot {batches} : {moved} réservation(s)')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} réservation(s) antérieure(s) au {cutoff} archivée(s) en {batches} lot(s).'))
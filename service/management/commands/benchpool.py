@@ -0,0 +1,93 @@
+import importlib.util
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from service.dbpool import pool_stats
+from service.management.commands import benchserving
+
+MODES = ('direct', 'persistent', 'pool')
+
+
+class Command(benchserving.Command):
+    help = ("Mesure ce que coûte l'ouverture des connexions dans la latence des requêtes, à concurrence égale : "
+            "une connexion par requête (CONN_MAX_AGE=0), une connexion persistante par thread (CONN_MAX_AGE=600), "
+            "puis le pool psycopg (PostgreSQL uniquement). L'application WSGI est appelée en mémoire.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requêtes mesurées par mode.')
+        parser.add_argument('--threads', type=int, default=8, help="Requêtes simultanées, comme les threads d'un worker.")
+        parser.add_argument('--path', default='/api/providers/')
+        parser.add_argument('--username', help='Utilisateur authentifié par session (vues réservations).')
+        parser.add_argument('--modes', default=','.join(MODES), help=f"Modes mesurés, parmi {', '.join(MODES)}.")
+        parser.add_argument('--pool-size', type=int, default=4, help="max_size du pool si DATABASE_POOL n'est pas activé.")
+        parser.add_argument('--keep-cache', action='store_true', help='Garde le cache configuré au lieu de le désactiver.')
+
+    def handle(self, *args, **options):
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+        session = self.open_session(options['username']) if options['username'] else None
+        cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}' if session else ''
+        caches = {} if options['keep_cache'] else {'CACHES': benchserving.DUMMY_CACHES}
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip() in MODES]
+
+        self.stdout.write(f"{options['path']}, {options['requests']} requêtes par mode, {options['threads']} threads")
+        try:
+            with override_settings(**caches):
+                for mode in modes:
+                    if mode == 'pool' and not self.pool_supported():
+                        self.stdout.write('pool        : ignoré (PostgreSQL et psycopg[pool] requis)')
+                        continue
+                    self.run_mode(mode, options, host, cookie)
+        finally:
+            if session:
+                session.delete()
+
+    def pool_supported(self):
+        return connections['default'].vendor == 'postgresql' and importlib.util.find_spec('psycopg_pool') is not None
+
+    def run_mode(self, mode, options, host, cookie):
+        # Réglages partagés par les connexions de tous les threads, restaurés après la mesure
+        database = connections.settings['default']
+        saved = database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS'], database.get('OPTIONS', {})
+        database_options = {key: value for key, value in saved[2].items() if key != 'pool'}
+        if mode == 'pool':
+            configured = saved[2].get('pool')
+            pool = dict(configured) if isinstance(configured, dict) else {'min_size': options['pool_size'], 'max_size': options['pool_size']}
+            # Pool des workers (une connexion par thread) : élargi aux threads de la mesure
+            pool['max_size'] = max(pool.get('max_size', 1), options['threads'])
+            database_options['pool'] = pool
+        database.update(CONN_MAX_AGE=600 if mode == 'persistent' else 0, CONN_HEALTH_CHECKS=mode == 'pool', OPTIONS=database_options)
+
+        opened, lock = [0], threading.Lock()
+
+        def count(sender, connection, **kwargs):
+            with lock:
+                opened[0] += 1
+
+        connections.close_all()
+        connection_created.connect(count)
+        try:
+            # Échauffement : le pool est mesuré une fois ouvert, comme un worker en service
+            self.run_sync(options['path'], options['threads'], options['threads'], host, cookie)
+            opened[0] = 0
+            results, elapsed = self.run_sync(options['path'], options['requests'], options['threads'], host, cookie)
+            stats = pool_stats().get('default', {}) if mode == 'pool' else {}
+        finally:
+            connection_created.disconnect(count)
+            if mode == 'pool':
+                connections['default'].close_pool()
+            connections.close_all()
+            database.update(CONN_MAX_AGE=saved[0], CONN_HEALTH_CHECKS=saved[1], OPTIONS=saved[2])
+
+        self.report(f'{mode:<11}', results, elapsed)
+        if mode == 'pool':
+            # Avec le pool, connection_created est émis à chaque emprunt : on lit ses propres compteurs
+            queued = stats.get('requests_queued', 0)
+            wait = stats.get('requests_wait_ms', 0) / queued if queued else 0
+            self.stdout.write(f"            connexions ouvertes depuis le démarrage du pool : {stats.get('connections_num', 0)}, "
+                              f"emprunts en attente : {queued} ({wait:.1f} ms en moyenne), délais dépassés : {stats.get('requests_errors', 0)}")
+        else:
+            self.stdout.write(f'            connexions ouvertes pendant la mesure : {opened[0]}')
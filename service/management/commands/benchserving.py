@@ -0,0 +1,169 @@
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from service.benchmark import percentile
+from service.sessions import REFRESHED_AT_KEY
+
+# Sans cache, chaque requête atteint la base : c'est le chemin que l'on mesure
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class DatabaseDelay:
+    # execute_wrapper : simule une base lente (latence réseau, verrous...)
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.delay)
+        return execute(sql, params, many, context)
+
+    def attach(self, sender, connection, **kwargs):
+        # En tête de liste : connection.execute_wrapper() retire le dernier wrapper en sortie
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, self)
+
+
+class Command(BaseCommand):
+    help = ("Compare le débit des lectures WSGI (vues DRF synchrones) et ASGI (vues de /api/async/) "
+            "quand chaque requête SQL est retardée. Les applications sont appelées en mémoire, sans réseau.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requêtes par mode.')
+        parser.add_argument('--db-delay', type=float, default=20.0, help='Latence ajoutée à chaque requête SQL (ms).')
+        parser.add_argument('--sync-workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 4)),
+                            help='Requêtes WSGI simultanées, comme autant de workers gunicorn synchrones.')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requêtes ASGI en vol dans la boucle.')
+        parser.add_argument('--sync-path', default='/api/providers/')
+        parser.add_argument('--async-path', default='/api/async/providers/')
+        parser.add_argument('--username', help='Utilisateur authentifié par session (vues réservations).')
+        parser.add_argument('--keep-cache', action='store_true', help='Garde le cache configuré au lieu de le désactiver.')
+
+    def handle(self, *args, **options):
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+        session = self.open_session(options['username']) if options['username'] else None
+        cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}' if session else ''
+        delay = DatabaseDelay(options['db_delay'] / 1000)
+        caches = {} if options['keep_cache'] else {'CACHES': DUMMY_CACHES}
+
+        # Le wrapper est posé sur chaque connexion ouverte pendant la mesure, dans tous les threads
+        connections.close_all()
+        connection_created.connect(delay.attach)
+        try:
+            with override_settings(**caches):
+                sync = self.run_sync(options['sync_path'], options['requests'], options['sync_workers'], host, cookie)
+                asyncio_result = asyncio.run(self.run_async(options['async_path'], options['requests'], options['concurrency'], host, cookie))
+        finally:
+            connection_created.disconnect(delay.attach)
+            connections.close_all()
+            for connection in connections.all():
+                if delay in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(delay)
+            if session:
+                session.delete()
+
+        self.stdout.write(f"Latence SQL simulée : {options['db_delay']:.0f} ms, {options['requests']} requêtes par mode")
+        self.report(f"WSGI  {options['sync_path']} ({options['sync_workers']} workers)", *sync)
+        self.report(f"ASGI  {options['async_path']} ({options['concurrency']} en vol)", *asyncio_result)
+        if sync[1] and asyncio_result[1]:
+            self.stdout.write(f'Débit ASGI / WSGI : x{sync[1] / asyncio_result[1]:.1f}')
+
+    def open_session(self, username):
+        # Session créée comme par LoginView, sans passer par le hachage du mot de passe
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur '{username}' introuvable.")
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session[REFRESHED_AT_KEY] = int(time.time())
+        session.save()
+        return session
+
+    def run_sync(self, path, total, workers, host, cookie):
+        application = get_wsgi_application()
+        path_info, _, query_string = path.partition('?')
+
+        def call(_):
+            statuses = []
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path_info, 'QUERY_STRING': query_string,
+                'SERVER_NAME': host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': host, 'HTTP_COOKIE': cookie,
+                'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+            }
+            started = time.perf_counter()
+            body = application(environ, lambda status, headers, exc_info=None: statuses.append(int(status[:3])))
+            try:
+                b''.join(body)
+            finally:
+                body.close()  # request_finished, comme sous gunicorn
+            return statuses[0], time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(call, range(total)))
+        return results, time.perf_counter() - started
+
+    async def run_async(self, path, total, concurrency, host, cookie):
+        application = get_asgi_application()
+        path_info, _, query_string = path.partition('?')
+        headers = [(b'host', host.encode())] + ([(b'cookie', cookie.encode())] if cookie else [])
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path_info, 'raw_path': path_info.encode(),
+                'query_string': query_string.encode(), 'root_path': '', 'headers': headers,
+                'client': ('127.0.0.1', 0), 'server': (host, 80),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            statuses = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await asyncio.Future()  # Le client reste connecté jusqu'à la fin de la réponse
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                return statuses[0], time.perf_counter() - started
+
+        # Comme sous SERVER_INTERFACE=asgi : pas de connexion persistante (cf. settings)
+        database = connections.settings['default']
+        conn_max_age, database['CONN_MAX_AGE'] = database['CONN_MAX_AGE'], 0
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(call() for _ in range(total)))
+            return results, time.perf_counter() - started
+        finally:
+            database['CONN_MAX_AGE'] = conn_max_age
+
+    def report(self, label, results, elapsed):
+        latencies = [duration * 1000 for _, duration in results]
+        errors = sum(status != 200 for status, _ in results)
+        self.stdout.write(
+            f'{label} : {len(results) / elapsed:.1f} req/s, p50 {percentile(latencies, 0.5):.0f} ms, '
+            f'p95 {percentile(latencies, 0.95):.0f} ms, {errors} erreur(s)'
+        )
@@ -0,0 +1,166 @@
+import datetime
+import random
+import re
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import URLPattern
+from rest_framework.generics import GenericAPIView
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from service import urls as service_urls
+from service.models import ACTIVE_STATUSES, Client, Provider, Reservation
+
+# Parcours complet d'une table, selon le moteur
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)'),
+}
+
+# Paramètres de requête représentatifs pour les vues qui en exigent
+EXPLAIN_PARAMS = {
+    'provider_search': {'q': 'serv'},
+}
+
+# Parcours attendus : la recherche n'a pas d'index trigramme hors PostgreSQL
+EXPECTED_SCANS = {
+    'sqlite': {'provider_search'},
+}
+
+
+class Command(BaseCommand):
+    help = ("Exécute EXPLAIN sur le get_queryset de chaque vue de l'API, pour chaque rôle, "
+            "et signale les parcours séquentiels des tables de l'application.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Génère N réservations avant l'analyse (annulées en fin de commande).")
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        pattern = SEQ_SCAN_PATTERNS.get(vendor)
+        if pattern is None:
+            raise CommandError(f"Moteur '{vendor}' non pris en charge (postgresql ou sqlite).")
+
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            findings = self.check_views(pattern, options['verbosity'])
+            # Le jeu de données généré ne doit jamais rester en base
+            transaction.set_rollback(True)
+
+        if findings:
+            for name, table in findings:
+                self.stdout.write(self.style.ERROR(f'{name}: parcours séquentiel de {table}'))
+            raise CommandError(f'{len(findings)} parcours séquentiel(s) détecté(s).')
+        self.stdout.write(self.style.SUCCESS('Aucun parcours séquentiel détecté.'))
+
+    def check_views(self, pattern, verbosity):
+        findings = []
+        expected = EXPECTED_SCANS.get(connection.vendor, set())
+        for url_name, name, queryset in self.iter_querysets():
+            plan = queryset.explain()
+            if verbosity >= 2:
+                self.stdout.write(f'--- {name}\n{plan}')
+            for table in pattern.findall(plan):
+                if not table.startswith('service_'):
+                    continue
+                if url_name in expected:
+                    self.stdout.write(self.style.WARNING(f'{name}: parcours de {table} attendu sur {connection.vendor}'))
+                else:
+                    findings.append((name, table))
+        return findings
+
+    def iter_querysets(self):
+        factory = APIRequestFactory()
+        users = self.get_role_users()
+        for url_pattern in service_urls.urlpatterns:
+            view_class = getattr(url_pattern.callback, 'view_class', None)
+            if not isinstance(url_pattern, URLPattern) or view_class is None or not issubclass(view_class, GenericAPIView):
+                continue
+            is_detail = 'pk' in url_pattern.pattern.converters
+            for role, user in users.items():
+                http_request = factory.get('/', EXPLAIN_PARAMS.get(url_pattern.name, {}))
+                http_request.session = SessionStore()  # Session vide : l'identité est résolue par requête
+                request = Request(http_request)
+                request.user = user
+                view = view_class(request=request, args=(), kwargs={}, format_kwarg=None)
+                if not all(permission.has_permission(request, view) for permission in view.get_permissions()):
+                    continue
+                queryset = view.get_queryset()
+                label = f'{url_pattern.name} [{role}]'
+                first = self.get_first(view, queryset)
+                if first is None:
+                    self.stdout.write(self.style.WARNING(f'{label}: aucune ligne, ignoré'))
+                    continue
+                if is_detail:
+                    yield url_pattern.name, label, queryset.filter(pk=first.pk)
+                else:
+                    yield url_pattern.name, label, self.get_next_page(view, queryset, first)
+
+    def get_first(self, view, queryset):
+        paginator = view.paginator
+        if paginator is not None and hasattr(paginator, 'get_ordering'):
+            return queryset.order_by(*paginator.get_ordering()).first()
+        return queryset.first()
+
+    def get_next_page(self, view, queryset, first):
+        # La requête d'une page suivante, telle que la pagination keyset l'exécute
+        paginator = view.paginator
+        if paginator is None or not hasattr(paginator, 'get_keyset_filter'):
+            return queryset
+        ordering = paginator.get_ordering()
+        keyset = paginator.get_keyset_filter(ordering, paginator.get_position(first))
+        return queryset.order_by(*ordering).filter(keyset)[:paginator.page_size + 1]
+
+    def get_role_users(self):
+        users = {'admin': User(username='explain-admin', is_superuser=True, is_staff=True)}
+        client = Client.objects.select_related('user').order_by('pk').first()
+        if client is not None:
+            users['client'] = client.user
+        provider = Provider.objects.select_related('user').order_by('pk').first()
+        if provider is not None:
+            users['provider'] = provider.user
+        return users
+
+    def seed(self, count, days=365):
+        n_clients = max(10, count // 20)
+        n_providers = max(5, count // 100)
+        tag = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        users = User.objects.bulk_create([
+            User(username=f'explain-{tag}-{i}', email=f'explain-{tag}-{i}@example.com', password='!')
+            for i in range(n_clients + n_providers)
+        ])
+        clients = Client.objects.bulk_create([
+            Client(user=user, name=user.username, email=user.email) for user in users[:n_clients]
+        ])
+        providers = [Provider(user=user, name=user.username, service='Service', email=user.email) for user in users[n_clients:]]
+        for provider in providers:
+            provider.refresh_search_fields()
+        providers = Provider.objects.bulk_create(providers)
+        Reservation.objects.bulk_create(self.generate_reservations(count, days, clients, providers), batch_size=1000)
+        # Statistiques à jour pour que le planificateur voie les volumes générés
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'{count} réservations générées.')
+
+    def generate_reservations(self, count, days, clients, providers):
+        statuses = [choice for choice, _ in Reservation.STATUS_CHOICES]
+        today = datetime.date.today()
+        # Places occupées par (prestataire, jour) : au-delà de la capacité, la demande est rejetée
+        booked = {}
+        for _ in range(count):
+            provider = random.choice(providers)
+            date = today + datetime.timedelta(days=random.randint(-days, days))
+            status, slot = random.choice(statuses), None
+            if status in ACTIVE_STATUSES:
+                slot = booked.get((provider.pk, date), 0)
+                if slot < provider.daily_capacity:
+                    booked[(provider.pk, date)] = slot + 1
+                else:
+                    status, slot = 'rejected', None
+            yield Reservation(client=random.choice(clients), provider=provider, service='Service',
+                              date=date, status=status, slot=slot)
@@ -0,0 +1,50 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from service.accounts import ACCOUNT_KINDS, IMPORT_CHUNK_SIZE, import_accounts
+from service.parsers import read_csv
+
+
+class Command(BaseCommand):
+    help = ("Importe des comptes clients ou prestataires depuis un fichier CSV (ligne d'en-tête) ou JSON "
+            "(liste d'objets) : username, email, password, name, phone_number, et pour un prestataire "
+            "service, daily_capacity. Les lignes refusées sont signalées sans interrompre l'import.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=sorted(ACCOUNT_KINDS), required=True)
+        parser.add_argument('--format', choices=['csv', 'json'], help="Par défaut, d'après l'extension du fichier.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processus de hachage des mots de passe (défaut : nombre de cœurs).")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help="Comptes par transaction.")
+        parser.add_argument('--report', help="Écrit le résultat de chaque ligne dans ce fichier JSON.")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError("Format inconnu : préciser --format csv ou json.")
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as source:
+                rows = read_csv(source) if file_format == 'csv' else json.load(source)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Lecture de {options['path']} impossible : {exc}")
+        if not isinstance(rows, list):
+            raise CommandError("Le fichier JSON doit contenir une liste de comptes.")
+
+        started = time.perf_counter()
+        results = import_accounts(options['kind'], rows, options['workers'], options['chunk_size'])
+        elapsed = time.perf_counter() - started
+
+        rejected = [result for result in results if result['status'] != 201]
+        for result in rejected[:20]:
+            self.stdout.write(f"ligne {result['index'] + 1} ({result['status']}) : {json.dumps(result['errors'], ensure_ascii=False)}")
+        if len(rejected) > 20:
+            self.stdout.write(f'... et {len(rejected) - 20} autre(s)')
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as report:
+                json.dump(results, report, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(results) - len(rejected)} compte(s) créé(s), {len(rejected)} refusé(s), en {elapsed:.1f} s.'))
@@ -0,0 +1,238 @@
+import datetime
+import http.cookiejar
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client as TestClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from service import urls as service_urls
+from service.benchmark import summarize
+from service.models import ArchivedReservation, Client, Provider, Reservation
+
+# Paramètres représentatifs pour les vues qui en exigent (ou dont le coût en dépend)
+QUERY_PARAMS = {
+    'provider_search': lambda today: {'q': 'plomb'},
+    'reservation_export': lambda today: {'format': 'ndjson', 'from': today - datetime.timedelta(days=7), 'to': today},
+    'reservation_stats': lambda today: {'granularity': 'month', 'from': today - datetime.timedelta(days=364), 'to': today},
+    'provider_calendar': lambda today: {'from': today - datetime.timedelta(days=30), 'to': today},
+}
+
+
+class Command(BaseCommand):
+    help = ("Mesure chaque URL de l'API accessible en GET, pour un ou plusieurs rôles, avec des requêtes "
+            "simultanées : latences p50/p95/p99, requêtes SQL par requête et débit, écrits dans un fichier JSON "
+            "comparable d'une version à l'autre. En mémoire (client de test) ou contre un serveur (--base-url).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requêtes mesurées par URL et par rôle.")
+        parser.add_argument('--warmup', type=int, default=5, help="Requêtes non mesurées avant chaque série.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Requêtes simultanées.")
+        parser.add_argument('--roles', default='admin', help="Rôles mesurés, parmi admin, provider, client (séparés par des virgules).")
+        parser.add_argument('--only', default='', help="Noms d'URL à mesurer (séparés par des virgules).")
+        parser.add_argument('--base-url', help="Serveur à solliciter (ex. http://127.0.0.1:8000) au lieu du client de test.")
+        parser.add_argument('--password', default='bench', help="Mot de passe des comptes (avec --base-url), cf. seeddata.")
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help="Résultats précédents : affiche l'évolution du p95 et des requêtes SQL.")
+
+    def handle(self, *args, **options):
+        roles = [role.strip() for role in options['roles'].split(',') if role.strip()]
+        users = self.get_role_users(roles)
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+        routes, skipped = self.get_routes(only)
+        if not routes:
+            raise CommandError("Aucune URL à mesurer.")
+
+        # Les 403 / 404 attendus (rôle sans accès) sont comptés, pas journalisés un par un
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            results = self.measure(roles, users, routes, skipped, options)
+        finally:
+            request_logger.setLevel(level)
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'mode': 'live' if options['base_url'] else 'test-client',
+            'base_url': options['base_url'],
+            'database': connection.vendor,
+            'server_interface': settings.SERVER_INTERFACE,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'rows': {model.__name__: model.objects.count() for model in (Client, Provider, Reservation, ArchivedReservation)},
+            'results': results,
+            'skipped': skipped,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False, default=str)
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} série(s) écrite(s) dans {options['output']}."))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def measure(self, roles, users, routes, skipped, options):
+        results = []
+        for role in roles:
+            targets = self.get_targets(role, users[role])
+            for name, pattern in routes:
+                path = self.build_path(name, pattern, targets)
+                if path is None:
+                    skipped.append({'name': name, 'role': role, 'reason': "aucune ligne visible pour ce rôle"})
+                    continue
+                runner = self.live_runner if options['base_url'] else self.local_runner
+                summary = runner(path, users[role], role, options)
+                results.append({'name': name, 'role': role, 'path': path, **summary})
+                self.stdout.write(
+                    f"{name:<28} {role:<8} p50 {summary['p50_ms']:>8.2f} ms  p95 {summary['p95_ms']:>8.2f} ms  "
+                    f"p99 {summary['p99_ms']:>8.2f} ms  {summary['throughput_rps']:>8} req/s  "
+                    f"SQL {summary['queries_per_request']}  erreurs {summary['errors']}"
+                )
+        return results
+
+    def get_role_users(self, roles):
+        # Comptes de seeddata s'ils existent (bench-provider-0 est le plus demandé), sinon le premier de chaque rôle
+        lookups = {
+            'admin': (User.objects.filter(is_superuser=True), 'bench-admin'),
+            'provider': (User.objects.filter(provider_profile__isnull=False), 'bench-provider-0'),
+            'client': (User.objects.filter(client_profile__isnull=False), 'bench-client-0'),
+        }
+        users = {}
+        for role in roles:
+            if role not in lookups:
+                raise CommandError(f"Rôle inconnu : {role} (admin, provider ou client).")
+            queryset, username = lookups[role]
+            users[role] = queryset.filter(username=username).first() or queryset.order_by('pk').first()
+            if users[role] is None:
+                raise CommandError(f"Aucun utilisateur {role} : lancer d'abord seeddata.")
+        return users
+
+    def get_routes(self, only):
+        routes, skipped = [], []
+        for pattern in service_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or (only and pattern.name not in only):
+                continue
+            view_class = getattr(pattern.callback, 'view_class', None)
+            # Les vues fonctions (me, metrics) répondent en GET ; les vues d'écriture ne sont pas mesurées
+            if view_class is not None and not hasattr(view_class, 'get'):
+                skipped.append({'name': pattern.name, 'reason': "pas de GET"})
+                continue
+            routes.append((pattern.name, pattern))
+        return routes, skipped
+
+    def get_targets(self, role, user):
+        # Objets visibles par le rôle, pour les URL avec <pk> : le prestataire le plus demandé et sa dernière réservation
+        if role == 'provider':
+            provider = user.provider_profile
+            reservations = Reservation.objects.filter(provider=provider)
+            client = None
+        elif role == 'client':
+            client = user.client_profile
+            reservations = Reservation.objects.filter(client=client)
+            provider = None
+        else:
+            provider = Provider.objects.filter(user__username='bench-provider-0').first() or Provider.objects.order_by('pk').first()
+            client = Client.objects.order_by('pk').first()
+            reservations = Reservation.objects.filter(provider=provider) if provider else Reservation.objects.all()
+        reservation = reservations.order_by('-created_at', '-id').values_list('pk', flat=True).first()
+        return {'client': client and client.pk, 'provider': provider and provider.pk, 'reservation': reservation}
+
+    def build_path(self, name, pattern, targets):
+        kwargs = {}
+        if 'pk' in pattern.pattern.converters:
+            kind = next((kind for kind in ('client', 'provider', 'reservation') if kind in name), None)
+            kwargs['pk'] = targets.get(kind)
+            if kwargs['pk'] is None:
+                return None
+        path = reverse(name, kwargs=kwargs)
+        params = QUERY_PARAMS.get(name)
+        if params:
+            path += '?' + urllib.parse.urlencode(params(timezone.localdate()))
+        return path
+
+    def run(self, call, options):
+        if options['concurrency'] == 1:
+            # Dans le thread courant : même connexion (et même transaction) que la commande
+            for _ in range(options['warmup']):
+                call()
+            started = time.perf_counter()
+            results = [call() for _ in range(options['requests'])]
+            return summarize(results, time.perf_counter() - started)
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(lambda _: call(), range(options['warmup'])))
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: call(), range(options['requests'])))
+        return summarize(results, time.perf_counter() - started)
+
+    def local_runner(self, path, user, role, options):
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+        local = threading.local()
+
+        def call():
+            # Un client de test (donc une session) et une connexion par thread
+            if not hasattr(local, 'client'):
+                local.client = TestClient(SERVER_NAME=host, raise_request_exception=False)
+                local.client.force_login(user)
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response = local.client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                response.close()
+            return response.status_code, time.perf_counter() - started, len(queries)
+
+        return self.run(call, options)
+
+    def live_runner(self, path, user, role, options):
+        base_url = options['base_url'].rstrip('/')
+        local = threading.local()
+
+        def call():
+            if not hasattr(local, 'opener'):
+                local.opener = self.login(base_url, user, role, options['password'])
+            started = time.perf_counter()
+            try:
+                with local.opener.open(base_url + path) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as error:
+                status = error.code
+            return status, time.perf_counter() - started, None
+
+        return self.run(call, options)
+
+    def login(self, base_url, user, role, password):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        body = json.dumps({'username': user.username, 'password': password, 'role': role}).encode()
+        request = urllib.request.Request(f'{base_url}{reverse("api_login")}', data=body,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            opener.open(request).read()
+        except urllib.error.HTTPError as error:
+            raise CommandError(f"Connexion de {user.username} refusée ({error.code}) : vérifier --password.")
+        return opener
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = {(row['name'], row['role']): row for row in json.load(previous_file)['results']}
+        self.stdout.write(f'Évolution par rapport à {path} :')
+        for row in results:
+            before = previous.get((row['name'], row['role']))
+            if before is None:
+                continue
+            change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            queries = ''
+            if row['queries_per_request'] is not None and before.get('queries_per_request') is not None:
+                queries = f"  SQL {before['queries_per_request']} -> {row['queries_per_request']}"
+            self.stdout.write(f"{row['name']:<28} {row['role']:<8} p95 {before['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms ({change:+.0f} %){queries}")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from service.models import ReservationDayStat
+from service.stats import compute_counts
+
+
+class Command(BaseCommand):
+    help = ("Recalcule la table ReservationDayStat depuis les réservations et signale les écarts "
+            "avec les compteurs tenus à jour par l'application.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Signale les écarts sans rien corriger (code de sortie non nul s'il y en a).")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql' and not options['check']:
+                # Les écritures de statistiques attendent la fin du recalcul : aucun incrément perdu
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {ReservationDayStat._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+            expected = compute_counts()
+            current = {
+                (provider_id, day, status): count
+                for provider_id, day, status, count
+                in ReservationDayStat.objects.values_list('provider_id', 'day', 'status', 'count').iterator(chunk_size=2000)
+            }
+            drift = {
+                key: (current.get(key, 0), expected.get(key, 0))
+                for key in current.keys() | expected.keys()
+                if current.get(key, 0) != expected.get(key, 0)
+            }
+            for (provider_id, day, status), (found, wanted) in sorted(drift.items())[:20]:
+                self.stdout.write(f'prestataire {provider_id}, {day}, {status} : {found} au lieu de {wanted}')
+            if len(drift) > 20:
+                self.stdout.write(f'... et {len(drift) - 20} autre(s)')
+
+            if options['check']:
+                if drift:
+                    raise CommandError(f'{len(drift)} compteur(s) en écart.')
+                self.stdout.write(self.style.SUCCESS(f'{len(current)} compteur(s), aucun écart.'))
+                return
+
+            ReservationDayStat.objects.all().delete()
+            ReservationDayStat.objects.bulk_create(
+                [ReservationDayStat(provider_id=provider_id, day=day, status=status, count=count)
+                 for (provider_id, day, status), count in expected.items()],
+                batch_size=2000,
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(expected)} compteur(s) reconstruit(s), {len(drift)} écart(s) corrigé(s).'))
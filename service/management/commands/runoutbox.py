@@ -0,0 +1,102 @@
+import logging
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from service.dbpool import ensure_pool_size
+from service.outbox import RESULTS, backlog, claim_batch, process_batch
+
+logger = logging.getLogger('service.outbox')
+
+
+class Command(BaseCommand):
+    help = ("Traite les événements de l'outbox (notifications des réservations) par lots, avec plusieurs "
+            "consommateurs. Sans --once, attend les nouveaux événements jusqu'à SIGTERM / Ctrl-C.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumers', type=int, default=2, help='Consommateurs simultanés (threads).')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--lease', type=float, default=300,
+                            help="Durée (s) de réservation d'un lot : passé ce délai, un lot non terminé est repris.")
+        parser.add_argument('--poll', type=float, default=1.0, help='Attente (s) quand la file est vide.')
+        parser.add_argument('--report-every', type=float, default=60, help='Intervalle (s) des lignes de statistiques.')
+        parser.add_argument('--once', action='store_true', help="Traite les événements dus puis s'arrête.")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.totals = dict.fromkeys(RESULTS, 0)
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            # Arrêt propre : chaque consommateur termine son lot en cours
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous[signum] = signal.signal(signum, lambda *args: self.stop.set())
+        try:
+            self.run(options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def run(self, options):
+        started = time.perf_counter()
+        ensure_pool_size(options['consumers'])  # Une connexion par consommateur
+        if options['consumers'] == 1 and options['once']:
+            # Dans le thread courant, sur la connexion (et la transaction) de la commande
+            self.consume(options)
+            self.report(started)
+            return
+        consumers = [threading.Thread(target=self.run_consumer, args=(options,), daemon=True)
+                     for _ in range(options['consumers'])]
+        for consumer in consumers:
+            consumer.start()
+        last_report = started
+        while any(consumer.is_alive() for consumer in consumers):
+            for consumer in consumers:
+                consumer.join(timeout=0.2)
+            if time.perf_counter() - last_report >= options['report_every']:
+                last_report = time.perf_counter()
+                self.report(started)
+        self.report(started)
+
+    def run_consumer(self, options):
+        try:
+            self.consume(options)
+        finally:
+            connections.close_all()  # Connexions de ce thread
+
+    def consume(self, options):
+        while not self.stop.is_set():
+            try:
+                events = claim_batch(options['batch_size'], options['lease'])
+                outcome = process_batch(events) if events else None
+            except DatabaseError as exc:
+                # Base momentanément indisponible (verrou, bascule) : le consommateur attend et reprend ;
+                # un lot réservé mais non soldé est repris à l'expiration du bail
+                logger.warning('Lot interrompu : %s', exc)
+                self.stop.wait(options['poll'])
+                continue
+            if outcome is None:
+                if options['once']:
+                    return
+                self.stop.wait(options['poll'])
+                continue
+            with self.lock:
+                for result, count in outcome.items():
+                    self.totals[result] += count
+
+    def report(self, started):
+        elapsed = time.perf_counter() - started
+        state = backlog()
+        lag = (timezone.now() - state['oldest']).total_seconds() if state['oldest'] else 0
+        with self.lock:
+            totals = dict(self.totals)
+        handled = sum(totals.values())
+        self.stdout.write(
+            f"{totals['processed']} traité(s), {totals['retried']} à réessayer, {totals['failed']} abandonné(s) "
+            f"en {elapsed:.1f} s ({handled / elapsed if elapsed else 0:.1f} év./s) ; "
+            f"file : {state['pending']} en attente dont {state['due']} dus, retard {lag:.1f} s"
+        )
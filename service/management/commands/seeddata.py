@@ -0,0 +1,148 @@
+import datetime
+import io
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from service.archive import raw_delete
+from service.cache import bump_generation
+from service.models import ACTIVE_STATUSES, ArchivedReservation, Client, Provider, Reservation
+
+PREFIX = 'bench-'
+SERVICES = ['Plomberie', 'Électricité', 'Coiffure', 'Jardinage', 'Ménage', 'Informatique', 'Peinture', 'Serrurerie']
+# Statuts tirés selon que la date est passée ou à venir (poids relatifs)
+PAST_STATUSES = {'completed': 70, 'cancelled': 15, 'rejected': 10, 'approved': 5}
+FUTURE_STATUSES = {'pending': 50, 'approved': 40, 'cancelled': 10}
+
+
+class Command(BaseCommand):
+    help = ("Génère un jeu de données volumineux par insertions groupées : utilisateurs, clients, "
+            "prestataires et réservations, avec une popularité des prestataires très inégale (loi de Zipf). "
+            "Les comptes s'appellent bench-client-N, bench-provider-N (N = 0 : le plus demandé) et bench-admin.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--providers', type=int, default=100)
+        parser.add_argument('--reservations', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=365,
+                            help="Étendue des dates : les deux tiers dans le passé, le reste à venir.")
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help="Exposant de Zipf : le prestataire de rang r reçoit une part en 1 / r^skew.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Lignes par INSERT et par transaction.")
+        parser.add_argument('--password', default='bench', help="Mot de passe commun des comptes générés.")
+        parser.add_argument('--seed', type=int, default=0, help="Graine aléatoire : même graine, même jeu de données.")
+        parser.add_argument('--clear', action='store_true', help="Supprime d'abord les données d'une génération précédente.")
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['providers'] < 1 or options['days'] < 1:
+            raise CommandError("Il faut au moins un client, un prestataire et un jour.")
+        if options['clear']:
+            self.clear()
+        elif User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError("Des comptes bench-* existent déjà : relancer avec --clear.")
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        # Un seul hachage pour tous les comptes : PBKDF2 coûte ~100 ms par appel
+        password = make_password(options['password'])
+        with transaction.atomic():
+            User.objects.create_superuser(f'{PREFIX}admin', f'{PREFIX}admin@example.com', options['password'])
+            clients = self.create_clients(options['clients'], password, options['batch_size'])
+            providers = self.create_providers(options['providers'], password, options['batch_size'], rng)
+        self.stdout.write(f'{len(clients)} clients et {len(providers)} prestataires créés.')
+
+        created = self.create_reservations(options, clients, providers, rng)
+        elapsed = time.perf_counter() - started
+
+        # bulk_create n'envoie pas de signaux : statistiques, caches et statistiques du planificateur
+        call_command('rebuildstats', stdout=self.stdout if options['verbosity'] > 1 else io.StringIO())
+        bump_generation('clients')
+        bump_generation('providers')
+        bump_generation('reservations')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} réservations insérées en {elapsed:.1f} s ({created / elapsed:.0f} lignes/s).'))
+
+    def clear(self):
+        # Réservations supprimées sans passer par le Collector : pas de signal par ligne
+        with transaction.atomic():
+            for model in (Reservation, ArchivedReservation):
+                raw_delete(model.objects.filter(provider__user__username__startswith=PREFIX))
+                raw_delete(model.objects.filter(client__user__username__startswith=PREFIX))
+            deleted, _ = User.objects.filter(username__startswith=PREFIX).delete()
+        self.stdout.write(f'{deleted} ligne(s) de la génération précédente supprimée(s).')
+
+    def create_users(self, kind, count, password, batch_size):
+        return User.objects.bulk_create(
+            (User(username=f'{PREFIX}{kind}-{i}', email=f'{PREFIX}{kind}-{i}@example.com', password=password)
+             for i in range(count)),
+            batch_size=batch_size,
+        )
+
+    def create_clients(self, count, password, batch_size):
+        users = self.create_users('client', count, password, batch_size)
+        return Client.objects.bulk_create(
+            (Client(user=user, name=f'Client {i}', email=user.email, phone_number=f'06{i:08d}')
+             for i, user in enumerate(users)),
+            batch_size=batch_size,
+        )
+
+    def create_providers(self, count, password, batch_size, rng):
+        users = self.create_users('provider', count, password, batch_size)
+        providers = []
+        for i, user in enumerate(users):
+            service = SERVICES[i % len(SERVICES)]
+            provider = Provider(user=user, name=f'{service} {i}', service=service, email=user.email,
+                                phone_number=f'07{i:08d}', daily_capacity=rng.randint(2, 12))
+            provider.refresh_search_fields()  # bulk_create ne passe pas par save()
+            providers.append(provider)
+        return Provider.objects.bulk_create(providers, batch_size=batch_size)
+
+    def create_reservations(self, options, clients, providers, rng):
+        # Poids cumulés de Zipf : bench-provider-0 est le plus demandé
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) ** options['skew'] for rank in range(len(providers))))
+        client_ids = [client.pk for client in clients]
+        today = timezone.localdate()
+        past_days = options['days'] * 2 // 3
+        statuses = {
+            past: (list(weights), list(itertools.accumulate(weights.values())))
+            for past, weights in ((True, PAST_STATUSES), (False, FUTURE_STATUSES))
+        }
+        # Places occupées par (prestataire, jour) : au-delà de la capacité, la demande est rejetée
+        booked = {}
+        created = 0
+        total = options['reservations']
+        while created < total:
+            size = min(options['batch_size'], total - created)
+            chosen = rng.choices(providers, cum_weights=cum_weights, k=size)
+            batch = []
+            for provider in chosen:
+                offset = rng.randint(-past_days, options['days'] - past_days - 1)
+                date = today + datetime.timedelta(days=offset)
+                names, weights = statuses[offset < 0]
+                status = rng.choices(names, cum_weights=weights)[0]
+                slot = None
+                if status in ACTIVE_STATUSES:
+                    slot = booked.get((provider.pk, date), 0)
+                    if slot < provider.daily_capacity:
+                        booked[(provider.pk, date)] = slot + 1
+                    else:
+                        status, slot = 'rejected', None
+                batch.append(Reservation(
+                    client_id=rng.choice(client_ids), provider_id=provider.pk, service=provider.service,
+                    date=date, status=status, slot=slot,
+                ))
+            with transaction.atomic():
+                Reservation.objects.bulk_create(batch)
+            created += size
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{created} / {total}')
+        return created
@@ -0,0 +1,242 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from .cache import stats as cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(labels), value] for labels, value in self._values.items()]
+        return {'kind': self.kind, 'name': self.name, 'help': self.help_text, 'labels': list(self.labels), 'values': values}
+
+    def merge(self, values):
+        # Séries d'un autre processus : additionnées
+        for labels, value in values:
+            self.inc(tuple(labels), value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, labels)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [compteurs par bucket..., +Inf], somme
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0)
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(labels), list(counts), total] for labels, (counts, total) in self._values.items()]
+        return {'kind': self.kind, 'name': self.name, 'help': self.help_text, 'labels': list(self.labels),
+                'buckets': list(self.buckets), 'values': values}
+
+    def merge(self, values):
+        with self._lock:
+            for labels, counts, total in values:
+                labels = tuple(labels)
+                current, current_total = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0)
+                self._values[labels] = ([a + b for a, b in zip(current, counts)], current_total + total)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(counts), total) for labels, (counts, total) in self._values.items())
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labels + ('le',), labels + (bound,))
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+
+# Registre du processus. Sous gunicorn (METRICS_DIR, cf. gunicorn.conf.py), chaque worker écrit ses
+# séries dans le répertoire partagé et /api/metrics les additionne : un scrape voit tous les workers,
+# quel que soit celui qui répond. Sans METRICS_DIR (runserver, commandes), seul le processus courant.
+requests_total = Counter('http_requests_total', 'Requêtes HTTP traitées.', ('route', 'method', 'status'))
+request_duration = Histogram('http_request_duration_seconds', 'Durée des requêtes HTTP.', LATENCY_BUCKETS, ('route', 'method'))
+response_size = Histogram('http_response_size_bytes', 'Taille des réponses HTTP.', SIZE_BUCKETS, ('route',))
+db_queries = Histogram('http_request_db_queries', 'Requêtes SQL par requête HTTP (échantillonnée).', QUERY_COUNT_BUCKETS, ('route',))
+db_duration = Histogram('http_request_db_duration_seconds', 'Temps SQL par requête HTTP (échantillonnée).', LATENCY_BUCKETS, ('route',))
+
+REGISTRY = [requests_total, request_duration, response_size, db_queries, db_duration]
+
+# Écart maximal (s) entre deux écritures des séries d'un worker dans METRICS_DIR
+FLUSH_INTERVAL = 5
+
+KINDS = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def cache_requests():
+    counter = Counter('cache_requests_total', 'Lectures de cache applicatif.', ('cache', 'result'))
+    for labels, value in cache_stats.snapshot().items():
+        counter.inc(labels, value)
+    return [counter]
+
+
+# Fonctions qui renvoient l'état du processus sous forme de métriques, additionnées entre workers
+PROCESS_COLLECTORS = [cache_requests]
+
+# Fonctions qui renvoient des lignes déjà formatées, lues dans un état déjà partagé (base, cache)
+COLLECTORS = []
+
+
+def register_process_collector(collector):
+    PROCESS_COLLECTORS.append(collector)
+    return collector
+
+
+def register_collector(collector):
+    COLLECTORS.append(collector)
+    return collector
+
+
+def process_metrics():
+    metrics = list(REGISTRY)
+    for collector in PROCESS_COLLECTORS:
+        metrics.extend(collector())
+    return metrics
+
+
+class ProcessFile:
+    # Fichier des séries du processus : <pid>-<démarrage>.json, un pid réutilisé n'écrase pas un ancien worker
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._name = None
+        self.flushed_at = 0
+
+    def path(self, directory):
+        pid = os.getpid()
+        if pid != self._pid:  # Après un fork
+            self._pid, self._name, self.flushed_at = pid, f'{pid}-{time.time_ns()}.json', 0
+        return os.path.join(directory, self._name)
+
+    def write(self, directory):
+        with self._lock:
+            path = self.path(directory)
+            data = [metric.snapshot() for metric in process_metrics()]
+            temporary = f'{path}.tmp'
+            with open(temporary, 'w') as output:
+                json.dump(data, output)
+            os.replace(temporary, path)  # Jamais de fichier à moitié écrit pour les autres workers
+            self.flushed_at = time.monotonic()
+
+
+process_file = ProcessFile()
+
+
+def flush(directory):
+    if directory:
+        process_file.write(directory)
+
+
+def maybe_flush(directory):
+    # Après chaque requête : au plus une écriture toutes les FLUSH_INTERVAL secondes
+    if directory and time.monotonic() - process_file.flushed_at >= FLUSH_INTERVAL:
+        process_file.write(directory)
+
+
+def read_directory(directory):
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        try:
+            with open(path) as source:
+                data = json.load(source)
+        except (OSError, ValueError):
+            continue  # Supprimé entre-temps
+        for item in data:
+            metric = merged.get(item['name'])
+            if metric is None:
+                cls = KINDS[item['kind']]
+                if cls is Histogram:
+                    metric = Histogram(item['name'], item['help'], item['buckets'], item['labels'])
+                else:
+                    metric = cls(item['name'], item['help'], item['labels'])
+                merged[item['name']] = metric
+            metric.merge(item['values'])
+    return list(merged.values())
+
+
+def mark_process_dead(directory, pid):
+    """
+    Worker arrêté (hook child_exit du maître gunicorn) : ses compteurs restent dans le total,
+    sinon la somme reculerait ; ses jauges (connexions du pool...) ne décrivent plus rien.
+    """
+    for path in glob.glob(os.path.join(directory, f'{pid}-*.json')):
+        with open(path) as source:
+            data = json.load(source)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as output:
+            json.dump([item for item in data if item['kind'] != 'gauge'], output)
+        os.replace(temporary, path)
+
+
+def render(directory=None):
+    if directory:
+        flush(directory)
+        metrics = read_directory(directory)
+    else:
+        metrics = process_metrics()
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
@@ -1,26 +1,113 @@
-class DebugCookiesMiddleware:
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+slow_logger = logging.getLogger('service.slow_requests')
+
+
+class QueryRecorder:
+    # execute_wrapper : compte les requêtes et leur durée, garde le SQL si demandé
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.duration = 0.0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_sql:
+                self.statements.append((elapsed, sql))
+
+
+class InstrumentationMiddleware:
+    """
+    Latence par route, taille des réponses et, sur un échantillon de requêtes,
+    nombre et durée des requêtes SQL. Les requêtes lentes échantillonnées sont
+    journalisées avec leur SQL le plus coûteux. Export : /api/metrics.
+
+    Réglages : METRICS_SAMPLE_RATE (0 à 1), METRICS_SLOW_REQUEST_MS (0 = désactivé),
+    METRICS_DIR (séries des workers gunicorn, additionnées à l'export).
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Log avant la requête
-        print("\n=== INCOMING REQUEST ===")
-        print(f"Path: {request.path}")
-        print(f"Method: {request.method}")
-        print("Headers:")
-        for header, value in request.headers.items():
-            print(f"  {header}: {value}")
-        print("Cookies:", request.COOKIES)
-        print("Session:", {k: v for k, v in request.session.items()})
-        print(f"User: {request.user} (Auth: {request.user.is_authenticated})")
-
-        response = self.get_response(request)
-
-        # Log après la réponse
-        print("\n=== OUTGOING RESPONSE ===")
-        print(f"Status: {response.status_code}")
-        print("Headers:")
-        for header, value in response.items():
-            print(f"  {header}: {value}")
-        
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder, slow_threshold = self.start_sample()
+        start = time.perf_counter()
+        if recorder is None:
+            response = self.get_response(request)
+        else:
+            with ExitStack() as stack:
+                self.attach(stack, recorder)
+                response = self.get_response(request)
+        duration = time.perf_counter() - start
+        self.record(request, response, duration, recorder, slow_threshold)
+        return response
+
+    async def __acall__(self, request):
+        recorder, slow_threshold = self.start_sample()
+        start = time.perf_counter()
+        if recorder is None:
+            response = await self.get_response(request)
+        else:
+            # L'ORM asynchrone exécute le SQL dans le thread de la requête (sync_to_async) :
+            # les wrappers sont posés et retirés sur les connexions de ce thread
+            stack = ExitStack()
+            await sync_to_async(self.attach)(stack, recorder)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        duration = time.perf_counter() - start
+        self.record(request, response, duration, recorder, slow_threshold)
         return response
+
+    def start_sample(self):
+        sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        slow_threshold = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 0) / 1000
+        sampled = sample_rate >= 1 or random.random() < sample_rate
+        return (QueryRecorder(keep_sql=bool(slow_threshold)) if sampled else None), slow_threshold
+
+    def attach(self, stack, recorder):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+
+    def record(self, request, response, duration, recorder, slow_threshold):
+        match = getattr(request, 'resolver_match', None)
+        route = '/' + match.route if match is not None else 'unmatched'
+        metrics.requests_total.inc((route, request.method, response.status_code))
+        metrics.request_duration.observe((route, request.method), duration)
+        if not response.streaming:
+            metrics.response_size.observe((route,), len(response.content))
+        metrics.maybe_flush(settings.METRICS_DIR)
+        if recorder is None:
+            return
+        metrics.db_queries.observe((route,), recorder.count)
+        metrics.db_duration.observe((route,), recorder.duration)
+        if slow_threshold and duration >= slow_threshold:
+            slowest = sorted(recorder.statements, reverse=True)[:5]
+            slow_logger.warning(
+                'Requête lente %s %s (%s) : %.0f ms, %d requêtes SQL (%.0f ms)\n%s',
+                request.method, request.path, route, duration * 1000, recorder.count, recorder.duration * 1000,
+                '\n'.join(f'  {elapsed * 1000:.1f} ms  {sql}' for elapsed, sql in slowest),
+            )
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:07
+
+from django.db import migrations, models
+
+
+def assign_slots(apps, schema_editor):
+    # Numérote les réservations actives existantes par (prestataire, date)
+    Reservation = apps.get_model('service', 'Reservation')
+    active = Reservation.objects.filter(status__in=['pending', 'approved', 'completed'])
+    batch, key, slot = [], None, 0
+    for reservation in active.order_by('provider_id', 'date', 'id').only('id', 'provider_id', 'date').iterator(chunk_size=2000):
+        current = (reservation.provider_id, reservation.date)
+        slot = slot + 1 if current == key else 0
+        key = current
+        reservation.slot = slot
+        batch.append(reservation)
+        if len(batch) >= 2000:
+            Reservation.objects.bulk_update(batch, ['slot'])
+            batch = []
+    if batch:
+        Reservation.objects.bulk_update(batch, ['slot'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0004_reservation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='daily_capacity',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='slot',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(assign_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'approved', 'completed'])), fields=('provider', 'date', 'slot'), name='res_unique_active_slot'),
+        ),
+    ]
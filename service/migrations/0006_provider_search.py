@@ -0,0 +1,63 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+from service.search import fold
+
+
+def fill_search_fields(apps, schema_editor):
+    Provider = apps.get_model('service', 'Provider')
+    batch = []
+    for provider in Provider.objects.only('id', 'name', 'service').iterator(chunk_size=2000):
+        provider.search_text = fold(f"{provider.name} {provider.service}")
+        provider.service_key = fold(provider.service)
+        batch.append(provider)
+        if len(batch) >= 2000:
+            Provider.objects.bulk_update(batch, ['search_text', 'service_key'])
+            batch = []
+    if batch:
+        Provider.objects.bulk_update(batch, ['search_text', 'service_key'])
+
+
+def create_trigram_index(apps, schema_editor):
+    # Index trigramme pour les LIKE '%mot%' : PostgreSQL uniquement, SQLite garde un parcours simple
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS provider_search_trgm_idx '
+        'ON service_provider USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS provider_search_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0005_provider_capacity_reservation_slot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='search_text',
+            field=models.CharField(blank=True, default='', editable=False, max_length=201),
+        ),
+        migrations.AddField(
+            model_name='provider',
+            name='service_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_search_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['service_key', 'id'], name='provider_service_key_idx'),
+        ),
+    ]
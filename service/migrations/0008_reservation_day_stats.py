@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_day_stats(apps, schema_editor):
+    Reservation = apps.get_model('service', 'Reservation')
+    ReservationDayStat = apps.get_model('service', 'ReservationDayStat')
+    rows = Reservation.objects.values_list('provider_id', 'date', 'status').annotate(count=Count('id')).order_by()
+    ReservationDayStat.objects.bulk_create(
+        (ReservationDayStat(provider_id=provider_id, day=day, status=status, count=count)
+         for provider_id, day, status, count in rows.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0007_client_provider_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationDayStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('approved', 'Approuvée'), ('rejected', 'Rejetée'), ('completed', 'Terminée'), ('cancelled', 'Annulée')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='day_stats', to='service.provider')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'status'], name='stat_day_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('provider', 'day', 'status'), name='stat_unique_provider_day_status')],
+            },
+        ),
+        migrations.RunPython(fill_day_stats, migrations.RunPython.noop),
+    ]
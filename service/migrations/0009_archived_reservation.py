@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0008_reservation_day_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReservation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('service', models.CharField(max_length=200)),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('approved', 'Approuvée'), ('rejected', 'Rejetée'), ('completed', 'Terminée'), ('cancelled', 'Annulée')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('slot', models.PositiveSmallIntegerField(blank=True, editable=False, null=True)),
+                ('client', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_reservations', to='service.client')),
+                ('provider', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_reservations', to='service.provider')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='archived_created_idx'), models.Index(fields=['client', 'created_at', 'id'], name='archived_client_created_idx'), models.Index(fields=['provider', 'created_at', 'id'], name='archived_provider_created_idx')],
+            },
+        ),
+    ]
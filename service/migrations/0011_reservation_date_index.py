@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0010_outbox_event'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date'], name='res_date_idx'),
+        ),
+    ]
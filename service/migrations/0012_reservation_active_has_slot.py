@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+ACTIVE_STATUSES = ['pending', 'approved', 'completed']
+
+
+def assign_missing_slots(apps, schema_editor):
+    # Réservations actives créées hors API avant la contrainte : première place libre de leur journée,
+    # au-delà de la capacité s'il le faut (l'existant est conservé, les nouvelles demandes seront refusées)
+    Reservation = apps.get_model('service', 'Reservation')
+    missing = Reservation.objects.filter(status__in=ACTIVE_STATUSES, slot__isnull=True).order_by('id')
+    for reservation in missing.iterator():
+        taken = set(Reservation.objects.filter(
+            provider_id=reservation.provider_id, date=reservation.date, status__in=ACTIVE_STATUSES,
+        ).exclude(slot__isnull=True).values_list('slot', flat=True))
+        slot = 0
+        while slot in taken:
+            slot += 1
+        Reservation.objects.filter(pk=reservation.pk).update(slot=slot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0011_reservation_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_missing_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('status__in', ['pending', 'approved', 'completed']), _negated=True), ('slot__isnull', False), _connector='OR'), name='res_active_has_slot'),
+        ),
+    ]
@@ -1,11 +1,23 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .search import fold
 
 class Client(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='client_profile')
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True) 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='client_updated_idx'),
+            # LIKE 'préfixe%' (recherche de l'admin) ; opclass ignorée hors PostgreSQL
+            models.Index(fields=['name'], name='client_name_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -15,10 +27,47 @@ class Provider(models.Model):
     service = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True) 
+    daily_capacity = models.PositiveSmallIntegerField(default=1)  # Réservations acceptées par jour
+    # Colonnes de recherche normalisées (minuscules, sans accents), recalculées à chaque save
+    search_text = models.CharField(max_length=201, blank=True, default='', editable=False)
+    service_key = models.CharField(max_length=100, blank=True, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service_key', 'id'], name='provider_service_key_idx'),
+            models.Index(fields=['updated_at'], name='provider_updated_idx'),
+        ]
+
+    def refresh_search_fields(self):
+        # À appeler aussi avant un bulk_create, qui ne passe pas par save()
+        self.search_text = fold(f"{self.name} {self.service}")
+        self.service_key = fold(self.service)
+
+    def save(self, *args, **kwargs):
+        self.refresh_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'service'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_text', 'service_key', 'updated_at'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.name} ({self.service})"
 
+# Statuts qui occupent une place dans la capacité journalière du prestataire
+ACTIVE_STATUSES = ['pending', 'approved', 'completed']
+# Statuts définitifs (cf. service.transitions) : seules ces réservations sont archivées
+TERMINAL_STATUSES = ['rejected', 'completed', 'cancelled']
+
+class ReservationQuerySet(models.QuerySet):
+    def with_parties(self):
+        # Une seule requête jointe, limitée aux colonnes lues par ReservationSerializer
+        return self.select_related('client', 'provider').only(
+            'id', 'service', 'date', 'status', 'created_at', 'updated_at',
+            'client__name', 'client__phone_number',
+            'provider__name', 'provider__phone_number',
+        )
+
 class Reservation(models.Model):
     STATUS_CHOICES = [
         ('pending', 'En attente'),
@@ -27,14 +76,148 @@ class Reservation(models.Model):
         ('completed', 'Terminée'),
         ('cancelled', 'Annulée'),
     ]
+    ACTIVE_STATUSES = ACTIVE_STATUSES
     
-    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='reservations')
-    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='reservations')
+    # Pas d'index simple sur les FK : ils sont préfixes des index composites ci-dessous
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='reservations', db_index=False)
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='reservations', db_index=False)
     service = models.CharField(max_length=200)
     date = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Place occupée dans la journée (0 .. daily_capacity - 1), garantie unique par la base
+    slot = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+
+    objects = ReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Planning et filtres par date, par client ou prestataire
+            models.Index(fields=['provider', 'date'], name='res_provider_date_idx'),
+            models.Index(fields=['client', 'date'], name='res_client_date_idx'),
+            models.Index(fields=['provider', 'status', 'date'], name='res_provider_status_date_idx'),
+            # Filtre et hiérarchie par date de l'admin, toutes parties confondues
+            models.Index(fields=['date'], name='res_date_idx'),
+            # Listes paginées sur (created_at, id), globales ou par rôle
+            models.Index(fields=['created_at', 'id'], name='res_created_idx'),
+            models.Index(fields=['client', 'created_at', 'id'], name='res_client_created_idx'),
+            models.Index(fields=['provider', 'created_at', 'id'], name='res_provider_created_idx'),
+            models.Index(fields=['updated_at'], name='res_updated_idx'),
+        ]
+        constraints = [
+            # Empêche la double réservation, même entre workers concurrents
+            models.UniqueConstraint(
+                fields=['provider', 'date', 'slot'],
+                condition=models.Q(status__in=ACTIVE_STATUSES),
+                name='res_unique_active_slot',
+            ),
+            # Une réservation active sans place échapperait à la contrainte ci-dessus (NULL)
+            models.CheckConstraint(
+                condition=~models.Q(status__in=ACTIVE_STATUSES) | models.Q(slot__isnull=False),
+                name='res_active_has_slot',
+            ),
+        ]
     
     def __str__(self):
         return f"Réservation #{self.id} - {self.client.name} avec {self.provider.name}"
+
+    def save(self, *args, **kwargs):
+        # La ligne et les statistiques (signaux pre_save / post_save, cf. service.stats)
+        # sont écrites dans la même transaction
+        with transaction.atomic(savepoint=False):
+            if self.status in ACTIVE_STATUSES and self.slot is None:
+                # Écriture hors API (admin, shell, scripts) : place attribuée comme par l'API
+                from .availability import book_slot
+                book_slot(lambda slot: self.save_in_slot(slot, args, kwargs), self.provider, self.date, exclude_pk=self.pk)
+            else:
+                super().save(*args, **kwargs)
+
+    def save_in_slot(self, slot, args, kwargs):
+        self.slot = slot
+        if kwargs.get('update_fields') is not None:
+            kwargs = {**kwargs, 'update_fields': {*kwargs['update_fields'], 'slot'}}
+        try:
+            super().save(*args, **kwargs)
+        except IntegrityError:
+            self.slot = None
+            raise
+
+
+class ArchivedReservation(models.Model):
+    """
+    Réservation terminée, déplacée hors de service_reservation par la commande
+    archivereservations. Mêmes colonnes et même identifiant que dans Reservation ;
+    les lignes ne sont plus modifiées.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='archived_reservations', db_index=False)
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='archived_reservations', db_index=False)
+    service = models.CharField(max_length=200)
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    slot = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+
+    objects = ReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Mêmes listes paginées que pour Reservation (?include_archived=1)
+            models.Index(fields=['created_at', 'id'], name='archived_created_idx'),
+            models.Index(fields=['client', 'created_at', 'id'], name='archived_client_created_idx'),
+            models.Index(fields=['provider', 'created_at', 'id'], name='archived_provider_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Réservation archivée #{self.id}"
+
+
+class ReservationDayStat(models.Model):
+    # Nombre de réservations par prestataire, jour et statut, tenu à jour à chaque écriture
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='day_stats', db_index=False)
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Statistiques de toute la plateforme sur une période
+            models.Index(fields=['day', 'status'], name='stat_day_status_idx'),
+        ]
+        constraints = [
+            # Sert aussi les lectures par prestataire et période
+            models.UniqueConstraint(fields=['provider', 'day', 'status'], name='stat_unique_provider_day_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider_id} {self.day} {self.status} : {self.count}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Effet de bord à exécuter hors requête (notification...), écrit dans la
+    transaction qui le produit : annulé avec elle, jamais perdu si elle aboutit.
+    Une ligne par gestionnaire, réessayée seule (cf. service.outbox) ; supprimée
+    une fois traitée, marquée failed_at après OUTBOX_MAX_ATTEMPTS essais.
+    """
+    topic = models.CharField(max_length=100)
+    handler = models.CharField(max_length=200)  # Chemin pointé de la fonction, cf. OUTBOX_HANDLERS
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    available_at = models.DateTimeField(default=timezone.now)  # Prochain essai, ou fin du bail d'un worker
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claim = models.CharField(max_length=32, blank=True)  # Jeton du lot en cours de traitement
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # File des événements à traiter, limitée aux lignes vivantes
+            models.Index(fields=['available_at', 'id'], name='outbox_due_idx', condition=models.Q(failed_at__isnull=True)),
+            models.Index(fields=['claim'], name='outbox_claim_idx', condition=~models.Q(claim='')),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.handler})"
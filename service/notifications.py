@@ -0,0 +1,80 @@
+"""
+Notifications des réservations (SMS et email), appelées par le worker de
+l'outbox (cf. service.outbox, OUTBOX_HANDLERS). Un gestionnaire par canal :
+un SMS en échec est réessayé sans renvoyer l'email.
+
+Les SMS passent par SMS_BACKEND, comme les emails par EMAIL_BACKEND :
+ConsoleSMSBackend journalise, LocMemSMSBackend garde les messages en mémoire
+(tests), un fournisseur réel s'ajoute avec une classe exposant send().
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.module_loading import import_string
+
+from .models import Reservation
+
+logger = logging.getLogger('service.notifications')
+
+STATUS_LABELS = dict(Reservation.STATUS_CHOICES)
+
+
+class ConsoleSMSBackend:
+    def send(self, phone_number, message):
+        logger.info('SMS %s : %s', phone_number, message)
+
+
+class LocMemSMSBackend:
+    outbox = []  # [(numéro, message)], comme django.core.mail.outbox
+
+    def send(self, phone_number, message):
+        self.outbox.append((phone_number, message))
+
+
+def send_sms(phone_number, message):
+    import_string(settings.SMS_BACKEND)().send(phone_number, message)
+
+
+def load_reservation(payload):
+    # Supprimée ou archivée depuis : plus rien à notifier
+    return (Reservation.objects.select_related('client', 'provider')
+            .filter(pk=payload['reservation_id']).first())
+
+
+def created_message(reservation):
+    return (f"Nouvelle réservation #{reservation.pk} de {reservation.client.name} "
+            f"({reservation.service}) le {reservation.date:%d/%m/%Y}.")
+
+
+def status_message(reservation, status):
+    return (f"Votre réservation #{reservation.pk} du {reservation.date:%d/%m/%Y} auprès de "
+            f"{reservation.provider.name} : {STATUS_LABELS[status].lower()}.")
+
+
+def created_sms(payload):
+    # Au prestataire
+    reservation = load_reservation(payload)
+    if reservation is not None and reservation.provider.phone_number:
+        send_sms(reservation.provider.phone_number, created_message(reservation))
+
+
+def created_email(payload):
+    reservation = load_reservation(payload)
+    if reservation is not None:
+        send_mail(f"Nouvelle réservation #{reservation.pk}", created_message(reservation),
+                  None, [reservation.provider.email])
+
+
+def status_sms(payload):
+    # Au client
+    reservation = load_reservation(payload)
+    if reservation is not None and reservation.client.phone_number:
+        send_sms(reservation.client.phone_number, status_message(reservation, payload['status']))
+
+
+def status_email(payload):
+    reservation = load_reservation(payload)
+    if reservation is not None:
+        send_mail(f"Réservation #{reservation.pk} : {STATUS_LABELS[payload['status']].lower()}",
+                  status_message(reservation, payload['status']), None, [reservation.client.email])
@@ -0,0 +1,141 @@
+"""
+Outbox transactionnelle : effets de bord des réservations traités hors requête.
+
+`enqueue` écrit, dans la transaction de l'écriture métier, une ligne
+OutboxEvent par gestionnaire abonné au sujet (OUTBOX_HANDLERS). La commande
+runoutbox les traite par lots : chaque consommateur réserve un lot en un
+UPDATE (SELECT ... FOR UPDATE SKIP LOCKED sur PostgreSQL, UPDATE atomique sur
+SQLite) puis appelle les gestionnaires hors transaction. Un échec est réessayé
+avec un délai exponentiel ; un worker arrêté en plein lot laisse expirer son
+bail. Livraison au moins une fois : un gestionnaire doit tolérer un doublon.
+"""
+import datetime
+import logging
+import random
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .models import OutboxEvent
+
+logger = logging.getLogger('service.outbox')
+
+RESULTS = ('processed', 'retried', 'failed')
+
+
+def enqueue(topic, payloads):
+    """Ajoute les événements `payloads` du sujet `topic`. À appeler dans la transaction de l'écriture."""
+    handlers = settings.OUTBOX_HANDLERS.get(topic, ())
+    if not handlers or not payloads:
+        return
+    now = timezone.now()
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=topic, handler=handler, payload=payload, created_at=now, available_at=now)
+        for payload in payloads for handler in handlers
+    ], batch_size=500)
+
+
+def reservation_created(reservations):
+    enqueue('reservation.created', [{'reservation_id': reservation.pk, 'status': reservation.status}
+                                    for reservation in reservations])
+
+
+def status_changed(changes):
+    # changes : [(id, ancien statut, nouveau statut)]
+    enqueue('reservation.status_changed', [{'reservation_id': pk, 'previous': previous, 'status': current}
+                                           for pk, previous, current in changes])
+
+
+def retry_delay(attempts):
+    # 2^n x base, plafonné, avec ±20 % d'aléa : les échecs d'un même lot ne reviennent pas ensemble
+    delay = min(settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX_SECONDS)
+    return datetime.timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size, lease_seconds):
+    """Réserve au plus `batch_size` événements dus pour `lease_seconds` et les retourne."""
+    token, now = uuid.uuid4().hex, timezone.now()
+    with transaction.atomic():
+        due = (OutboxEvent.objects.filter(failed_at__isnull=True, available_at__lte=now)
+               .order_by('available_at', 'id').select_for_update(skip_locked=True).values('pk')[:batch_size])
+        claimed = OutboxEvent.objects.filter(pk__in=due).update(
+            claim=token, attempts=F('attempts') + 1,
+            available_at=now + datetime.timedelta(seconds=lease_seconds),
+        )
+    if not claimed:
+        return []
+    return list(OutboxEvent.objects.filter(claim=token).order_by('id'))
+
+
+def process_batch(events):
+    """Appelle le gestionnaire de chaque événement ; retourne {résultat: nombre}."""
+    done, outcome = [], dict.fromkeys(RESULTS, 0)
+    for event in events:
+        try:
+            import_string(event.handler)(event.payload)
+        except Exception as exc:
+            result = fail(event, exc)
+        else:
+            done.append(event.pk)
+            result = 'processed'
+        outcome[result] += 1
+        count_result(event.topic, result)
+    OutboxEvent.objects.filter(pk__in=done).delete()
+    return outcome
+
+
+def fail(event, exc):
+    now = timezone.now()
+    error = f'{type(exc).__name__}: {exc}'[:2000]
+    if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        logger.error('Événement %s abandonné après %d essais : %s', event, event.attempts, error)
+        OutboxEvent.objects.filter(pk=event.pk).update(failed_at=now, claim='', last_error=error)
+        return 'failed'
+    logger.warning('Événement %s en échec (essai %d) : %s', event, event.attempts, error)
+    OutboxEvent.objects.filter(pk=event.pk).update(available_at=now + retry_delay(event.attempts), claim='', last_error=error)
+    return 'retried'
+
+
+def count_result(topic, result):
+    # Compteurs dans le cache : partagés entre le worker et les processus web (Redis)
+    key = f'outbox:{topic}:{result}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)  # Clé expulsée entre add() et incr()
+
+
+def backlog():
+    # Une requête, servie par l'index partiel outbox_due_idx
+    now = timezone.now()
+    return OutboxEvent.objects.aggregate(
+        pending=Count('pk', filter=Q(failed_at__isnull=True)),
+        due=Count('pk', filter=Q(failed_at__isnull=True, available_at__lte=now)),
+        failed=Count('pk', filter=Q(failed_at__isnull=False)),
+        oldest=Min('created_at', filter=Q(failed_at__isnull=True)),
+    )
+
+
+@metrics.register_collector
+def render_outbox_stats():
+    state = backlog()
+    lag = (timezone.now() - state['oldest']).total_seconds() if state['oldest'] else 0
+    events = metrics.Gauge('outbox_events', "Événements de l'outbox, par état.", ('state',))
+    for name in ('pending', 'due', 'failed'):
+        events.set((name,), state[name])
+    lag_gauge = metrics.Gauge('outbox_lag_seconds', "Âge du plus ancien événement non traité.")
+    lag_gauge.set((), round(lag, 3))
+    topics = sorted(settings.OUTBOX_HANDLERS)
+    keys = {(topic, result): f'outbox:{topic}:{result}' for topic in topics for result in RESULTS}
+    values = cache.get_many(keys.values())
+    counter = metrics.Counter('outbox_events_handled_total', 'Événements traités par le worker, par résultat.', ('topic', 'result'))
+    for labels, key in keys.items():
+        counter.inc(labels, values.get(key, 0))
+    return events.render() + lag_gauge.render() + counter.render()
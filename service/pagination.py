@@ -0,0 +1,213 @@
+import base64
+import binascii
+import datetime
+import json
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Pagination par curseur (keyset) sur un tri stable.
+
+    Chaque page est un simple `WHERE (tri) < (position) ... LIMIT n + 1` :
+    ni COUNT(*) ni OFFSET, la page 1000 coûte autant que la page 1.
+    Le dernier champ de `ordering` doit être unique (l'id) pour que le tri soit total.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('id',)
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Variante pour les vues asynchrones : même requête, lue avec l'ORM asynchrone
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page([instance async for instance in queryset])
+
+    def paginate_querysets(self, querysets, request, view=None):
+        # Même tri sur plusieurs tables (réservations archivées) : chacune fournit au plus
+        # une page, fusionnée ensuite. Les clés (l'id) doivent être uniques entre les tables.
+        querysets = [self.get_page_queryset(queryset, request) for queryset in querysets]
+        if None in querysets:
+            return None
+        return self.set_page(self.merge([list(queryset) for queryset in querysets]))
+
+    async def apaginate_querysets(self, querysets, request, view=None):
+        querysets = [self.get_page_queryset(queryset, request) for queryset in querysets]
+        if None in querysets:
+            return None
+        parts = []
+        for queryset in querysets:
+            parts.append([instance async for instance in queryset])
+        return self.set_page(self.merge(parts))
+
+    def merge(self, parts):
+        rows = [row for part in parts for row in part]
+        # Tris stables successifs, du dernier champ au premier
+        for field in reversed(self.get_ordering(self.reverse)):
+            rows.sort(key=attrgetter(field.lstrip('-')), reverse=field.startswith('-'))
+        return rows[:self.page_size + 1]
+
+    def get_page_queryset(self, queryset, request):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.position, self.reverse = self.decode_cursor(request, queryset)
+
+        # Une page "précédente" se lit dans l'ordre inverse puis est retournée.
+        ordering = self.get_ordering(self.reverse)
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, self.position))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size) if self.max_page_size else size
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return tuple(self.ordering)
+        return tuple(field[1:] if field.startswith('-') else '-' + field for field in self.ordering)
+
+    def get_keyset_filter(self, ordering, position):
+        # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y), borné par a <= x pour l'index
+        names = [field.lstrip('-') for field in ordering]
+        keyset = Q()
+        for index, field in enumerate(ordering):
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            clause = Q(**{names[index] + lookup: position[index]})
+            for name, value in zip(names[:index], position[:index]):
+                clause &= Q(**{name: value})
+            keyset |= clause
+        bound = '__lte' if ordering[0].startswith('-') else '__gte'
+        return Q(**{names[0] + bound: position[0]}) & keyset
+
+    def get_position(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return position
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = data['p']
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return self.convert_position(position, queryset), reverse
+
+    def convert_position(self, position, queryset):
+        # Le curseur vient du client : chaque valeur est convertie par son champ, sinon 404
+        values = []
+        for field, value in zip(self.ordering, position):
+            if value is None or not isinstance(value, (str, int, float)):
+                raise NotFound(self.invalid_cursor_message)
+            name = field.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            model_field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+            try:
+                value = model_field.to_python(value)
+            except (ValidationError, TypeError, ValueError, OverflowError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            if isinstance(value, datetime.datetime) and timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, position, reverse=False):
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ReservationCursorPagination(KeysetCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class ProviderSearchPagination(KeysetCursorPagination):
+    # Le rang est un entier annoté : il peut figurer dans le curseur
+    ordering = ('-rank', 'id')
@@ -0,0 +1,22 @@
+import codecs
+import csv
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def read_csv(lines):
+    # Une ligne d'en-tête (BOM toléré), puis un dictionnaire par ligne ; les cellules vides sont absentes
+    return [{key.strip().lstrip('\ufeff'): value.strip() for key, value in row.items() if key and value and value.strip()}
+            for row in csv.DictReader(lines)]
+
+
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        try:
+            return read_csv(codecs.iterdecode(stream, encoding))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f'CSV invalide : {exc}')
@@ -0,0 +1,102 @@
+"""
+Lectures sur les réplicas PostgreSQL (DATABASE_REPLICA_URLS, cf. settings).
+
+Seules les requêtes HTTP de lecture (GET, HEAD, OPTIONS) lisent sur un réplica.
+Restent sur le primaire : les requêtes d'écriture du début à la fin, les
+lectures qui suivent une écriture dans la même requête, celles faites dans
+une transaction, et hors requête HTTP (commandes, shell). Après une écriture,
+le navigateur est épinglé au primaire pendant DATABASE_REPLICA_PIN_SECONDS
+(cookie) : il relit ce qu'il vient d'écrire malgré le retard de réplication.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE_NAME = 'primary_until'
+
+
+class ReadState:
+    # Mutable : une écriture faite dans un thread de sync_to_async reste visible de la requête
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+_state = ContextVar('replica_read_state', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS  # Lecture dans une transaction : même base que ses écritures
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_replica = False  # La suite de la requête relit le primaire
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Mêmes données sur toutes les bases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS  # Les réplicas suivent le primaire par réplication
+
+
+class ReplicaPinningMiddleware:
+    """
+    Choisit la base des lectures de chaque requête (cf. ReplicaRouter) et
+    pose le cookie d'épinglage après une requête d'écriture. Le cookie n'est
+    pas signé : un client ne peut que s'envoyer lui-même sur le primaire.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE_NAME, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return ReadState(use_replica=request.method in ('GET', 'HEAD', 'OPTIONS') and not pinned)
+
+    def finish(self, request, response, state):
+        # Une lecture qui écrit (prolongation de session) ne change pas les données lues ensuite
+        if state.wrote and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            window = settings.DATABASE_REPLICA_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE_NAME, str(int(time.time() + window)), max_age=window,
+                                httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE)
+        return response
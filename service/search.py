@@ -0,0 +1,40 @@
+import re
+import unicodedata
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def fold(text):
+    # Minuscules, sans accents ni ponctuation : "Électricité-Pro" -> "electricite pro"
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def search_providers(queryset, q='', service=''):
+    """
+    Filtre et classe des prestataires sur les colonnes normalisées.
+
+    Chaque mot de `q` doit apparaître dans search_text (LIKE '%mot%', servi par
+    l'index trigramme sous PostgreSQL). Le rang entier favorise un nom qui commence
+    par la requête, puis un mot qui commence par elle.
+    """
+    terms = fold(q).split()
+    service_key = fold(service)
+    if service_key:
+        queryset = queryset.filter(service_key=service_key)
+    for term in terms:
+        queryset = queryset.filter(search_text__contains=term)
+    if not terms:
+        return queryset.annotate(rank=Value(0, output_field=IntegerField()))
+    phrase = ' '.join(terms)
+    return queryset.annotate(rank=Case(
+        When(search_text__startswith=phrase, then=Value(2)),
+        When(Q(search_text__contains=' ' + phrase), then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    ))
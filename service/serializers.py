@@ -1,18 +1,61 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from .identity import resolve_identity
 from .models import Client, Provider, Reservation
 
-class ClientSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """
+    Fieldset partiel : `fields` (ex. issu de ?fields=id,date,status) limite la
+    représentation à ces champs, et `prune_queryset` limite la requête aux
+    colonnes et jointures qu'ils lisent. Sans `fields`, rien ne change.
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def parse_fields(cls, value):
+        # "id,date,status" -> ('id', 'date', 'status') ; absent ou vide -> None (tous les champs)
+        names = tuple(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+        if not names:
+            return None
+        known = cls().fields
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": f"Champ(s) inconnu(s) : {', '.join(unknown)}. Champs possibles : {', '.join(known)}."})
+        return names
+
+    @classmethod
+    def prune_queryset(cls, queryset, fields, keep=()):
+        # Colonnes lues par les champs demandés (client.name -> client__name, avec jointure) ;
+        # `keep` : colonnes dont la vue a besoin en plus, comme le tri de la pagination (ex. '-created_at')
+        if fields is None:
+            return queryset
+        known = cls().fields
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        keep = [name.lstrip('-') for name in keep if name.lstrip('-') in concrete]  # Pas les annotations (rang)
+        sources = [known[name].source for name in fields if known[name].source != '*']
+        joins = {source.split('.')[0] for source in sources if '.' in source}
+        columns = [source.replace('.', '__') for source in sources]
+        queryset = queryset.select_related(None)
+        if joins:
+            queryset = queryset.select_related(*joins)  # Sans argument, select_related suivrait toutes les FK
+        return queryset.only('pk', *columns, *keep)
+
+class ClientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = ['id', 'name', 'email', 'phone_number'] # Added phone_number
 
-class ProviderSerializer(serializers.ModelSerializer):
+class ProviderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Provider
-        fields = ['id', 'name', 'service', 'email', 'phone_number'] # Added phone_number
+        fields = ['id', 'name', 'service', 'email', 'phone_number', 'daily_capacity']
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     client_name = serializers.CharField(source='client.name', read_only=True)
     provider_name = serializers.CharField(source='provider.name', read_only=True)
     # Add phone numbers for related client/provider in reservations for easy access
@@ -21,9 +64,35 @@ class ReservationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Reservation
-        fields = '__all__'
+        exclude = ['slot']  # Détail interne de la contrainte anti-surréservation
         read_only_fields = ['created_at', 'updated_at']
 
+# --- Lots de réservations : validation sans requête, les FK sont résolues en bloc par la vue ---
+
+class ReservationBatchCreateSerializer(serializers.Serializer):
+    client = serializers.IntegerField(min_value=1)
+    provider = serializers.IntegerField(min_value=1)
+    service = serializers.CharField(max_length=200)
+    date = serializers.DateField()
+    status = serializers.ChoiceField(choices=Reservation.STATUS_CHOICES, default='pending')
+
+class ReservationBatchStatusSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=Reservation.STATUS_CHOICES)
+
+# --- Import de comptes : validation sans requête, les doublons sont cherchés en bloc (cf. service.accounts) ---
+
+class ClientImportSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150, required=False)  # Par défaut l'email, comme à l'inscription
+    email = serializers.EmailField()
+    password = serializers.CharField(required=False)  # Absent : mot de passe inutilisable, à réinitialiser
+    name = serializers.CharField(max_length=100)
+    phone_number = serializers.CharField(max_length=20, required=False)
+
+class ProviderImportSerializer(ClientImportSerializer):
+    service = serializers.CharField(max_length=100)
+    daily_capacity = serializers.IntegerField(min_value=1, max_value=32767, default=1)
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
@@ -41,11 +110,15 @@ class LoginSerializer(serializers.Serializer):
         if data['role'] == 'admin' and not user.is_superuser:
             raise serializers.ValidationError("Accès administrateur refusé")
         
-        if data['role'] == 'client' and not hasattr(user, 'client_profile'):
+        # Les deux profils en une requête ; l'identité est ensuite gardée en session par LoginView
+        identity = resolve_identity(user)
+        
+        if data['role'] == 'client' and identity['client_id'] is None:
             raise serializers.ValidationError("Profil client non trouvé")
         
-        if data['role'] == 'provider' and not hasattr(user, 'provider_profile'):
+        if data['role'] == 'provider' and identity['provider_id'] is None:
             raise serializers.ValidationError("Profil prestataire non trouvé")
         
         data['user'] = user
+        data['identity'] = identity
         return data
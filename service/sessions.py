@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+
+# Horodatage de la dernière sauvegarde, stocké dans la session elle-même
+REFRESHED_AT_KEY = '_refreshed_at'
+
+
+class CoalescingSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware qui regroupe les prolongations d'expiration.
+
+    Une session non modifiée n'est réécrite (et son cookie renvoyé) qu'une fois
+    écoulée la fraction SESSION_REFRESH_FRACTION de SESSION_COOKIE_AGE depuis la
+    dernière sauvegarde : une lecture ordinaire ne fait aucune écriture. Une
+    session reste donc valable au moins (1 - fraction) * SESSION_COOKIE_AGE après
+    la dernière activité. Avec SESSION_SAVE_EVERY_REQUEST, comportement de Django.
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and not settings.SESSION_SAVE_EVERY_REQUEST and not session.is_empty():
+            refreshed_at = session.get(REFRESHED_AT_KEY)
+            # Un cookie périmé charge une session vide : on ne la recrée pas
+            if not session.is_empty():
+                now = int(time.time())
+                interval = settings.SESSION_COOKIE_AGE * getattr(settings, 'SESSION_REFRESH_FRACTION', 0)
+                if session.modified or refreshed_at is None or now - refreshed_at >= interval:
+                    session[REFRESHED_AT_KEY] = now  # Sauvegardée par SessionMiddleware
+        return super().process_response(request, response)
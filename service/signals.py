@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import outbox
+from .cache import bump_generation_on_commit, invalidate_provider
+from .identity import invalidate_identity
+from .models import ArchivedReservation, Client, Provider, Reservation
+from .stats import STATS_FIELDS, apply_deltas, change_deltas, stats_key
+
+
+@receiver(post_save, sender=Provider)
+@receiver(post_delete, sender=Provider)
+def invalidate_provider_cache(sender, instance, **kwargs):
+    # Invalidation immédiate, puis de nouveau après commit : un lecteur concurrent
+    # a pu remettre en cache l'ancienne version avant que la transaction se termine
+    pk = instance.pk
+    invalidate_provider(pk)
+    transaction.on_commit(lambda: invalidate_provider(pk))
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def bump_client_generation(sender, instance, **kwargs):
+    # Les validateurs HTTP des réservations incluent les noms et téléphones des clients
+    bump_generation_on_commit('clients')
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def bump_reservation_generation(sender, instance, **kwargs):
+    # Validateurs HTTP des listes de réservations (cf. ConditionalGetMixin.list_generation)
+    bump_generation_on_commit('reservations')
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Provider)
+@receiver(post_delete, sender=Provider)
+def invalidate_profile_identity(sender, instance, **kwargs):
+    # Les identités en session (rôle, profil, téléphone) antérieures sont recalculées
+    invalidate_identity(instance.user_id)
+
+
+@receiver(pre_save, sender=Reservation)
+def read_reservation_stats_key(sender, instance, update_fields=None, **kwargs):
+    # Valeurs en base avant l'écriture, ligne verrouillée (Reservation.save ouvre la transaction)
+    instance._stats_previous_key = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {'provider', 'date', 'status'} & set(update_fields):
+        instance._stats_previous_key = stats_key(instance)  # Rien ne change pour les statistiques
+        return
+    instance._stats_previous_key = (
+        Reservation.objects.select_for_update().filter(pk=instance.pk).values_list(*STATS_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Reservation)
+def update_reservation_stats(sender, instance, **kwargs):
+    apply_deltas(change_deltas(getattr(instance, '_stats_previous_key', None), stats_key(instance)))
+
+
+@receiver(post_save, sender=Reservation)
+def enqueue_reservation_events(sender, instance, created, **kwargs):
+    # Dans la transaction de Reservation.save : l'événement n'existe que si l'écriture aboutit
+    previous = getattr(instance, '_stats_previous_key', None)
+    if created:
+        outbox.reservation_created([instance])
+    elif previous is not None and previous[2] != instance.status:
+        outbox.status_changed([(instance.pk, previous[2], instance.status)])
+
+
+@receiver(post_delete, sender=Reservation)
+@receiver(post_delete, sender=ArchivedReservation)
+def remove_reservation_stats(sender, instance, **kwargs):
+    # Aussi pour les suppressions en cascade (client, prestataire), dans la transaction du Collector.
+    # Les réservations archivées restent comptées jusqu'à leur suppression.
+    apply_deltas(change_deltas(stats_key(instance), None))
@@ -0,0 +1,62 @@
+import operator
+from collections import Counter
+from functools import reduce
+
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+
+from .models import ArchivedReservation, Reservation, ReservationDayStat
+
+# Champs de Reservation qui déterminent la ligne de statistiques
+STATS_FIELDS = ('provider_id', 'date', 'status')
+
+# Clés par UPDATE : SQLite limite la profondeur des expressions (OR en chaîne)
+UPDATE_BATCH_SIZE = 200
+
+
+def stats_key(reservation):
+    # La date peut avoir été affectée sous forme de chaîne
+    return reservation.provider_id, Reservation._meta.get_field('date').to_python(reservation.date), reservation.status
+
+
+def apply_deltas(deltas):
+    """
+    Reporte des variations {(provider_id, jour, statut): n} dans ReservationDayStat.
+
+    À appeler dans la transaction qui écrit les réservations. Les lignes absentes
+    sont créées à zéro (conflits ignorés), puis un seul UPDATE
+    `count = count + CASE ... END` les incrémente par paquets : deux requêtes,
+    quel que soit le nombre de lignes touchées, sans lecture préalable.
+    """
+    deltas = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if not deltas:
+        return
+    ReservationDayStat.objects.bulk_create(
+        [ReservationDayStat(provider_id=provider_id, day=day, status=status)
+         for (provider_id, day, status), delta in deltas if delta > 0],
+        ignore_conflicts=True, batch_size=UPDATE_BATCH_SIZE,
+    )
+    for start in range(0, len(deltas), UPDATE_BATCH_SIZE):
+        batch = deltas[start:start + UPDATE_BATCH_SIZE]
+        keys = [Q(provider_id=provider_id, day=day, status=status) for (provider_id, day, status), _ in batch]
+        increment = Case(*(When(key, then=Value(delta)) for key, (_, delta) in zip(keys, batch)),
+                         default=Value(0), output_field=IntegerField())
+        ReservationDayStat.objects.filter(reduce(operator.or_, keys)).update(count=F('count') + increment)
+
+
+def change_deltas(old_key, new_key):
+    deltas = Counter()
+    if old_key != new_key:
+        if old_key is not None:
+            deltas[old_key] -= 1
+        if new_key is not None:
+            deltas[new_key] += 1
+    return deltas
+
+
+def compute_counts():
+    # Comptes de référence, agrégés depuis les réservations, archivées comprises
+    counts = Counter()
+    for model in (Reservation, ArchivedReservation):
+        rows = model.objects.values_list(*STATS_FIELDS).annotate(count=Count('id')).order_by()
+        counts.update({(provider_id, day, status): count for provider_id, day, status, count in rows})
+    return dict(counts)
@@ -1,3 +1,1552 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import dbpool, metrics, outbox
+from .admin import EstimatedCountPaginator, estimate_count
+from .availability import SlotUnavailable
+from .cache import stats as cache_stats
+from .checks import check_shared_cache
+from .dbpool import ensure_pool_size
+from .management.commands import explainqueries
+from .pagination import KeysetCursorPagination
+from .models import ACTIVE_STATUSES, ArchivedReservation, Client, OutboxEvent, Provider, Reservation, ReservationDayStat
+from .notifications import LocMemSMSBackend
+from .routers import PIN_COOKIE_NAME, ReplicaPinningMiddleware, ReplicaRouter
+from .sessions import REFRESHED_AT_KEY
+from .stats import compute_counts
+from .throttling import local_blocks, rejected, take_token
+
+
+def make_client(index, password='pw'):
+    user = User.objects.create_user(username=f'client{index}', email=f'client{index}@example.com', password=password)
+    return Client.objects.create(user=user, name=f'Client {index}', email=user.email, phone_number=f'06000000{index:02d}')
+
+
+def make_provider(index, service='Plomberie', password='pw'):
+    user = User.objects.create_user(username=f'provider{index}', email=f'provider{index}@example.com', password=password)
+    return Provider.objects.create(user=user, name=f'Provider {index}', service=service, email=user.email, phone_number=f'07000000{index:02d}')
+
+
+def make_reservations(count, client, provider, start=datetime.date(2025, 1, 1)):
+    return [
+        Reservation.objects.create(client=client, provider=provider, service='Réparation', date=start + datetime.timedelta(days=i))
+        for i in range(count)
+    ]
+
+
+# Hachage rapide : les tests mesurent les requêtes, pas PBKDF2
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryBudgetTests(TestCase):
+    """
+    Nombre de requêtes SQL fixe par endpoint, quel que soit le nombre de lignes.
+    Un N+1 réintroduit dans un serializer ou un get_queryset fait échouer ces tests.
+    Pour un utilisateur connecté, le budget inclut la lecture de la session et de
+    l'utilisateur, sans écriture de session (cf. service.sessions). Les GET de
+    détail comptent aussi la requête des validateurs ETag / Last-Modified ; ceux
+    de liste n'en font pas (générations du cache).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.clients = [make_client(i) for i in range(3)]
+        cls.providers = [make_provider(i) for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def assertConstantQueries(self, num, url, grow, user=None):
+        # La même requête coûte `num` requêtes avant et après ajout de lignes
+        if user is not None:
+            self.client.force_login(user)
+            self.client.get(url)  # force_login ne passe ni par le middleware ni par LoginView : session et identité
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        grow()
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_provider_list(self):
+        self.assertConstantQueries(1, reverse('provider_list_create'),
+                                   lambda: [make_provider(i) for i in range(10, 20)])
+
+    def test_client_list(self):
+        self.assertConstantQueries(3, reverse('client_list_create'),
+                                   lambda: [make_client(i) for i in range(10, 20)], user=self.admin)
+
+    def test_reservation_list_admin(self):
+        client, provider = self.clients[0], self.providers[0]
+        make_reservations(2, client, provider)
+        response = self.assertConstantQueries(3, reverse('reservation_list_create'),
+                                              lambda: make_reservations(20, self.clients[1], self.providers[1]),
+                                              user=self.admin)
+        row = response.json()['results'][0]
+        self.assertEqual(row['client_name'], 'Client 1')
+        self.assertEqual(row['provider_phone_number'], '0700000001')
+
+    def test_reservation_list_client(self):
+        client = self.clients[0]
+        make_reservations(2, client, self.providers[0])
+        self.assertConstantQueries(3, reverse('reservation_list_create'),
+                                   lambda: make_reservations(20, client, self.providers[1]), user=client.user)
+
+    def test_reservation_list_provider(self):
+        provider = self.providers[0]
+        make_reservations(2, self.clients[0], provider)
+        self.assertConstantQueries(3, reverse('reservation_list_create'),
+                                   lambda: make_reservations(20, self.clients[1], provider, start=datetime.date(2025, 2, 1)),
+                                   user=provider.user)
+
+    def test_reservation_detail(self):
+        reservation = make_reservations(1, self.clients[0], self.providers[0])[0]
+        self.assertConstantQueries(4, reverse('reservation_detail', args=[reservation.pk]),
+                                   lambda: make_reservations(20, self.clients[0], self.providers[0], start=datetime.date(2025, 2, 1)),
+                                   user=self.admin)
+
+    def test_login(self):
+        client = self.clients[0]
+        url = reverse('api_login')
+        payload = {'username': client.user.username, 'password': 'pw', 'role': 'client'}
+        with self.assertNumQueries(10):
+            response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['profile_id'], client.pk)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AvailabilityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+        cls.provider.daily_capacity = 2
+        cls.provider.save()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def book(self, date='2025-03-01'):
+        payload = {'client': self.customer.pk, 'provider': self.provider.pk, 'service': 'Réparation', 'date': date}
+        return self.client.post(reverse('reservation_list_create'), payload, content_type='application/json')
+
+    def test_capacity_is_enforced(self):
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(self.book().status_code, 409)
+        self.assertEqual(self.book('2025-03-02').status_code, 201)
+        slots = Reservation.objects.filter(date='2025-03-01').values_list('slot', flat=True)
+        self.assertEqual(sorted(slots), [0, 1])
+
+    def test_slot_taken_concurrently_falls_through(self):
+        # Simule une écriture concurrente sur la place 0 : la base refuse, la place 1 est prise
+        Reservation.objects.create(client=self.customer, provider=self.provider, service='x', date='2025-03-01', slot=0)
+        response = self.book()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Reservation.objects.get(pk=response.json()['id']).slot, 1)
+
+    def test_cancellation_frees_slot(self):
+        first = self.book().json()
+        self.book()
+        url = reverse('reservation_detail', args=[first['id']])
+        self.client.patch(url, {'status': 'cancelled'}, content_type='application/json')
+        self.assertEqual(self.book().status_code, 201)
+        # Réactiver la réservation annulée : la journée est de nouveau complète
+        self.assertEqual(self.client.patch(url, {'status': 'pending'}, content_type='application/json').status_code, 409)
+
+    def test_availability_endpoint(self):
+        self.book()
+        url = reverse('provider_availability', args=[self.provider.pk])
+        response = self.client.get(url, {'from': '2025-03-01', 'to': '2025-03-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['capacity'], 2)
+        self.assertEqual([day['free'] for day in response.json()['days']], [1, 2, 2])
+        self.assertEqual(self.client.get(url, {'from': '2025-03-03', 'to': '2025-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('provider_availability', args=[999])).status_code, 404)
+
+    def test_calendar_endpoint(self):
+        other = make_client(1)
+        self.book('2025-03-02')
+        self.book('2025-03-01')
+        Reservation.objects.create(client=other, provider=self.provider, service='x', date='2025-03-01', status='cancelled')
+        url = reverse('provider_calendar', args=[self.provider.pk])
+        self.client.force_login(self.provider.user)
+        self.client.get(url)  # Identité mise en session
+        with self.assertNumQueries(3):  # Session, utilisateur, réservations
+            data = self.client.get(url, {'from': '2025-03-01', 'to': '2025-03-31'}).json()
+        self.assertEqual(data['dates'], ['2025-03-01', '2025-03-01', '2025-03-02'])
+        self.assertEqual(data['statuses'], ['pending', 'cancelled', 'pending'])
+        self.assertEqual(data['clients'], [self.customer.pk, other.pk, self.customer.pk])
+        self.assertEqual(data['client_table'][str(other.pk)], {'name': 'Client 1', 'phone_number': '0600000001'})
+        self.assertEqual(len(data['client_table']), 2)
+
+        self.client.force_login(self.customer.user)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(reverse('provider_calendar', args=[999])).status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+        Reservation.objects.bulk_create([Reservation(client=cls.customer, provider=cls.provider, service='x', date='2025-01-01', slot=slot)
+                                         for slot in range(205)])
+        # Même created_at pour toutes : l'id départage
+        Reservation.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_next_and_previous_links_round_trip(self):
+        expected = list(Reservation.objects.order_by('-id').values_list('id', flat=True))
+        pages, url = [], reverse('reservation_list_create') + '?page_size=50'
+        while url:
+            page = self.page(url)
+            pages.append(page)
+            url = page['next']
+        self.assertEqual([item['id'] for page in pages for item in page['results']], expected)
+        self.assertIsNone(pages[0]['previous'])
+        # Retour en arrière depuis la dernière page : mêmes pages, dans le même ordre
+        backwards, url = [], pages[-1]['previous']
+        while url:
+            page = self.page(url)
+            backwards.insert(0, [item['id'] for item in page['results']])
+            url = page['previous']
+        self.assertEqual(backwards, [[item['id'] for item in page['results']] for page in pages[:-1]])
+
+    def test_page_size_is_capped(self):
+        page = self.page(reverse('reservation_list_create') + '?page_size=1000')
+        self.assertEqual(len(page['results']), KeysetCursorPagination.max_page_size)
+        self.assertEqual(len(self.page(reverse('reservation_list_create') + '?page_size=-3')['results']), settings.REST_FRAMEWORK['PAGE_SIZE'])
+
+    def test_tampered_cursors_are_rejected(self):
+        url = reverse('reservation_list_create')
+        for position in (['notadate', 1], [{'a': 1}, 2], [None, None], ['2024-01-01T00:00:00', 'x'], [1], 'x'):
+            cursor = base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404, position)
+        self.assertEqual(self.client.get(url, {'cursor': '!!!'}).status_code, 404)
+        cursor = base64.urlsafe_b64encode(json.dumps({'p': ['2024-01-01T00:00:00', 10]}).encode()).decode()
+        self.assertEqual(self.client.get(url, {'cursor': cursor}).json()['results'], [])  # Date naïve : acceptée
+        cursor = base64.urlsafe_b64encode(json.dumps({'p': ['x', 1]}).encode()).decode()
+        self.assertEqual(self.client.get(reverse('provider_search'), {'q': 'provider', 'cursor': cursor}).status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ReservationBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+        cls.provider.daily_capacity = 50
+        cls.provider.save()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def post(self, items):
+        return self.client.post(reverse('reservation_batch'), items, content_type='application/json')
+
+    def test_bulk_create_runs_constant_queries(self):
+        items = [
+            {'client': self.customer.pk, 'provider': self.provider.pk, 'service': 'x', 'date': f'2025-04-{day:02d}'}
+            for day in range(1, 29) for _ in range(5)
+        ]
+        # Dont les statistiques (un INSERT et un UPDATE pour 28 jours) et l'outbox (280 événements, lots SQLite de 111)
+        with self.assertNumQueries(17):
+            response = self.post(items)
+        results = response.json()['results']
+        self.assertEqual({result['status'] for result in results}, {201})
+        self.assertEqual(Reservation.objects.count(), len(items))
+        self.assertEqual(ReservationDayStat.objects.get(day='2025-04-01', status='pending').count, 5)
+        self.assertEqual(Reservation.objects.filter(date='2025-04-01').exclude(slot=None).count(), 5)
+
+    def test_per_item_results(self):
+        existing = make_reservations(1, self.customer, self.provider)[0]
+        response = self.post([
+            {'client': self.customer.pk, 'provider': self.provider.pk, 'service': 'x', 'date': '2025-05-01'},
+            {'client': 999, 'provider': self.provider.pk, 'service': 'x', 'date': '2025-05-01'},
+            {'client': self.customer.pk, 'provider': self.provider.pk, 'service': 'x', 'date': 'demain'},
+            {'id': existing.pk, 'status': 'approved'},
+            {'id': 999, 'status': 'approved'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 400, 400, 200, 404])
+        existing.refresh_from_db()
+        self.assertEqual(existing.status, 'approved')
+
+    def test_capacity_applies_within_batch(self):
+        self.provider.daily_capacity = 1
+        self.provider.save()
+        item = {'client': self.customer.pk, 'provider': self.provider.pk, 'service': 'x', 'date': '2025-05-01'}
+        statuses = [result['status'] for result in self.post([item, item]).json()['results']]
+        self.assertEqual(statuses, [201, 409])
+
+    def test_repeated_id_is_rejected(self):
+        existing = make_reservations(1, self.customer, self.provider)[0]
+        OutboxEvent.objects.all().delete()
+        response = self.post([{'id': existing.pk, 'status': 'approved'}, {'id': existing.pk, 'status': 'cancelled'}])
+        self.assertEqual([result['status'] for result in response.json()['results']], [200, 400])
+        existing.refresh_from_db()
+        self.assertEqual(existing.status, 'approved')
+        counts = dict(ReservationDayStat.objects.filter(day=existing.date).values_list('status', 'count'))
+        self.assertEqual((counts.get('pending'), counts.get('approved'), counts.get('cancelled', 0)), (0, 1, 0))
+        self.assertEqual(OutboxEvent.objects.count(), 2)  # SMS et email d'un seul changement
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ReservationTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+        cls.provider.daily_capacity = 10
+        cls.provider.save()
+
+    def setUp(self):
+        self.client.force_login(self.provider.user)
+
+    def transition(self, reservation, action):
+        return self.client.post(reverse('reservation_transition', args=[reservation.pk, action]))
+
+    def bulk(self, action, ids):
+        return self.client.post(reverse('reservation_bulk_transition', args=[action]), {'ids': ids}, content_type='application/json')
+
+    def test_single_transition_compares_status(self):
+        reservation = make_reservations(1, self.customer, self.provider)[0]
+        response = self.transition(reservation, 'approve')
+        self.assertEqual(response.json(), {'id': reservation.pk, 'status': 'approved', 'previous': 'pending'})
+        response = self.transition(reservation, 'reject')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['current'], 'approved')
+        self.assertEqual(self.transition(reservation, 'complete').status_code, 200)
+        self.assertEqual(ReservationDayStat.objects.get(status='completed').count, 1)
+        self.assertEqual(ReservationDayStat.objects.get(status='pending').count, 0)
+        self.assertEqual(self.transition(reservation, 'archive').status_code, 404)
+
+    def test_roles(self):
+        first, second = make_reservations(2, self.customer, self.provider)
+        self.client.force_login(self.customer.user)
+        self.assertEqual(self.transition(first, 'approve').status_code, 403)
+        self.assertEqual(self.transition(first, 'cancel').status_code, 200)
+        self.client.force_login(make_client(1).user)
+        self.assertEqual(self.transition(second, 'cancel').status_code, 404)  # Réservation d'un autre client
+
+    def test_bulk_transition_writes_one_update_per_day(self):
+        day = make_reservations(1, self.customer, self.provider)[0].date
+        pending = [Reservation.objects.create(client=self.customer, provider=self.provider, service='x', date=day)
+                   for _ in range(5)]
+        approved = Reservation.objects.create(client=self.customer, provider=self.provider, service='x', date=day, status='approved')
+        ids = [reservation.pk for reservation in pending] + [approved.pk, 999]
+        self.client.get(reverse('api_me'))  # Identité mise en session
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk('approve', ids)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "service_reservation"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual([result['status'] for result in response.json()['results']], [200] * 5 + [409, 404])
+        self.assertEqual(ReservationDayStat.objects.get(day=day, status='approved').count, 6)
+        self.assertEqual(self.bulk('approve', 'x').status_code, 400)
+
+    def test_concurrent_change_is_reported_as_conflict(self):
+        reservations = make_reservations(1, self.customer, self.provider)
+        reservations += [Reservation.objects.create(client=self.customer, provider=self.provider, service='x', date=reservations[0].date)]
+        raced = reservations[1]
+
+        def concurrent_writer(execute, sql, params, many, context):
+            # Une autre requête annule la réservation entre la lecture des statuts et l'écriture
+            if concurrent_writer.state == 'read':
+                concurrent_writer.state = 'done'
+                Reservation.objects.filter(pk=raced.pk).update(status='cancelled')
+            if sql.startswith('SELECT "service_reservation"."id", "service_reservation"."status"') and not concurrent_writer.state:
+                concurrent_writer.state = 'read'
+            return execute(sql, params, many, context)
+        concurrent_writer.state = None
+
+        with connection.execute_wrapper(concurrent_writer):
+            response = self.bulk('approve', [reservation.pk for reservation in reservations])
+        self.assertEqual([result['status'] for result in response.json()['results']], [200, 409])
+        self.assertEqual(response.json()['results'][1]['current'], 'cancelled')
+        self.assertEqual(Reservation.objects.get(pk=reservations[0].pk).status, 'approved')
+        self.assertEqual(Reservation.objects.get(pk=raced.pk).status, 'cancelled')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProviderCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.providers = [make_provider(i) for i in range(2)]
+
+    def setUp(self):
+        cache.clear()
+        cache_stats.reset()
+
+    def test_list_is_served_from_cache_until_a_provider_changes(self):
+        url = reverse('provider_list_create')
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 2)
+        # Les paramètres de requête font partie de la clé
+        with self.assertNumQueries(1):
+            self.client.get(url, {'page_size': 1})
+
+        provider = self.providers[0]
+        provider.name = 'Renamed'
+        provider.save()
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'][0]['name'], 'Renamed')
+        self.providers[1].delete()
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+        self.assertEqual(cache_stats.snapshot()[('provider_list', 'hit')], 1)
+
+    def test_detail_cache_keeps_access_rules(self):
+        provider, other = self.providers
+        url = reverse('provider_detail', args=[provider.pk])
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).json()['name'], provider.name)
+        self.client.force_login(other.user)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(provider.user)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.patch(url, {'phone_number': '0123'}, content_type='application/json')
+        self.assertEqual(self.client.get(url).json()['phone_number'], '0123')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProviderSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        names = [('Électricité Dupont', 'Électricité'), ('Dupont Plomberie', 'Plomberie'), ('Rénov Électrique', 'Électricité')]
+        for index, (name, service) in enumerate(names):
+            provider = make_provider(index, service=service)
+            provider.name = name
+            provider.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, **params):
+        return self.client.get(reverse('provider_search'), params)
+
+    def test_search_text_is_folded_on_save(self):
+        provider = Provider.objects.get(name='Électricité Dupont')
+        self.assertEqual(provider.search_text, 'electricite dupont electricite')
+        self.assertEqual(provider.service_key, 'electricite')
+
+    def test_accent_insensitive_ranked_search(self):
+        names = [row['name'] for row in self.search(q='DUPONT').json()['results']]
+        # Le nom qui commence par la requête passe en premier
+        self.assertEqual(names, ['Dupont Plomberie', 'Électricité Dupont'])
+        names = [row['name'] for row in self.search(q='electri', service='electricité').json()['results']]
+        self.assertEqual(names, ['Électricité Dupont', 'Rénov Électrique'])
+
+    def test_pagination_and_validation(self):
+        first = self.search(service='Electricite', page_size=1).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(first['results']) + len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.search().status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+        cls.reservations = make_reservations(3, cls.customer, cls.provider)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_detail_not_modified(self):
+        url = reverse('reservation_detail', args=[self.reservations[0].pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        # 304 sans charger ni sérialiser la réservation : session, utilisateur, validateurs
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch(url, {'status': 'approved'}, content_type='application/json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_related_changes_are_not_hidden_by_if_modified_since(self):
+        url = reverse('reservation_detail', args=[self.reservations[0].pk])
+        # Client et prestataire font partie de la réponse : seul l'ETag suit leurs modifications
+        self.assertNotIn('Last-Modified', self.client.get(url))
+        since = http_date(time.time() + 60)
+        self.provider.name = 'Nouveau nom'
+        self.provider.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['provider_name'], 'Nouveau nom')
+
+    def test_last_modified_only_for_rows_older_than_a_second(self):
+        url = reverse('client_detail', args=[self.customer.pk])
+        customer = Client.objects.filter(pk=self.customer.pk)
+        customer.update(updated_at=timezone.now())
+        # Une seconde écriture dans la même seconde aurait le même Last-Modified
+        self.assertNotIn('Last-Modified', self.client.get(url))
+        customer.update(updated_at=timezone.now() - datetime.timedelta(minutes=1))
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        customer.update(updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_list_etag_tracks_changes(self):
+        url = reverse('reservation_list_create')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Un autre curseur ou une autre taille de page est une autre représentation
+        self.assertEqual(self.client.get(url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Un client renommé apparaît dans les réservations
+        self.customer.name = 'Nouveau nom'
+        self.customer.save()
+        etag_after_rename = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(etag_after_rename.status_code, 200)
+        self.reservations[2].delete()
+        etag_after_delete = self.client.get(url, HTTP_IF_NONE_MATCH=etag_after_rename['ETag'])
+        self.assertEqual(etag_after_delete.status_code, 200)
+        # Écritures en bloc, sans signal : la génération des réservations change aussi
+        self.client.force_login(self.provider.user)
+        self.client.post(reverse('reservation_bulk_transition', args=['approve']),
+                         {'ids': [self.reservations[0].pk]}, content_type='application/json')
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag_after_delete['ETag']).status_code, 200)
+
+    def test_list_validators_only_on_the_first_page(self):
+        url = reverse('reservation_list_create')
+        first = self.client.get(url, {'page_size': 2})
+        self.assertNotIn('Last-Modified', first)  # MAX(updated_at) ne voit pas les suppressions
+        self.reservations[2].delete()
+        self.assertEqual(self.client.get(url, {'page_size': 2}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(first.json()['next'])
+        self.assertNotIn('ETag', second)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+    def test_provider_list_not_modified_without_queries(self):
+        url = reverse('provider_list_create')
+        self.client.logout()
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.provider.name = 'Autre'
+        self.provider.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, METRICS_TOKEN='secret', METRICS_SLOW_REQUEST_MS=0)
+class InstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        make_provider(0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_metrics_endpoint_is_protected(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_requests_are_recorded_per_route(self):
+        self.client.get(reverse('provider_list_create'))
+        body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('http_requests_total{route="/api/providers/",method="GET",status="200"}', body)
+        self.assertIn('http_request_db_queries_count{route="/api/providers/"}', body)
+        self.assertIn('cache_requests_total{cache="provider_list",result="miss"}', body)
+
+    def test_worker_series_are_added_up(self):
+        # Un autre worker gunicorn a écrit ses séries dans le répertoire partagé
+        other_requests = metrics.Counter('http_requests_total', 'Requêtes HTTP traitées.', ('route', 'method', 'status'))
+        other_requests.inc(('/api/providers/', 'GET', 200), 5)
+        other_pool = metrics.Gauge('db_pool_connections', 'Connexions du pool, par état.', ('alias', 'state'))
+        other_pool.set(('default', 'idle'), 2)
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, '4242-1.json'), 'w') as output:
+                json.dump([other_requests.snapshot(), other_pool.snapshot()], output)
+            self.client.get(reverse('provider_list_create'))
+            own = metrics.requests_total._values[('/api/providers/', 'GET', 200)]
+            body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+            self.assertIn(f'http_requests_total{{route="/api/providers/",method="GET",status="200"}} {own + 5}', body)
+            self.assertIn('db_pool_connections{alias="default",state="idle"} 2', body)
+            # Worker arrêté : ses compteurs restent dans le total, ses jauges disparaissent
+            metrics.mark_process_dead(directory, 4242)
+            body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+            self.assertIn(f'http_requests_total{{route="/api/providers/",method="GET",status="200"}} {own + 5}', body)
+            self.assertNotIn('db_pool_connections', body)
+
+    def test_pool_stats_are_exported(self):
+        class Pool:
+            def get_stats(self):
+                return {'pool_max': 4, 'pool_size': 3, 'pool_available': 1, 'requests_waiting': 2,
+                        'requests_num': 10, 'requests_queued': 4, 'requests_wait_ms': 1500}
+
+        with mock.patch.dict(dbpool.POOLS, {'default': Pool()}):  # Comme le backend PostgreSQL avec DATABASE_POOL
+            body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        for line in ['db_pool_connections{alias="default",state="in_use"} 2', 'db_pool_connections{alias="default",state="idle"} 1',
+                     'db_pool_waiting_requests{alias="default"} 2', 'db_pool_checkout_wait_seconds_total{alias="default"} 1.5',
+                     'db_pool_checkout_errors_total{alias="default"} 0']:
+            self.assertIn(line, body)
+
+    def test_threaded_commands_widen_the_pool(self):
+        class Pool:
+            def resize(self, min_size, max_size):
+                self.sizes = (min_size, max_size)
+
+        database = connections.settings['default']
+        saved = database.get('OPTIONS', {})
+        database['OPTIONS'] = {**saved, 'pool': {'min_size': 1, 'max_size': 1}}
+        try:
+            with mock.patch.dict(dbpool.POOLS, {'default': Pool()}):
+                ensure_pool_size(3)
+                self.assertEqual(database['OPTIONS']['pool']['max_size'], 3)
+                self.assertEqual(dbpool.POOLS['default'].sizes, (1, 3))
+                ensure_pool_size(2)  # Jamais réduit
+                self.assertEqual(database['OPTIONS']['pool']['max_size'], 3)
+        finally:
+            database['OPTIONS'] = saved
+
+    def test_pools_are_recorded_when_connections_open(self):
+        class Wrapper:
+            # Connexion PostgreSQL empruntée à un pool (DATABASE_POOL)
+            vendor, alias, settings_dict, pool = 'postgresql', 'default', {'OPTIONS': {'pool': True}}, object()
+
+        with mock.patch.dict(dbpool.POOLS, clear=True):
+            connection_created.send(sender=Wrapper, connection=Wrapper())
+            self.assertEqual(dbpool.get_pools(), {'default': Wrapper.pool})
+            Wrapper.settings_dict = {'OPTIONS': {}}  # Sans pool
+            Wrapper.alias = 'other'
+            connection_created.send(sender=Wrapper, connection=Wrapper())
+            self.assertEqual(list(dbpool.get_pools()), ['default'])
+
+    @skipUnless(connection.vendor == 'postgresql' and connection.settings_dict['OPTIONS'].get('pool'), 'DATABASE_POOL non activé')
+    def test_real_pool_is_found(self):
+        connection.ensure_connection()
+        self.assertIs(dbpool.get_pools()[connection.alias], connection.pool)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0.001)
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs('service.slow_requests', level='WARNING') as logs:
+            self.client.get(reverse('provider_list_create'))
+        self.assertIn('service_provider', logs.output[0])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ReservationExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customers = [make_client(i) for i in range(2)]
+        cls.provider = make_provider(0)
+        cls.provider.daily_capacity = 10
+        cls.provider.save()
+        make_reservations(3, cls.customers[0], cls.provider)
+        make_reservations(2, cls.customers[1], cls.provider)
+
+    def export(self, **params):
+        response = self.client.get(reverse('reservation_export'), params)
+        return response, b''.join(response.streaming_content).decode() if response.streaming else response.content.decode()
+
+    def test_csv_export_is_streamed_with_joined_names(self):
+        self.client.force_login(self.admin)
+        response, body = self.export(format='csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = body.strip().splitlines()
+        self.assertEqual(lines[0], 'id,date,status,service,client_id,client_name,provider_id,provider_name,created_at,updated_at')
+        self.assertEqual(len(lines), 6)
+        self.assertIn('Client 1,', lines[-1])
+
+    def test_ndjson_export_honours_role_and_filters(self):
+        self.client.force_login(self.customers[0].user)
+        response, body = self.export(format='ndjson', **{'from': '2025-01-02', 'status': 'pending'})
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['date'] for row in rows], ['2025-01-02', '2025-01-03'])
+        self.assertEqual({row['client_name'] for row in rows}, {'Client 0'})
+
+    def test_invalid_parameters(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.export(format='ndjson', status='unknown')[0].status_code, 400)
+        self.assertEqual(self.export(format='csv', to='hier')[0].status_code, 400)
+        self.assertEqual(self.export(format='xml')[0].status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AsyncReadTests(TestCase):
+    """Les vues de /api/async/ renvoient les mêmes données que les vues DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customers = [make_client(i) for i in range(2)]
+        cls.providers = [make_provider(i) for i in range(2)]
+        make_reservations(3, cls.customers[0], cls.providers[0])
+        cls.other = make_reservations(1, cls.customers[1], cls.providers[1])[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_same_payload_as_sync_views(self):
+        self.client.force_login(self.admin)
+        self.async_client.force_login(self.admin)
+        for sync_name, async_name in [('reservation_list_create', 'async_reservation_list'),
+                                      ('provider_list_create', 'async_provider_list'),
+                                      ('reservation_detail', 'async_reservation_detail')]:
+            args = [self.other.pk] if sync_name.endswith('detail') else []
+            expected = self.client.get(reverse(sync_name, args=args)).json()
+            response = async_to_sync(self.async_client.get)(reverse(async_name, args=args))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected)
+
+    async def test_access_rules(self):
+        response = await self.async_client.get(reverse('async_reservation_list'))
+        self.assertEqual(response.status_code, 403)
+        await self.async_client.aforce_login(self.customers[0].user)
+        rows = (await self.async_client.get(reverse('async_reservation_list'))).json()['results']
+        self.assertEqual({row['client'] for row in rows}, {self.customers[0].pk})
+        response = await self.async_client.get(reverse('async_reservation_detail', args=[self.other.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('async_provider_detail', args=[self.providers[1].pk]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_keyset_pagination(self):
+        await self.async_client.aforce_login(self.admin)
+        url, seen = reverse('async_reservation_list') + '?page_size=3', []
+        while url:
+            page = (await self.async_client.get(url)).json()
+            seen.extend(row['id'] for row in page['results'])
+            url = page['next']
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_SLOW_REQUEST_MS=0)
+    async def test_sql_is_recorded_on_async_path(self):
+        await self.async_client.aforce_login(self.admin)
+        await self.async_client.get(reverse('async_reservation_list'))
+        body = await sync_to_async(metrics.render)()  # Les collecteurs lisent la base (outbox)
+        line = next(line for line in body.splitlines()
+                    if line.startswith('http_request_db_queries_sum{route="/api/async/reservations/"}'))
+        self.assertGreater(float(line.split()[-1]), 0)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, SESSION_SAVE_EVERY_REQUEST=False, SESSION_REFRESH_FRACTION=0.1)
+class SessionCoalescingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_client(0)
+        make_reservations(2, cls.customer, make_provider(0))
+
+    def setUp(self):
+        cache.clear()
+        self.login()
+
+    def login(self):
+        payload = {'username': self.customer.user.username, 'password': 'pw', 'role': 'client'}
+        self.assertEqual(self.client.post(reverse('api_login'), payload, content_type='application/json').status_code, 200)
+
+    def session_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'].split()[0] for query in queries if 'django_session' in query['sql']]
+
+    def test_get_does_not_write_the_session(self):
+        response, statements = self.session_queries(reverse('reservation_list_create'))
+        self.assertEqual(statements, ['SELECT'])
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_expiry_is_refreshed_after_the_interval(self):
+        session = self.client.session
+        session[REFRESHED_AT_KEY] -= 1209600 // 10 + 1
+        session.save()
+        response, statements = self.session_queries(reverse('reservation_list_create'))
+        self.assertIn('UPDATE', statements)
+        self.assertIn('sessionid', response.cookies)
+        self.assertEqual(self.session_queries(reverse('reservation_list_create'))[1], ['SELECT'])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_cached_db_reads_sessions_from_cache(self):
+        self.client = self.client_class()  # Le middleware lit SESSION_ENGINE à son chargement
+        self.login()
+        self.assertEqual(self.session_queries(reverse('reservation_list_create'))[1], [])
+
+    def test_logout_deletes_the_session(self):
+        session_key = self.client.cookies['sessionid'].value
+        self.client.post(reverse('api_logout'))
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+        self.assertEqual(self.client.get(reverse('reservation_list_create')).status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class IdentityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, user, role):
+        response = self.client.post(reverse('api_login'), {'username': user.username, 'password': 'pw', 'role': role},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['user']
+
+    def test_me_answers_from_the_session(self):
+        user = self.login(self.customer.user, 'client')
+        self.assertEqual(user['user_type'], 'client')
+        self.assertEqual(user['profile_id'], self.customer.pk)
+        with self.assertNumQueries(1):  # Lecture de la session (aucune avec cached_db)
+            response = self.client.get(reverse('api_me'))
+        self.assertEqual(response.json(), user)
+
+    def test_session_without_identity_resolves_it_once(self):
+        self.client.force_login(self.provider.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('api_me')).json()['user_type'], 'provider')
+        # Les deux profils en une jointure, puis l'identité est sauvegardée avec la session
+        self.assertEqual(sum('service_provider' in query['sql'] for query in queries), 1)
+        self.assertEqual(self.client.session['_identity']['provider_id'], self.provider.pk)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api_me'))
+
+    def test_profile_changes_invalidate_the_identity(self):
+        self.login(self.customer.user, 'client')
+        self.client.patch(reverse('client_detail', args=[self.customer.pk]), {'phone_number': '0611111111'},
+                          content_type='application/json')
+        self.assertEqual(self.client.get(reverse('api_me')).json()['phone_number'], '0611111111')
+
+    def test_deleted_profile_loses_its_identity(self):
+        self.login(self.provider.user, 'provider')
+        provider_session = self.client.cookies['sessionid'].value
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.delete(reverse('provider_detail', args=[self.provider.pk])).status_code, 204)
+        self.client.cookies['sessionid'] = provider_session
+        self.assertEqual(self.client.get(reverse('api_me')).status_code, 403)
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.get(reverse('api_me')).status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ReservationStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customers = [make_client(i) for i in range(2)]
+        cls.providers = [make_provider(i) for i in range(2)]
+        for provider in cls.providers:
+            provider.daily_capacity = 10
+            provider.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def assertNoDrift(self):
+        current = {(row.provider_id, row.day, row.status): row.count for row in ReservationDayStat.objects.exclude(count=0)}
+        self.assertEqual(current, compute_counts())
+
+    def test_counters_follow_every_write_path(self):
+        make_reservations(3, self.customers[0], self.providers[0])
+        make_reservations(2, self.customers[1], self.providers[1])
+        first = Reservation.objects.order_by('pk').first()
+        url = reverse('reservation_detail', args=[first.pk])
+        self.client.patch(url, {'status': 'approved'}, content_type='application/json')
+        self.client.patch(url, {'date': '2025-02-01'}, content_type='application/json')
+        self.assertNoDrift()
+        self.client.post(reverse('reservation_batch'), [
+            {'id': first.pk, 'status': 'cancelled'},
+            {'client': self.customers[0].pk, 'provider': self.providers[1].pk, 'service': 'x', 'date': '2025-01-01'},
+        ], content_type='application/json')
+        self.assertNoDrift()
+        self.client.delete(url)
+        self.customers[1].delete()  # Suppression en cascade des réservations du client
+        self.assertNoDrift()
+        self.assertEqual(ReservationDayStat.objects.get(provider=self.providers[1], day='2025-01-01', status='pending').count, 1)
+
+    def test_stats_endpoint(self):
+        make_reservations(3, self.customers[0], self.providers[0])
+        make_reservations(2, self.customers[1], self.providers[1], start=datetime.date(2025, 2, 1))
+        params = {'from': '2025-01-01', 'to': '2025-02-28'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('reservation_stats'), {**params, 'granularity': 'month'})
+        self.assertFalse([query for query in queries if 'service_reservation"' in query['sql']])
+        self.assertEqual([(row['period'], row['total']) for row in response.json()['results']],
+                         [('2025-01-01', 3), ('2025-02-01', 2)])
+        response = self.client.get(reverse('reservation_stats'), {**params, 'provider': self.providers[1].pk})
+        self.assertEqual(response.json()['totals'], {'pending': 2})
+        self.assertEqual(len(response.json()['results']), 2)
+
+        self.client.force_login(self.providers[0].user)
+        response = self.client.get(reverse('reservation_stats'), {**params, 'provider': self.providers[1].pk})
+        self.assertEqual(response.json()['provider'], self.providers[0].pk)
+        self.assertEqual(response.json()['totals'], {'pending': 3})
+        self.client.force_login(self.customers[0].user)
+        self.assertEqual(self.client.get(reverse('reservation_stats'), params).status_code, 403)
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        make_reservations(2, self.customers[0], self.providers[0])
+        call_command('rebuildstats', '--check', stdout=io.StringIO())
+        ReservationDayStat.objects.filter(day='2025-01-01').update(count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuildstats', '--check', stdout=io.StringIO())
+        call_command('rebuildstats', stdout=io.StringIO())
+        self.assertNoDrift()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+        cls.reservations = make_reservations(6, cls.customer, cls.provider)
+        # Une réservation sur deux est terminée
+        Reservation.objects.filter(pk__in=[r.pk for r in cls.reservations[::2]]).update(status='cancelled')
+        cls.recent = Reservation.objects.create(client=cls.customer, provider=cls.provider, service='x',
+                                                date=datetime.date.today(), status='cancelled')
+        call_command('rebuildstats', stdout=io.StringIO())
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def archive(self, *args):
+        call_command('archivereservations', '--days=30', *args, stdout=io.StringIO())
+
+    def list_ids(self, **params):
+        url, seen = reverse('reservation_list_create'), []
+        params = {'page_size': 2, **params}
+        while url:
+            page = self.client.get(url, params).json()
+            params = {}
+            seen.extend(row['id'] for row in page['results'])
+            url = page['next']
+        return seen
+
+    def test_moves_old_terminal_reservations_in_batches(self):
+        self.archive('--batch-size=2', '--max-batches=1')
+        self.assertEqual(ArchivedReservation.objects.count(), 2)
+        self.archive('--batch-size=2')
+        archived = {r.pk for r in self.reservations[::2]}
+        self.assertEqual(set(ArchivedReservation.objects.values_list('pk', flat=True)), archived)
+        self.assertFalse(Reservation.objects.filter(pk__in=archived).exists())
+        self.assertTrue(Reservation.objects.filter(pk=self.recent.pk).exists())
+        # Les statistiques comptent toujours les réservations archivées
+        call_command('rebuildstats', '--check', stdout=io.StringIO())
+
+    def test_lists_read_hot_table_unless_asked(self):
+        self.archive()
+        everything = sorted([r.pk for r in self.reservations] + [self.recent.pk], reverse=True)
+        self.assertEqual(len(self.list_ids()), 4)
+        self.assertEqual(self.list_ids(include_archived=1), everything)
+        response = self.client.get(reverse('reservation_export'), {'format': 'ndjson', 'include_archived': 1})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], sorted(everything))
+        self.assertEqual(rows[0]['client_name'], 'Client 0')
+        self.async_client.force_login(self.admin)
+        response = async_to_sync(self.async_client.get)(reverse('async_reservation_list'), {'include_archived': 1})
+        self.assertEqual(len(response.json()['results']), len(everything))
+
+    def test_client_deletion_removes_archived_statistics(self):
+        self.archive()
+        self.customer.delete()
+        self.assertFalse(ArchivedReservation.objects.exists())
+        call_command('rebuildstats', '--check', stdout=io.StringIO())
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_seed_data_is_skewed_and_consistent(self):
+        options = ['--clients=20', '--providers=10', '--reservations=2000', '--batch-size=500', '--days=60']
+        call_command('seeddata', *options, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seeddata', *options, stdout=io.StringIO())  # Déjà généré
+        call_command('seeddata', '--clear', *options, stdout=io.StringIO())
+        self.assertEqual(Reservation.objects.count(), 2000)
+        per_provider = Counter(Reservation.objects.values_list('provider__user__username', flat=True))
+        self.assertEqual(per_provider.most_common(1)[0][0], 'bench-provider-0')
+        # Jamais plus de réservations actives que de places
+        overbooked = (Reservation.objects.filter(status__in=ACTIVE_STATUSES).values('provider', 'date')
+                      .annotate(count=Count('id')).filter(count__gt=F('provider__daily_capacity')))
+        self.assertFalse(overbooked.exists())
+        call_command('rebuildstats', '--check', stdout=io.StringIO())
+
+    def test_load_benchmark_writes_json_report(self):
+        call_command('seeddata', '--clients=5', '--providers=3', '--reservations=50', stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('loadbench', '--concurrency=1', '--requests=3', '--warmup=1', '--roles=admin,client',
+                         '--only=reservation_detail,reservation_stats,reservation_batch', f'--output={output}',
+                         stdout=io.StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        results = {(row['name'], row['role']): row for row in report['results']}
+        self.assertEqual(results[('reservation_detail', 'admin')]['statuses'], {'200': 3})
+        self.assertEqual(results[('reservation_detail', 'admin')]['queries_per_request'], 4)
+        self.assertEqual(results[('reservation_stats', 'client')]['errors'], 3)
+        self.assertIn({'name': 'reservation_batch', 'reason': 'pas de GET'}, report['skipped'])
+        self.assertEqual(report['rows']['Reservation'], 50)
+
+
+class ExplainQueriesCommandTests(TestCase):
+
+    def test_expected_scans_pass_and_seed_is_rolled_back(self):
+        output = io.StringIO()
+        call_command('explainqueries', '--seed=200', stdout=output)
+        # Sous SQLite, seule la recherche de prestataires parcourt sa table (pas d'index trigramme)
+        self.assertIn('provider_search [admin]: parcours de service_provider attendu sur sqlite', output.getvalue())
+        self.assertIn('Aucun parcours séquentiel détecté.', output.getvalue())
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_seed_books_slots_within_daily_capacity(self):
+        # Une seule journée : chaque prestataire reçoit plusieurs demandes le même jour
+        explainqueries.Command(stdout=io.StringIO()).seed(200, days=0)
+        active = Reservation.objects.filter(status__in=ACTIVE_STATUSES)
+        self.assertTrue(Reservation.objects.filter(status='rejected').exists())
+        self.assertFalse(active.filter(slot__gte=F('provider__daily_capacity')).exists())
+        overbooked = (active.values('provider', 'date').annotate(count=Count('id'))
+                      .filter(count__gt=F('provider__daily_capacity')))
+        self.assertFalse(overbooked.exists())
+
+    def test_unexpected_seq_scan_fails(self):
+        output = io.StringIO()
+        with mock.patch.dict(explainqueries.EXPECTED_SCANS, {'sqlite': set()}):
+            with self.assertRaises(CommandError):
+                call_command('explainqueries', '--seed=200', stdout=output)
+        self.assertIn('provider_search [admin]: parcours séquentiel de service_provider', output.getvalue())
+
+
+class PoolBenchmarkTests(TransactionTestCase):
+    # Hors transaction : les threads du banc ouvrent leurs propres connexions à la base de test
+    databases = '__all__'  # Avec DATABASE_REPLICA_URLS, les GET du banc lisent le réplica
+
+    def test_modes_are_measured_and_settings_restored(self):
+        output, database = io.StringIO(), connections.settings['default']
+        before = database['CONN_MAX_AGE'], database['OPTIONS']
+        call_command('benchpool', '--requests=6', '--threads=2', stdout=output)
+        lines = output.getvalue().splitlines()
+        # La base de test SQLite en mémoire ignore close() : le décompte par requête n'est visible qu'en vrai
+        self.assertTrue(lines[1].startswith('direct') and lines[1].endswith('0 erreur(s)'))
+        self.assertTrue(lines[3].startswith('persistent') and lines[3].endswith('0 erreur(s)'))
+        self.assertIn('pool        : ignoré', lines[-1])
+        self.assertEqual((database['CONN_MAX_AGE'], database['OPTIONS']), before)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AccountImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.existing = make_provider(0)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def post(self, kind, body, content_type='application/json'):
+        return self.client.post(f"{reverse('account_import')}?kind={kind}", body, content_type=content_type)
+
+    def test_json_import_reports_each_row(self):
+        rows = [
+            {'email': 'a@example.com', 'password': 'secret', 'name': 'Plombier A', 'service': 'Plomberie', 'daily_capacity': 3},
+            {'email': 'b@example.com', 'name': 'Sans service'},
+            {'username': 'provider0', 'email': 'c@example.com', 'name': 'C', 'service': 'Jardinage'},
+            {'email': 'a@example.com', 'name': 'Doublon', 'service': 'Jardinage'},
+            {'username': 'd', 'email': 'd@example.com', 'name': 'Électricien D', 'service': 'Électricité'},
+        ]
+        response = self.post('provider', rows)
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 400, 409, 409, 201])
+        self.assertEqual(response.json()['created'], 2)
+        provider = Provider.objects.get(email='a@example.com')
+        self.assertEqual((provider.user.username, provider.daily_capacity, provider.search_text), ('a@example.com', 3, 'plombier a plomberie'))
+        self.assertTrue(provider.user.check_password('secret'))
+        self.assertFalse(User.objects.get(username='d').has_usable_password())
+        self.assertEqual(self.client.get(reverse('provider_search'), {'q': 'electricien'}).json()['results'][0]['name'], 'Électricien D')
+
+    def test_csv_import_and_access(self):
+        body = 'email,password,name,phone_number\r\nx@example.com,pw,Client X,0600000099\r\ny@example.com,pw,Client Y,\r\n'
+        response = self.post('client', body, content_type='text/csv')
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(Client.objects.get(email='x@example.com').phone_number, '0600000099')
+        self.assertEqual(self.post('seller', []).status_code, 400)
+        self.client.force_login(self.existing.user)
+        self.assertEqual(self.post('client', []).status_code, 403)
+
+    def test_command_hashes_in_process_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, report_path = os.path.join(directory, 'clients.json'), os.path.join(directory, 'report.json')
+            with open(path, 'w') as source:
+                json.dump([{'email': f'pool{i}@example.com', 'password': f'pw{i}', 'name': f'Pool {i}'} for i in range(4)]
+                          + [{'email': 'invalid'}], source)
+            call_command('importaccounts', path, '--kind=client', '--workers=2', f'--report={report_path}', stdout=io.StringIO())
+            with open(report_path) as report_file:
+                self.assertEqual([row['status'] for row in json.load(report_file)], [201, 201, 201, 201, 400])
+        user = User.objects.get(username='pool3@example.com')
+        self.assertTrue(user.password.startswith('md5$'))  # Hachage des processus fils selon les réglages du parent
+        self.assertTrue(user.check_password('pw3'))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SparseFieldsetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+        cls.reservations = make_reservations(5, cls.customer, cls.provider)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_reservation_list_loads_only_requested_columns(self):
+        url = reverse('reservation_list_create') + '?fields=id,date,status,provider_name&page_size=3'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(url).json()
+        self.assertEqual(list(page['results'][0]), ['id', 'provider_name', 'date', 'status'])
+        select = queries.captured_queries[-1]['sql']
+        self.assertIn('"service_provider"."name"', select)
+        self.assertNotIn('service_client', select)
+        self.assertNotIn('"service_reservation"."service"', select)
+        # Le curseur (created_at, id) reste lisible sans requête par ligne ; pas de validateurs après la page 1
+        with self.assertNumQueries(3):
+            rest = self.client.get(page['next']).json()['results']
+        self.assertEqual([row['id'] for row in page['results'] + rest], [r.pk for r in reversed(self.reservations)])
+
+    def test_unknown_field_is_rejected(self):
+        self.async_client.force_login(self.admin)
+        for name in ['reservation_list_create', 'async_reservation_list', 'provider_list_create']:
+            get = async_to_sync(self.async_client.get) if name.startswith('async') else self.client.get
+            response = get(reverse(name), {'fields': 'id,secret'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('secret', str(response.json()['fields']))
+
+    def test_detail_views_and_writes(self):
+        url = reverse('provider_detail', args=[self.provider.pk])
+        self.assertEqual(self.client.get(url, {'fields': 'name'}).json(), {'name': 'Provider 0'})
+        self.assertEqual(len(self.client.get(url).json()), 6)  # Fiche complète en cache, réduite à la demande
+        etags = {self.client.get(url, {'fields': fields})['ETag'] for fields in ['', 'name', 'id,name']}
+        self.assertEqual(len(etags), 3)
+        detail = reverse('reservation_detail', args=[self.reservations[0].pk])
+        response = self.client.patch(detail + '?fields=id', {'status': 'approved'}, content_type='application/json')
+        self.assertEqual(response.json()['status'], 'approved')
+
+    def test_async_views_match(self):
+        self.async_client.force_login(self.admin)
+        for sync_name, async_name, args in [('reservation_list_create', 'async_reservation_list', []),
+                                            ('reservation_detail', 'async_reservation_detail', [self.reservations[0].pk]),
+                                            ('provider_list_create', 'async_provider_list', [])]:
+            params = {'fields': 'id,client_name' if sync_name.startswith('reservation') else 'id,service'}
+            expected = self.client.get(reverse(sync_name, args=args), params).json()
+            self.assertEqual(async_to_sync(self.async_client.get)(reverse(async_name, args=args), params).json(), expected)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], DATABASE_REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    """Choix de la base par ReplicaRouter, sans requête SQL."""
+
+    def route(self, method, cookies=None, write=False):
+        router, seen = ReplicaRouter(), {}
+
+        def view(request):
+            seen['before'] = router.db_for_read(Provider)
+            if write:
+                router.db_for_write(Provider)
+                seen['after'] = router.db_for_read(Provider)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/providers/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaPinningMiddleware(view)(request)
+        return seen, response
+
+    def test_reads_go_to_replicas_until_a_write(self):
+        seen, response = self.route('get', write=True)
+        self.assertIn(seen['before'], ['replica1', 'replica2'])
+        self.assertEqual(seen['after'], 'default')
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)  # Prolonger une session n'épingle pas
+        self.assertEqual(ReplicaRouter().db_for_read(Provider), 'default')  # Hors requête HTTP
+
+    def test_writes_pin_the_browser_to_the_primary(self):
+        seen, response = self.route('post', write=True)
+        self.assertEqual(seen['before'], 'default')
+        pinned_until = int(response.cookies[PIN_COOKIE_NAME].value)
+        self.assertAlmostEqual(pinned_until, time.time() + 5, delta=2)
+        self.assertEqual(self.route('get', {PIN_COOKIE_NAME: str(pinned_until)})[0]['before'], 'default')
+        self.assertIn(self.route('get', {PIN_COOKIE_NAME: str(int(time.time()) - 1)})[0]['before'], ['replica1', 'replica2'])
+        self.assertIn(self.route('get', {PIN_COOKIE_NAME: 'x'})[0]['before'], ['replica1', 'replica2'])
+
+
+@skipUnless('replica1' in settings.DATABASES, "DATABASE_REPLICA_URLS non défini")
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ReplicaReadTests(TransactionTestCase):
+    """Deux bases réelles : DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3 python manage.py test service.tests"""
+    databases = '__all__'
+
+    def test_get_reads_replica_and_login_pins_primary(self):
+        provider = make_provider(0)
+        with CaptureQueriesContext(connections['replica1']) as replica, CaptureQueriesContext(connection) as primary:
+            self.assertEqual(self.client.get(reverse('provider_list_create')).status_code, 200)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse(primary.captured_queries)
+
+        response = self.client.post(reverse('api_login'), {'username': provider.user.username, 'password': 'pw', 'role': 'provider'},
+                                    content_type='application/json')
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            self.assertEqual(self.client.get(reverse('reservation_list_create')).status_code, 200)
+        self.assertFalse(replica.captured_queries)  # Session tout juste créée : relue sur le primaire
+
+
+def failing_handler(payload):
+    raise ConnectionError('fournisseur indisponible')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, SMS_BACKEND='service.notifications.LocMemSMSBackend')
+class OutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.provider = make_provider(0)
+
+    def setUp(self):
+        cache.clear()
+        LocMemSMSBackend.outbox.clear()
+        self.client.force_login(self.admin)
+
+    def drain(self):
+        call_command('runoutbox', '--once', '--consumers=1', stdout=io.StringIO())
+
+    def test_events_follow_the_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            make_reservations(1, self.customer, self.provider)
+            raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+        response = self.client.post(reverse('reservation_list_create'), {
+            'client': self.customer.pk, 'provider': self.provider.pk, 'service': 'Fuite', 'date': '2025-05-02',
+        }, content_type='application/json')
+        self.assertEqual(sorted(OutboxEvent.objects.values_list('handler', flat=True)),
+                         ['service.notifications.created_email', 'service.notifications.created_sms'])
+
+        self.drain()
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(LocMemSMSBackend.outbox, [('0700000000', f"Nouvelle réservation #{response.json()['id']} de Client 0 (Fuite) le 02/05/2025.")])
+        self.assertEqual(mail.outbox[0].to, ['provider0@example.com'])
+
+    def test_status_changes_from_every_write_path(self):
+        first, second, third = make_reservations(3, self.customer, self.provider)
+        OutboxEvent.objects.all().delete()
+        self.client.post(reverse('reservation_transition', args=[first.pk, 'approve']))
+        self.client.post(reverse('reservation_batch'), [{'id': second.pk, 'status': 'cancelled'}], content_type='application/json')
+        third.status = 'rejected'
+        third.save()
+        third.save()  # Statut inchangé : pas de nouvel événement
+        changes = [(event.payload['reservation_id'], event.payload['previous'], event.payload['status'])
+                   for event in OutboxEvent.objects.filter(handler__endswith='status_sms').order_by('id')]
+        self.assertEqual(changes, [(first.pk, 'pending', 'approved'), (second.pk, 'pending', 'cancelled'),
+                                   (third.pk, 'pending', 'rejected')])
+        self.drain()
+        self.assertEqual(len(LocMemSMSBackend.outbox), 3)
+        self.assertIn('auprès de Provider 0 : approuvée.', LocMemSMSBackend.outbox[0][1])
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_claims_are_disjoint_and_leases_expire(self):
+        make_reservations(3, self.customer, self.provider)  # 6 événements
+        first = outbox.claim_batch(4, lease_seconds=300)
+        second = outbox.claim_batch(4, lease_seconds=300)
+        self.assertEqual((len(first), len(second)), (4, 2))
+        self.assertFalse({event.pk for event in first} & {event.pk for event in second})
+        self.assertEqual(outbox.claim_batch(4, lease_seconds=300), [])
+        # Worker arrêté en plein lot : ses événements reviennent à l'expiration du bail
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in first]).update(available_at=timezone.now())
+        retaken = outbox.claim_batch(10, lease_seconds=300)
+        self.assertEqual(sorted(event.pk for event in retaken), sorted(event.pk for event in first))
+        self.assertEqual({event.attempts for event in retaken}, {2})
+        self.assertEqual(outbox.process_batch(retaken + second), {'processed': 6, 'retried': 0, 'failed': 0})
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(OUTBOX_HANDLERS={'reservation.created': ['service.tests.failing_handler']}, OUTBOX_MAX_ATTEMPTS=2,
+                       OUTBOX_RETRY_BASE_SECONDS=60)
+    def test_failures_are_retried_with_backoff_then_abandoned(self):
+        make_reservations(1, self.customer, self.provider)
+        self.drain()
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.attempts, event.claim, event.failed_at), (1, '', None))
+        self.assertIn('fournisseur indisponible', event.last_error)
+        self.assertGreater(event.available_at, timezone.now() + datetime.timedelta(seconds=40))
+        self.drain()  # Pas encore dû
+        self.assertEqual(OutboxEvent.objects.get().attempts, 1)
+
+        OutboxEvent.objects.update(available_at=timezone.now())
+        with self.assertLogs('service.outbox', level='ERROR'):
+            self.drain()
+        self.assertIsNotNone(OutboxEvent.objects.get().failed_at)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('outbox_events{state="failed"} 1', body)
+        self.assertIn('outbox_events_handled_total{topic="reservation.created",result="retried"} 1', body)
+        self.assertIn('outbox_events_handled_total{topic="reservation.created",result="failed"} 1', body)
+
+
+
+class FixedEstimatePaginator(EstimatedCountPaginator):
+    # Estimation de PostgreSQL simulée (la base de test est SQLite)
+    estimated = None
+
+    def estimate(self):
+        return self.estimated
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, STORAGES={
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},  # Sans collectstatic
+})
+class AdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.customer = make_client(0)
+        cls.plumber = make_provider(0)
+        cls.electrician = make_provider(1, service='Électricité')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:service_reservation_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_reservation_changelist_query_count_is_flat(self):
+        make_reservations(2, self.customer, self.plumber)
+        self.changelist_queries()  # Rafraîchissement de la session, écrit une fois
+        few = self.changelist_queries()
+        make_reservations(30, self.customer, self.electrician, start=datetime.date(2025, 3, 1))
+        self.assertEqual(self.changelist_queries(), few)
+        response = self.client.get(reverse('admin:service_reservation_changelist'), {'date__year': '2025', 'date__month': '3'})
+        self.assertContains(response, 'Provider 1 (Électricité)')
+        self.assertNotContains(response, 'Provider 0 (Plomberie)')
+
+    def test_foreign_keys_are_not_rendered_as_dropdowns(self):
+        response = self.client.get(reverse('admin:service_reservation_add'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, f'<option value="{self.customer.pk}">')
+        response = self.client.get(reverse('admin:service_client_change', args=[self.customer.pk]))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'service', 'model_name': 'reservation', 'field_name': 'provider', 'term': 'electri',
+        })
+        self.assertEqual([result['id'] for result in response.json()['results']], [str(self.electrician.pk)])
+
+        def autocomplete(term):
+            response = self.client.get(reverse('admin:autocomplete'), {
+                'app_label': 'service', 'model_name': 'reservation', 'field_name': 'client', 'term': term,
+            })
+            return [result['id'] for result in response.json()['results']]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(autocomplete('Client 0'), [str(self.customer.pk)])
+        self.assertFalse([query for query in queries if 'UPPER(' in query['sql']])
+        self.assertEqual(autocomplete('client0@example.com'), [str(self.customer.pk)])
+        self.assertEqual(autocomplete('lient'), [])
+
+    def test_reservations_added_outside_the_api_take_a_slot(self):
+        add = reverse('admin:service_reservation_add')
+        data = {'client': self.customer.pk, 'provider': self.plumber.pk, 'service': 'Fuite', 'date': '2025-06-01', 'status': 'pending'}
+        self.assertEqual(self.client.post(add, data).status_code, 302)
+        reservation = Reservation.objects.get()
+        self.assertEqual(reservation.slot, 0)
+        response = self.client.post(add, data)  # Capacité de 1 atteinte
+        self.assertContains(response, "plus de disponibilité")
+        self.assertEqual(Reservation.objects.count(), 1)
+
+        # Annulée puis réactivée : la place est reprise si elle est encore libre
+        change = reverse('admin:service_reservation_change', args=[reservation.pk])
+        self.client.post(change, {**data, 'status': 'cancelled'})
+        other = Reservation.objects.create(client=self.customer, provider=self.plumber, service='x', date='2025-06-01')
+        self.assertEqual(other.slot, 0)
+        self.assertContains(self.client.post(change, {**data, 'status': 'approved'}), "plus de disponibilité")
+        with self.assertRaises(SlotUnavailable), transaction.atomic():
+            Reservation.objects.create(client=self.customer, provider=self.plumber, service='x', date='2025-06-01')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.filter(pk=other.pk).update(slot=None)
+
+    def test_large_tables_use_the_estimated_count(self):
+        make_reservations(3, self.customer, self.plumber)
+        queryset = Reservation.objects.order_by('-pk')
+        self.assertIsNone(estimate_count(queryset))  # SQLite : pas d'estimation, COUNT(*) exact
+        paginator = FixedEstimatePaginator(queryset, 100)
+        self.assertEqual(paginator.count, 3)
+
+        paginator = FixedEstimatePaginator(queryset, 100)
+        paginator.estimated = 2_500_000
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 25_000)
+        paginator = FixedEstimatePaginator(queryset, 100)
+        paginator.estimated = 12  # Sous ADMIN_EXACT_COUNT_LIMIT : total exact
+        self.assertEqual(paginator.count, 3)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+    'signup_ip': '2/hour', 'signup_username': '5/hour', 'login_ip': '4/min', 'login_username': '2/min',
+}})
+class ThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_blocks.clear()
+
+    def login(self, username, ip='10.0.0.1'):
+        return self.client.post(reverse('api_login'), {'username': username, 'password': 'wrong', 'role': 'client'},
+                                content_type='application/json', REMOTE_ADDR=ip)
+
+    def rejections(self, scope, key, source):
+        return rejected._values.get((scope, key, source), 0)
+
+    def test_token_bucket_refills_over_time(self):
+        self.assertEqual([take_token('bucket', 2, 2 / 60, 1000) for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(take_token('bucket', 2, 2 / 60, 1000), 30)
+        self.assertAlmostEqual(take_token('bucket', 2, 2 / 60, 1020), 10)
+        self.assertEqual(take_token('bucket', 2, 2 / 60, 1030), 0)
+
+    def test_login_is_limited_per_username_then_per_ip(self):
+        shared, local = self.rejections('login', 'username', 'shared'), self.rejections('login', 'username', 'local')
+        make_client(0)
+        self.assertEqual([self.login('client0').status_code for _ in range(2)], [400, 400])
+        with self.assertNumQueries(0):  # Ni session, ni utilisateur, ni hachage
+            response = self.login('client0')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(29 <= int(response['Retry-After']) <= 30)
+        self.assertEqual(self.login('CLIENT0 ').status_code, 429)  # Refusé par ce processus, sans le cache
+        self.assertEqual(self.rejections('login', 'username', 'shared'), shared + 1)
+        self.assertEqual(self.rejections('login', 'username', 'local'), local + 1)
+
+        local_blocks.clear()  # Un autre worker : le seau partagé est vide aussi
+        self.assertEqual(self.login('client0', ip='10.0.0.2').status_code, 429)
+        self.assertEqual(self.login('someone', ip='10.0.0.2').status_code, 400)
+        # 4 jetons par IP, dont 4 requêtes déjà comptées sur 10.0.0.1
+        self.assertEqual(self.login('other').status_code, 429)
+        self.assertIn('throttled_requests_total{scope="login",key="ip",source="shared"}', metrics.render())
+
+    def test_signup_is_limited_per_ip(self):
+        for index in range(2):
+            response = self.client.post(reverse('provider_list_create'), {
+                'name': f'P{index}', 'service': 'Plomberie', 'email': f'p{index}@example.com', 'password': 'pw',
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post(reverse('client_list_create'), {
+            'name': 'C', 'email': 'c@example.com', 'password': 'pw',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(User.objects.filter(email='c@example.com').exists())
+        self.assertEqual(self.client.get(reverse('client_list_create')).status_code, 200)  # Lectures non limitées
+
+    def signup(self, index, **headers):
+        return self.client.post(reverse('client_list_create'), {
+            'name': f'C{index}', 'email': f'c{index}@example.com', 'password': 'pw',
+        }, content_type='application/json', **headers).status_code
+
+    def test_forwarded_for_is_ignored_without_trusted_proxy(self):
+        statuses = [self.signup(index, HTTP_X_FORWARDED_FOR=f'203.0.113.{index}') for index in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1, 'DEFAULT_THROTTLE_RATES': {'signup_ip': '2/hour'}})
+    def test_behind_one_proxy_the_last_forwarded_address_is_used(self):
+        # Le proxy ajoute l'adresse réelle en dernier ; ce que le client a mis avant est ignoré
+        statuses = [self.signup(index, HTTP_X_FORWARDED_FOR=f'198.51.100.{index}, 203.0.113.7') for index in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(self.signup(3, HTTP_X_FORWARDED_FOR='203.0.113.8'), 201)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def check(self, workers, **settings_overrides):
+        previous = os.environ.get('WEB_CONCURRENCY')
+        os.environ['WEB_CONCURRENCY'] = str(workers)
+        try:
+            with override_settings(**settings_overrides):
+                return [message.id for message in check_shared_cache()]
+        finally:
+            if previous is None:
+                del os.environ['WEB_CONCURRENCY']
+            else:
+                os.environ['WEB_CONCURRENCY'] = previous
+
+    def test_per_process_cache_with_several_workers(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        self.assertEqual(self.check(4, CACHES=locmem, DEBUG=False), ['service.E001'])
+        self.assertEqual(self.check(4, CACHES=locmem, DEBUG=True), ['service.W001'])
+        self.assertEqual(self.check(1, CACHES=locmem, DEBUG=False), [])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}
+        self.assertEqual(self.check(4, CACHES=redis, DEBUG=False), [])
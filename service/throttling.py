@@ -0,0 +1,150 @@
+"""
+Limitation de débit par seau à jetons (token bucket) des endpoints ouverts
+(inscription, connexion), dont chaque POST coûte un hachage PBKDF2.
+
+Un seau par adresse IP et un par identifiant, par scope de vue
+(`throttle_scope`) : débits dans REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+sous les noms `<scope>_ip` et `<scope>_username` ("10/min" : 10 requêtes
+d'affilée, puis une toutes les 6 s). Les seaux sont dans le cache partagé
+(Redis en production), communs à tous les workers ; lecture puis écriture
+sans verrou, deux workers simultanés peuvent laisser passer un jeton de trop.
+Un seau vide n'a pas de nouveau jeton avant une date connue : le worker qui
+l'a vu vide retient cette date et refuse jusque-là sans interroger le cache.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+rejected = metrics.register(metrics.Counter('throttled_requests_total', 'Requêtes refusées par limitation de débit.',
+                                            ('scope', 'key', 'source')))
+
+
+def parse_rate(rate):
+    # "10/min" -> (capacité 10, 10 jetons / 60 s)
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+class LocalBlocks:
+    # Seaux vus vides par ce processus : clé -> date du prochain jeton
+    max_entries = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = OrderedDict()
+
+    def wait(self, key, now):
+        with self._lock:
+            until = self._until.get(key)
+            if until is None:
+                return 0
+            if until <= now:
+                del self._until[key]
+                return 0
+            return until - now
+
+    def block(self, key, until):
+        with self._lock:
+            self._until[key] = until
+            self._until.move_to_end(key)
+            while len(self._until) > self.max_entries:
+                self._until.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+
+local_blocks = LocalBlocks()
+
+
+def take_token(key, capacity, refill, now):
+    """Prend un jeton du seau partagé `key` ; retourne 0 ou l'attente (s) avant le prochain."""
+    tokens, updated_at = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) * refill)
+    if tokens < 1:
+        return (1 - tokens) / refill
+    # Expire une fois le seau de nouveau plein : un seau absent est un seau plein
+    cache.set(key, (tokens - 1, now), timeout=int(capacity / refill) + 1)
+    return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    key_name = None
+    methods = ('POST',)
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{view.throttle_scope}_{self.key_name}')
+        if rate is None or request.method not in self.methods:
+            return True
+        ident = self.get_key(request)
+        if not ident:
+            return True
+        digest = hashlib.sha1(ident.encode('utf-8')).hexdigest()
+        key = f'throttle:{view.throttle_scope}:{self.key_name}:{digest}'
+        now = time.time()
+        self.delay = local_blocks.wait(key, now)
+        if self.delay:
+            rejected.inc((view.throttle_scope, self.key_name, 'local'))
+            return False
+        capacity, refill = parse_rate(rate)
+        self.delay = take_token(key, capacity, refill, now)
+        if self.delay:
+            local_blocks.block(key, now + self.delay)
+            rejected.inc((view.throttle_scope, self.key_name, 'shared'))
+            return False
+        return True
+
+    def wait(self):
+        return self.delay
+
+
+class IPThrottle(TokenBucketThrottle):
+    key_name = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)  # X-Forwarded-For selon NUM_PROXIES
+
+
+class UsernameThrottle(TokenBucketThrottle):
+    key_name = 'username'
+
+    def get_key(self, request):
+        # Connexion : username ; inscription : username, sinon l'email (username par défaut)
+        data = request.data
+        if not hasattr(data, 'get'):
+            return None
+        value = data.get('username') or data.get('email')
+        return value.strip().lower() if isinstance(value, str) else None
+
+
+class ThrottleFirstMixin:
+    """
+    Vérifie les quotas avant l'authentification et les permissions : une
+    requête refusée ne lit pas la session et BasicAuthentication ne hache pas
+    son mot de passe.
+    """
+    throttle_classes = [IPThrottle, UsernameThrottle]
+    throttle_scope = None
+
+    def initial(self, request, *args, **kwargs):
+        self.check_throttles(request)
+        self.throttles_checked = True
+        super().initial(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        if not getattr(self, 'throttles_checked', False):
+            super().check_throttles(request)
@@ -0,0 +1,101 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import outbox
+from .cache import bump_generation_on_commit
+from .models import Reservation
+from .stats import apply_deltas
+
+# Machine à états des réservations : statut -> statuts atteignables
+TRANSITIONS = {
+    'pending': {'approved', 'rejected', 'cancelled'},
+    'approved': {'completed', 'cancelled'},
+    'rejected': set(),
+    'completed': set(),
+    'cancelled': set(),
+}
+
+# Action -> (statut cible, rôles autorisés en plus de l'administrateur)
+ACTIONS = {
+    'approve': ('approved', {'provider'}),
+    'reject': ('rejected', {'provider'}),
+    'complete': ('completed', {'provider'}),
+    'cancel': ('cancelled', {'provider', 'client'}),
+}
+
+
+def source_statuses(target):
+    return {source for source, targets in TRANSITIONS.items() if target in targets}
+
+
+def not_found(pk):
+    return {'id': pk, 'status': 404, 'errors': {"id": ["Réservation introuvable."]}}
+
+
+def conflict(pk, current):
+    return {'id': pk, 'status': 409, 'current': current,
+            'errors': {"status": [f"Transition impossible depuis le statut « {current} »."]}}
+
+
+def apply_transition(reservations, ids, target):
+    """
+    Passe les réservations `ids` du queryset `reservations` au statut `target`.
+
+    Les (statut, prestataire, date) sont lus sans verrou, puis chaque groupe de
+    lignes identiques est écrit par un seul UPDATE ... WHERE status = <lu> AND
+    provider_id = <lu> AND date = <lu> : une écriture concurrente entre la lecture
+    et l'UPDATE fait échouer la comparaison au lieu d'être écrasée. Seuls status et
+    updated_at sont écrits. Aucune transition ne réactive une réservation : pas de
+    place à attribuer, la contrainte res_unique_active_slot ne peut pas échouer.
+    Retourne {id: résultat} (200, 404 ou 409).
+    """
+    sources = source_statuses(target)
+    snapshot = {
+        pk: (status, provider_id, date)
+        for pk, status, provider_id, date
+        in reservations.filter(pk__in=ids).values_list('pk', 'status', 'provider_id', 'date')
+    }
+    results = {pk: not_found(pk) for pk in ids if pk not in snapshot}
+    groups = defaultdict(list)
+    for pk, key in snapshot.items():
+        if key[0] in sources:
+            groups[key].append(pk)
+        else:
+            results[pk] = conflict(pk, key[0])
+
+    now = timezone.now()
+    deltas = Counter()
+    lost = []
+    with transaction.atomic():
+        for (previous, provider_id, date), pks in groups.items():
+            def compare_and_set(pks):
+                return Reservation.objects.filter(
+                    pk__in=pks, status=previous, provider_id=provider_id, date=date,
+                ).update(status=target, updated_at=now)
+
+            with transaction.atomic():
+                done = pks if compare_and_set(pks) == len(pks) else []
+                if not done:
+                    transaction.set_rollback(True)  # Annule le groupe, repris ligne par ligne
+            if not done:
+                for pk in pks:
+                    if compare_and_set([pk]):
+                        done.append(pk)
+                    else:
+                        lost.append(pk)
+            for pk in done:
+                results[pk] = {'id': pk, 'status': 200, 'previous': previous, 'current': target}
+            deltas[(provider_id, date, previous)] -= len(done)
+            deltas[(provider_id, date, target)] += len(done)
+        apply_deltas(deltas)  # queryset.update() n'envoie pas de signaux
+        bump_generation_on_commit('reservations')
+        outbox.status_changed([(pk, result['previous'], target) for pk, result in results.items() if result['status'] == 200])
+
+    if lost:
+        # Modifiées (ou supprimées) entre la lecture et l'UPDATE : statut actuel
+        current = dict(Reservation.objects.filter(pk__in=lost).values_list('pk', 'status'))
+        for pk in lost:
+            results[pk] = conflict(pk, current[pk]) if pk in current else not_found(pk)
+    return results
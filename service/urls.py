@@ -1,20 +1,39 @@
 from django.urls import path
 from django.views.generic import TemplateView
 from .views import (
-    LoginView, LogoutView,
+    LoginView, LogoutView, me_view, metrics_view, AccountImport,
     ClientListCreate, ClientRetrieveUpdateDestroy,
-    ProviderListCreate, ProviderRetrieveUpdateDestroy,
-    ReservationListCreate, ReservationRetrieveUpdateDestroy
+    ProviderListCreate, ProviderRetrieveUpdateDestroy, ProviderAvailability, ProviderCalendar, ProviderSearch,
+    ReservationListCreate, ReservationRetrieveUpdateDestroy, ReservationBatch,
+    ReservationTransition, ReservationBulkTransition,
+    ReservationExport, ReservationStats
 )
+from .async_views import AsyncProviderList, AsyncProviderDetail, AsyncReservationList, AsyncReservationDetail
 
 urlpatterns = [
     path('', TemplateView.as_view(template_name='service/appli.html'), name='home'),
     path('login/', LoginView.as_view(), name='api_login'),
     path('logout/', LogoutView.as_view(), name='api_logout'),
+    path('me/', me_view, name='api_me'),
+    path('metrics', metrics_view, name='metrics'),
+    path('accounts/import/', AccountImport.as_view(), name='account_import'),
     path('clients/', ClientListCreate.as_view(), name='client_list_create'),
     path('clients/<int:pk>/', ClientRetrieveUpdateDestroy.as_view(), name='client_detail'),
     path('providers/', ProviderListCreate.as_view(), name='provider_list_create'),
+    path('providers/search/', ProviderSearch.as_view(), name='provider_search'),
     path('providers/<int:pk>/', ProviderRetrieveUpdateDestroy.as_view(), name='provider_detail'),
+    path('providers/<int:pk>/availability/', ProviderAvailability.as_view(), name='provider_availability'),
+    path('providers/<int:pk>/calendar/', ProviderCalendar.as_view(), name='provider_calendar'),
     path('reservations/', ReservationListCreate.as_view(), name='reservation_list_create'),
+    path('reservations/export/', ReservationExport.as_view(), name='reservation_export'),
+    path('reservations/batch/', ReservationBatch.as_view(), name='reservation_batch'),
     path('reservations/<int:pk>/', ReservationRetrieveUpdateDestroy.as_view(), name='reservation_detail'),
+    path('reservations/<int:pk>/<str:action>/', ReservationTransition.as_view(), name='reservation_transition'),
+    path('reservations/bulk/<str:action>/', ReservationBulkTransition.as_view(), name='reservation_bulk_transition'),
+    path('stats/', ReservationStats.as_view(), name='reservation_stats'),
+    # Lectures asynchrones, pour un déploiement ASGI (cf. gunicorn.conf.py)
+    path('async/providers/', AsyncProviderList.as_view(), name='async_provider_list'),
+    path('async/providers/<int:pk>/', AsyncProviderDetail.as_view(), name='async_provider_detail'),
+    path('async/reservations/', AsyncReservationList.as_view(), name='async_reservation_list'),
+    path('async/reservations/<int:pk>/', AsyncReservationDetail.as_view(), name='async_reservation_detail'),
 ]
@@ -1,15 +1,43 @@
+import datetime
+from collections import Counter
+
 from rest_framework import generics, views, status, permissions
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotAuthenticated, NotFound, PermissionDenied, ValidationError
 from django.contrib.auth import login, logout, authenticate
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.middleware.csrf import get_token
-from .models import Client, Provider, Reservation
+from .conditional import ConditionalGetMixin
+from .identity import PUBLIC_FIELDS, get_identity, session_identity, store_identity
+from .cache import bump_generation_on_commit, cache_get, cache_set, provider_detail_key, provider_list_key
+from . import metrics, outbox
+from .accounts import ACCOUNT_KINDS, import_accounts
+from .archive import wants_archived
+from .availability import MAX_RANGE_DAYS, SlotUnavailable, allocate_slots, book_slot, daily_availability
+from .models import ACTIVE_STATUSES, ArchivedReservation, Client, Provider, Reservation, ReservationDayStat
+from .export import stream_csv, stream_ndjson
+from .parsers import CSVParser
+from .renderers import CSVRenderer, NDJSONRenderer
+from .pagination import ProviderSearchPagination, ReservationCursorPagination
+from .search import search_providers
+from .stats import apply_deltas, change_deltas, stats_key
+from .throttling import ThrottleFirstMixin
+from .transitions import ACTIONS, apply_transition
 from django.shortcuts import render
 from .serializers import (
     ClientSerializer, ProviderSerializer,
-    ReservationSerializer, LoginSerializer
+    ReservationSerializer, LoginSerializer,
+    ReservationBatchCreateSerializer, ReservationBatchStatusSerializer
 )
 
 # Vue pour le rendu du template principal de l'application React
@@ -17,11 +45,83 @@ def index_view(request):
     context = {}
     return render(request, 'service/appli.html', context)
 
+# Export des métriques au format texte Prometheus : superutilisateur ou jeton METRICS_TOKEN
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (authorized or request.user.is_superuser):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(settings.METRICS_DIR), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Identité de l'utilisateur connecté, lue dans la session : ni l'utilisateur ni ses profils ne sont chargés.
+# Une session ouverte avant l'introduction de l'identité en session la calcule une fois.
+def me_view(request):
+    identity = session_identity(request.session)
+    if identity is None:
+        if not request.user.is_authenticated:
+            return JsonResponse({"detail": str(NotAuthenticated.default_detail)}, status=403)
+        identity = get_identity(request)
+    return JsonResponse({field: identity[field] for field in PUBLIC_FIELDS})
+
+def get_date_range(request, default_days=30, max_days=MAX_RANGE_DAYS):
+    # Lit ?from=&to= (AAAA-MM-JJ) ; par défaut `default_days` jours à partir d'aujourd'hui
+    params = request.query_params
+    try:
+        start = parse_date(params['from']) if params.get('from') else timezone.localdate()
+        end = parse_date(params['to']) if params.get('to') else None
+    except ValueError:
+        start = None
+    if start is None or (params.get('to') and end is None):
+        raise ValidationError({"detail": "Les paramètres from et to doivent être au format AAAA-MM-JJ."})
+    if end is None:
+        end = start + datetime.timedelta(days=default_days - 1)
+    if end < start:
+        raise ValidationError({"detail": "La date de fin doit être postérieure à la date de début."})
+    if (end - start).days >= max_days:
+        raise ValidationError({"detail": f"La période ne peut pas dépasser {max_days} jours."})
+    return start, end
+
+class FieldsetMixin:
+    """
+    ?fields=id,date,status : les lectures ne renvoient que ces champs et la requête
+    ne charge que leurs colonnes et jointures (cf. SparseFieldsetMixin). Un champ
+    inconnu donne un 400. Les écritures valident et renvoient toujours tous les champs.
+    """
+    prune_queryset = True  # False pour une vue qui met en cache la représentation complète
+
+    def get_requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = None
+            if self.request.method in permissions.SAFE_METHODS:
+                self._requested_fields = self.get_serializer_class().parse_fields(self.request.query_params.get('fields'))
+        return self._requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.prune(queryset) if self.prune_queryset else queryset
+
+    def prune(self, queryset):
+        # Une liste garde les colonnes du tri : le curseur de la page suivante les lit
+        is_list = (self.lookup_url_kwarg or self.lookup_field) not in self.kwargs
+        keep = getattr(self.paginator, 'ordering', ()) if is_list else ()
+        return self.get_serializer_class().prune_queryset(queryset, self.get_requested_fields(), keep)
+
+    def project(self, data):
+        # Représentation complète (mise en cache) réduite aux champs demandés
+        fields = self.get_requested_fields()
+        return data if fields is None else {name: value for name, value in data.items() if name in fields}
+
 # --- Vues pour les Clients ---
 
-class ClientListCreate(generics.ListCreateAPIView):
+class ClientListCreate(ThrottleFirstMixin, FieldsetMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = ClientSerializer
     permission_classes = [permissions.AllowAny]  # Permet l'accès à tous pour la création
+    throttle_scope = 'signup'
+    list_generation = 'clients'
 
     def get_queryset(self):
         return Client.objects.all()  # Retourne tous les clients
@@ -44,18 +144,18 @@ class ClientListCreate(generics.ListCreateAPIView):
             raise ValidationError({"detail": f"Erreur lors de la création de l'utilisateur ou du client: {e}"})
 
 
-class ClientRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class ClientRetrieveUpdateDestroy(FieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [permissions.IsAuthenticated]  # Accès uniquement pour les utilisateurs authentifiés
 
     def get_queryset(self):
-        user = self.request.user
         # For admin, they can access any client. For clients, they can only access their own.
-        if user.is_superuser:
+        if self.request.user.is_superuser:
             return Client.objects.all()
-        elif hasattr(user, 'client_profile'):
-            return Client.objects.filter(user=user)
+        identity = get_identity(self.request)
+        if identity['client_id'] is not None:
+            return Client.objects.filter(pk=identity['client_id'])
         return Client.objects.none()
 
     def perform_update(self, serializer):
@@ -72,10 +172,12 @@ class ClientRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
 
 # --- Vues pour les Prestataires ---
 
-class ProviderListCreate(generics.ListCreateAPIView):
+class ProviderListCreate(ThrottleFirstMixin, FieldsetMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Provider.objects.all()
     serializer_class = ProviderSerializer
     permission_classes = [permissions.AllowAny]  # Permet l'accès à tous pour la création
+    throttle_scope = 'signup'
+    list_generation = 'providers'
 
     def perform_create(self, serializer):
         name = serializer.validated_data.get('name')
@@ -94,19 +196,42 @@ class ProviderListCreate(generics.ListCreateAPIView):
         except Exception as e:
             raise ValidationError({"detail": f"Erreur lors de la création de l'utilisateur ou du prestataire: {e}"})
 
+    def list(self, request, *args, **kwargs):
+        # Annuaire public : page sérialisée mise en cache par paramètres de requête
+        key = provider_list_key(request)
+        data = cache_get('provider_list', key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache_set(key, data)
+        return Response(data)
+
 
-class ProviderRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class ProviderRetrieveUpdateDestroy(FieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Provider.objects.all()
     serializer_class = ProviderSerializer
     permission_classes = [permissions.IsAuthenticated]  # Accès uniquement pour les utilisateurs authentifiés
+    prune_queryset = False  # La fiche complète est mise en cache, puis réduite à ?fields=
+
+    def retrieve(self, request, *args, **kwargs):
+        # Le propriétaire est mis en cache avec la fiche : le contrôle d'accès se fait sans requête
+        self.get_requested_fields()  # Un champ inconnu est refusé avant toute lecture
+        key = provider_detail_key(kwargs['pk'])
+        cached = cache_get('provider_detail', key)
+        if cached is None:
+            instance = self.get_object()
+            cached = {'user_id': instance.user_id, 'data': self.get_serializer(instance, fields=None).data}
+            cache_set(key, cached)
+        elif not (request.user.is_superuser or cached['user_id'] == request.user.id):
+            raise NotFound()
+        return Response(self.project(cached['data']))
 
     def get_queryset(self):
-        user = self.request.user
         # For admin, they can access any provider. For providers, they can only access their own.
-        if user.is_superuser:
+        if self.request.user.is_superuser:
             return Provider.objects.all()
-        elif hasattr(user, 'provider_profile'):
-            return Provider.objects.filter(user=user)
+        identity = get_identity(self.request)
+        if identity['provider_id'] is not None:
+            return Provider.objects.filter(pk=identity['provider_id'])
         return Provider.objects.none()
 
     def perform_update(self, serializer):
@@ -121,78 +246,442 @@ class ProviderRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
         user.delete()  # Supprime l'utilisateur Django associé
 
+class ProviderSearch(FieldsetMixin, generics.ListAPIView):
+    serializer_class = ProviderSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = ProviderSearchPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        return search_providers(Provider.objects.all(), params.get('q', ''), params.get('service', ''))
+
+    def list(self, request, *args, **kwargs):
+        if not (request.query_params.get('q', '').strip() or request.query_params.get('service', '').strip()):
+            raise ValidationError({"detail": "Le paramètre q ou service est requis."})
+        # Même cache et même invalidation que l'annuaire
+        key = provider_list_key(request)
+        data = cache_get('provider_search', key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache_set(key, data)
+        return Response(data)
+
+class ProviderAvailability(views.APIView):
+    permission_classes = [permissions.AllowAny]  # Consultable avant de réserver
+
+    def get(self, request, pk):
+        capacity = get_object_or_404(Provider.objects.values_list('daily_capacity', flat=True), pk=pk)
+        start, end = get_date_range(request)
+        return Response({
+            'provider': pk,
+            'capacity': capacity,
+            'from': start,
+            'to': end,
+            'days': daily_availability(pk, capacity, start, end),
+        })
+
+class ProviderCalendar(views.APIView):
+    """
+    Planning d'un prestataire au format colonnes : ?from=AAAA-MM-JJ&to=AAAA-MM-JJ
+    Tableaux parallèles (ids, dates, statuts, clients) et table des clients dédoublonnée,
+    lus par une seule requête values_list, sans instancier de modèle.
+    Réservé au prestataire lui-même et à l'administrateur.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        if request.user.is_superuser:
+            if not Provider.objects.filter(pk=pk).exists():
+                raise NotFound()
+        elif get_identity(request)['provider_id'] != pk:
+            raise NotFound()  # Comme la fiche : un autre prestataire n'est pas visible
+        start, end = get_date_range(request, default_days=31)
+        rows = (Reservation.objects
+                .filter(provider_id=pk, date__range=(start, end))
+                .order_by('date', 'id')
+                .values_list('id', 'date', 'status', 'client_id', 'client__name', 'client__phone_number'))
+        ids, dates, statuses, clients = [], [], [], []
+        client_table = {}
+        for reservation_id, date, status_name, client_id, name, phone_number in rows:
+            ids.append(reservation_id)
+            dates.append(date.isoformat())
+            statuses.append(status_name)
+            clients.append(client_id)
+            if client_id not in client_table:
+                client_table[client_id] = {'name': name, 'phone_number': phone_number}
+        return Response({
+            'provider': pk,
+            'from': start,
+            'to': end,
+            'ids': ids,
+            'dates': dates,
+            'statuses': statuses,
+            'clients': clients,  # Clés de client_table
+            'client_table': client_table,
+        })
+
 # --- Vues pour les Réservations ---
 
-class ReservationListCreate(generics.ListCreateAPIView):
+class ReservationQuerysetMixin:
+    # Client et prestataire sont chargés par jointure : pas de requête par ligne
+    validator_generations = ('clients', 'providers')  # Leurs noms et téléphones font partie de la réponse
+    list_generation = 'reservations'
+
+    def get_queryset(self):
+        return self.restrict_to_user(Reservation.objects.with_parties())
+
+    def restrict_to_user(self, reservations):
+        if self.request.user.is_superuser:
+            return reservations  # L'administrateur voit toutes les réservations
+        identity = get_identity(self.request)  # Profil lu en session, sans requête
+        if identity['client_id'] is not None:
+            return reservations.filter(client_id=identity['client_id'])  # Un client voit uniquement ses propres réservations
+        elif identity['provider_id'] is not None:
+            return reservations.filter(provider_id=identity['provider_id'])  # Un prestataire voit uniquement ses réservations
+        return reservations.none()  # Aucun autre type d'utilisateur ne voit de réservations
+
+class ReservationListCreate(FieldsetMixin, ReservationQuerysetMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = ReservationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReservationCursorPagination  # Tri stable (created_at, id)
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.is_superuser:
-            return Reservation.objects.all()
-        elif hasattr(user, 'client_profile'):
-            return Reservation.objects.filter(client=user.client_profile)
-        elif hasattr(user, 'provider_profile'):
-            return Reservation.objects.filter(provider=user.provider_profile)
-        return Reservation.objects.none()
+    def list(self, request, *args, **kwargs):
+        if not wants_archived(request):
+            return super().list(request, *args, **kwargs)
+        # ?include_archived=1 : la même page lue dans les deux tables puis fusionnée.
+        # Les validateurs HTTP restent ceux de la table chaude : archiver change son nombre de lignes.
+        archived = self.prune(self.restrict_to_user(ArchivedReservation.objects.with_parties()))
+        page = self.paginator.paginate_querysets([self.filter_queryset(self.get_queryset()), archived], request, view=self)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
 
     def perform_create(self, serializer):
-        serializer.save()  # Crée la réservation sans restrictions
+        # La place est attribuée par la base : deux créations concurrentes ne peuvent pas surbooker
+        provider = serializer.validated_data['provider']
+        if serializer.validated_data.get('status', 'pending') in ACTIVE_STATUSES:
+            book_slot(lambda slot: serializer.save(slot=slot), provider, serializer.validated_data['date'])
+        else:
+            serializer.save()
 
-class ReservationRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Reservation.objects.all()
+class ReservationRetrieveUpdateDestroy(FieldsetMixin, ReservationQuerysetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ReservationSerializer
     permission_classes = [permissions.IsAuthenticated]  # Accès uniquement pour les utilisateurs authentifiés
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.is_superuser:
-            return Reservation.objects.all()  # L'administrateur voit toutes les réservations
-        elif hasattr(user, 'client_profile'):
-            return Reservation.objects.filter(client=user.client_profile)  # Un client voit uniquement ses propres réservations
-        elif hasattr(user, 'provider_profile'):
-            return Reservation.objects.filter(provider=user.provider_profile)  # Un prestataire voit uniquement ses réservations
-        return Reservation.objects.none()  # Aucun autre type d'utilisateur ne voit de réservations
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        was_active = instance.status in ACTIVE_STATUSES
+        provider = serializer.validated_data.get('provider', instance.provider)
+        date = serializer.validated_data.get('date', instance.date)
+        new_status = serializer.validated_data.get('status', instance.status)
+        moved = provider.pk != instance.provider_id or date != instance.date
+        # Nouvelle place seulement si la réservation redevient active ou change de jour / prestataire
+        if new_status in ACTIVE_STATUSES and (moved or not was_active):
+            book_slot(lambda slot: serializer.save(slot=slot), provider, date, exclude_pk=instance.pk)
+        else:
+            serializer.save()
+
+
+class ReservationBatch(ReservationQuerysetMixin, views.APIView):
+    """
+    Création et changement de statut de réservations par lots.
+
+    Le corps est une liste : un élément avec `id` est un changement de statut,
+    sinon une création. Tout est validé en une passe, les clients et prestataires
+    sont chargés en une requête par modèle et l'écriture se fait en bulk dans une
+    seule transaction. La réponse donne un résultat par élément, dans l'ordre.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_items = 1000
+    max_attempts = 3
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({"detail": "Le corps doit être une liste de réservations."})
+        if len(items) > self.max_items:
+            raise ValidationError({"detail": f"Un lot ne peut pas dépasser {self.max_items} éléments."})
+
+        results = [None] * len(items)
+        creates, updates = [], []
+        for index, item in enumerate(items):
+            is_update = isinstance(item, dict) and 'id' in item
+            serializer_class = ReservationBatchStatusSerializer if is_update else ReservationBatchCreateSerializer
+            serializer = serializer_class(data=item)
+            if not serializer.is_valid():
+                results[index] = {'index': index, 'status': 400, 'errors': serializer.errors}
+            elif is_update:
+                updates.append((index, serializer.validated_data))
+            else:
+                creates.append((index, serializer.validated_data))
+
+        # Une requête par modèle pour résoudre les clés étrangères et les cibles
+        client_ids = set(Client.objects.filter(pk__in={data['client'] for _, data in creates}).values_list('pk', flat=True))
+        capacities = dict(Provider.objects.filter(pk__in={data['provider'] for _, data in creates}).values_list('pk', 'daily_capacity'))
+        targets = (
+            self.get_queryset().select_related(None).select_related('provider')
+            .only('id', 'date', 'status', 'slot', 'provider__daily_capacity')
+            .in_bulk({data['id'] for _, data in updates})
+        )
+        for index, data in creates:
+            missing = [field for field, known in (('client', client_ids), ('provider', capacities)) if data[field] not in known]
+            if missing:
+                results[index] = {'index': index, 'status': 400, 'errors': {field: ["Objet inexistant."] for field in missing}}
+        seen = set()
+        for index, data in updates:
+            if data['id'] not in targets:
+                results[index] = {'index': index, 'status': 404, 'errors': {"id": ["Réservation introuvable."]}}
+            elif data['id'] in seen:
+                # Un seul changement par réservation : le statut précédent lu ci-dessous serait faux pour le second
+                results[index] = {'index': index, 'status': 400, 'errors': {"id": ["Réservation déjà présente dans le lot."]}}
+            seen.add(data['id'])
+        creates = [(index, data) for index, data in creates if results[index] is None]
+        updates = [(index, data) for index, data in updates if results[index] is None]
+
+        # Statuts lus avant toute modification : write() les change sur les cibles
+        previous = {pk: target.status for pk, target in targets.items()}
+
+        # Les places sont recalculées si un autre worker en a pris une entre-temps
+        for attempt in range(self.max_attempts):
+            try:
+                with transaction.atomic():
+                    written = self.write(creates, updates, capacities, targets, previous)
+                break
+            except IntegrityError:
+                if attempt == self.max_attempts - 1:
+                    raise SlotUnavailable()
+        for index, result in written.items():
+            results[index] = {'index': index, **result}
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def write(self, creates, updates, capacities, targets, previous):
+        requests = [
+            (index, data['provider'], data['date'], capacities[data['provider']])
+            for index, data in creates if data['status'] in ACTIVE_STATUSES
+        ] + [
+            (index, targets[data['id']].provider_id, targets[data['id']].date, targets[data['id']].provider.daily_capacity)
+            for index, data in updates
+            if data['status'] in ACTIVE_STATUSES and previous[data['id']] not in ACTIVE_STATUSES
+        ]
+        slots = allocate_slots(requests)
+        written = {}
+
+        new_reservations = []
+        for index, data in creates:
+            if slots.get(index, 0) is None:
+                written[index] = {'status': 409, 'errors': {"date": [SlotUnavailable.default_detail]}}
+                continue
+            reservation = Reservation(
+                client_id=data['client'], provider_id=data['provider'], service=data['service'],
+                date=data['date'], status=data['status'], slot=slots.get(index),
+            )
+            new_reservations.append((index, reservation))
+        Reservation.objects.bulk_create([reservation for _, reservation in new_reservations], batch_size=500)
+        deltas = Counter()  # bulk_create / bulk_update n'envoient pas de signaux : statistiques en bloc
+        for index, reservation in new_reservations:
+            written[index] = {'status': 201, 'id': reservation.pk}
+            deltas[stats_key(reservation)] += 1
+
+        now = timezone.now()
+        changed = []
+        for index, data in updates:
+            reservation = targets[data['id']]
+            if slots.get(index, 0) is None:
+                written[index] = {'status': 409, 'errors': {"status": [SlotUnavailable.default_detail]}}
+                continue
+            if index in slots:
+                reservation.slot = slots[index]
+            old_key = (reservation.provider_id, reservation.date, previous[reservation.pk])
+            reservation.status = data['status']
+            deltas.update(change_deltas(old_key, stats_key(reservation)))
+            reservation.updated_at = now  # bulk_update ne déclenche pas auto_now
+            changed.append(reservation)
+            written[index] = {'status': 200, 'id': reservation.pk}
+        Reservation.objects.bulk_update(changed, ['status', 'slot', 'updated_at'], batch_size=500)
+        apply_deltas(deltas)
+        bump_generation_on_commit('reservations')
+        # Notifications, dans la même transaction (cf. service.outbox)
+        outbox.reservation_created([reservation for _, reservation in new_reservations])
+        outbox.status_changed([(reservation.pk, previous[reservation.pk], reservation.status)
+                               for reservation in changed if previous[reservation.pk] != reservation.status])
+        return written
+
+class ReservationTransitionMixin(ReservationQuerysetMixin):
+    # Changements de statut explicites (approve, reject, complete, cancel), cf. service.transitions
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_target(self, action):
+        if action not in ACTIONS:
+            raise NotFound()
+        target, roles = ACTIONS[action]
+        if not (self.request.user.is_superuser or get_identity(self.request)['user_type'] in roles):
+            raise PermissionDenied()
+        return target
+
+class ReservationTransition(ReservationTransitionMixin, views.APIView):
+    def post(self, request, pk, action):
+        target = self.get_target(action)
+        result = apply_transition(self.restrict_to_user(Reservation.objects.all()), [pk], target)[pk]
+        if result['status'] == 404:
+            raise NotFound()
+        if result['status'] == 409:
+            return Response({"detail": result['errors']['status'][0], "current": result['current']},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({'id': pk, 'status': result['current'], 'previous': result['previous']})
+
+class ReservationBulkTransition(ReservationTransitionMixin, views.APIView):
+    """
+    Même changement de statut pour une liste de réservations : {"ids": [1, 2, 3]}.
+    Un UPDATE par groupe (statut, prestataire, jour) : approuver une journée entière
+    coûte une écriture. La réponse donne un résultat par identifiant, dans l'ordre.
+    """
+    max_items = 1000
+
+    def post(self, request, action):
+        target = self.get_target(action)
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            raise ValidationError({"ids": "Liste d'identifiants de réservations attendue."})
+        if len(ids) > self.max_items:
+            raise ValidationError({"detail": f"Un lot ne peut pas dépasser {self.max_items} éléments."})
+        ids = list(dict.fromkeys(ids))
+        results = apply_transition(self.restrict_to_user(Reservation.objects.all()), ids, target)
+        return Response({'results': [results[pk] for pk in ids]})
+
+class ReservationExport(ReservationQuerysetMixin, views.APIView):
+    """
+    Export en flux des réservations visibles par l'utilisateur :
+    ?format=csv|ndjson&from=AAAA-MM-JJ&to=AAAA-MM-JJ&status=pending,approved
+    La mémoire reste constante quel que soit le volume exporté.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get(self, request):
+        filters = {}
+        params = request.query_params
+        for param, lookup in (('from', 'date__gte'), ('to', 'date__lte')):
+            if params.get(param):
+                try:
+                    value = parse_date(params[param])
+                except ValueError:
+                    value = None
+                if value is None:
+                    raise ValidationError({param: "Date attendue au format AAAA-MM-JJ."})
+                filters[lookup] = value
+        if params.get('status'):
+            statuses = params['status'].split(',')
+            known = {choice for choice, _ in Reservation.STATUS_CHOICES}
+            if not set(statuses) <= known:
+                raise ValidationError({"status": f"Statuts possibles : {', '.join(sorted(known))}."})
+            filters['status__in'] = statuses
+        sources = [Reservation, ArchivedReservation] if wants_archived(request) else [Reservation]
+        # Tri sur la clé primaire : l'export d'un administrateur se lit sans tri en base.
+        # Base choisie maintenant : le flux est lu après la sortie des middlewares (cf. service.routers)
+        querysets = [self.restrict_to_user(model.objects.filter(**filters)).order_by('id').using(router.db_for_read(model))
+                     for model in sources]
+
+        renderer = request.accepted_renderer
+        stream = stream_csv(*querysets) if renderer.format == 'csv' else stream_ndjson(*querysets)
+        response = StreamingHttpResponse(stream, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="reservations.{renderer.format}"'
+        return response
+
+class ReservationStats(views.APIView):
+    """
+    Réservations par jour ou par mois et par statut, lues dans la table de synthèse
+    ReservationDayStat (jamais dans Reservation) :
+    ?from=AAAA-MM-JJ&to=AAAA-MM-JJ&granularity=day|month&provider=<id>
+    L'administrateur voit toute la plateforme ou un prestataire, un prestataire ses propres réservations.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    granularities = {'day': (30, MAX_RANGE_DAYS), 'month': (365, 10 * MAX_RANGE_DAYS)}  # Période par défaut, maximale
+
+    def get(self, request):
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in self.granularities:
+            raise ValidationError({"granularity": "Valeurs possibles : day, month."})
+        start, end = get_date_range(request, *self.granularities[granularity])
+
+        if request.user.is_superuser:
+            provider = request.query_params.get('provider') or None
+            if provider is not None and not provider.isdigit():
+                raise ValidationError({"provider": "Identifiant de prestataire attendu."})
+        else:
+            provider = get_identity(request)['provider_id']
+            if provider is None:
+                raise PermissionDenied()
+        stats = ReservationDayStat.objects.filter(day__range=(start, end))
+        if provider is not None:
+            provider = int(provider)
+            stats = stats.filter(provider_id=provider)
+
+        period = TruncMonth('day') if granularity == 'month' else F('day')
+        rows = stats.annotate(period=period).values_list('period', 'status').annotate(count=Sum('count')).order_by('period', 'status')
+        results, totals = {}, Counter()
+        for day, status_name, count in rows:
+            if not count:
+                continue
+            entry = results.setdefault(day, {'period': day, 'total': 0, 'counts': {}})
+            entry['counts'][status_name] = count
+            entry['total'] += count
+            totals[status_name] += count
+        return Response({
+            'from': start,
+            'to': end,
+            'granularity': granularity,
+            'provider': provider,
+            'totals': dict(totals),
+            'results': list(results.values()),
+        })
+
+# --- Import de comptes ---
+
+class AccountImport(views.APIView):
+    """
+    Import de comptes par l'administrateur : ?kind=client|provider, corps JSON
+    (liste d'objets) ou CSV (ligne d'en-tête) avec username, email, password, name,
+    phone_number, et pour un prestataire service, daily_capacity.
+    Un résultat par ligne, dans l'ordre : 201, 400 (invalide) ou 409 (déjà utilisé).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser]
+    max_items = 1000  # Au-delà, la commande importaccounts
+
+    def post(self, request):
+        if not request.user.is_superuser:
+            raise PermissionDenied()
+        kind = request.query_params.get('kind')
+        if kind not in ACCOUNT_KINDS:
+            raise ValidationError({"kind": "Valeurs possibles : client, provider."})
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({"detail": "Le corps doit être une liste de comptes."})
+        if len(rows) > self.max_items:
+            raise ValidationError({"detail": f"Un import ne peut pas dépasser {self.max_items} comptes."})
+        results = import_accounts(kind, rows)
+        return Response({
+            'created': sum(result['status'] == 201 for result in results),
+            'results': results,
+        })
 
 # --- Vues d'Authentification ---
 
-class LoginView(views.APIView):
+class LoginView(ThrottleFirstMixin, views.APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'login'
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
+        identity = serializer.validated_data['identity']  # Rôle, profil et téléphone, résolus par le serializer
 
         login(request, user)
+        store_identity(request.session, identity)  # Relue par les vues et /api/me/ sans requête
         csrf_token = get_token(request)
 
-        user_type = 'user'  # Type par défaut
-        profile_id = user.id  # ID de l'utilisateur par défaut
-        profile_phone_number = None # Initialize phone number
-
-        if user.is_superuser:
-            user_type = 'admin'
-        elif hasattr(user, 'client_profile'):
-            user_type = 'client'
-            profile_id = user.client_profile.id
-            profile_phone_number = user.client_profile.phone_number # Get client phone number
-        elif hasattr(user, 'provider_profile'):
-            user_type = 'provider'
-            profile_id = user.provider_profile.id
-            profile_phone_number = user.provider_profile.phone_number # Get provider phone number
-
         response = Response({
             'message': 'Connexion réussie',
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'user_type': user_type,
-                'profile_id': profile_id,
-                'phone_number': profile_phone_number # Return phone number on login
-            }
+            'user': {field: identity[field] for field in PUBLIC_FIELDS},
         }, status=status.HTTP_200_OK)
 
         response.set_cookie(